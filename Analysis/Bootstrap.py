@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+from Sensitivity import Design_Blocks, Cross_Products
+
+# Bootstrap confidence intervals for omitted variable bias: the difference between a coefficient in the short model (without some controls) and the
+# long model (with them). Students are resampled within each Class_ID, so every replicate keeps the class sizes of the real data. A replicate is
+# stored as a vector of counts (how many times each student was drawn), and the short and long fits for every replicate come from count weighted
+# cross-products, so resampled dataframes are never built.
+
+def Cluster_Weights(clusters, n_reps, rng):
+    """Draw bootstrap count weights, resampling rows with replacement within each cluster
+
+    Keyword arguments:
+    clusters -- 1D array of cluster labels (e.g., Class_ID) for each row
+    n_reps -- number of bootstrap replicates
+    rng -- numpy random Generator
+
+    Returns an integer array with shape (n_reps, number of rows); each row of weights sums to the number of rows and, within each cluster, to the
+    cluster size.
+    """
+
+    codes, _ = pd.factorize(np.asarray(clusters), use_na_sentinel = False)
+    order = np.argsort(codes, kind = 'stable')
+    sizes = np.bincount(codes)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    # draw each row's position within its own cluster, for all replicates at once, then count how often each row was drawn
+    draws = starts[codes[order]] + (rng.random((n_reps, len(codes))) * sizes[codes[order]]).astype(np.int64)
+    rows = order[draws]
+    weights = np.zeros((n_reps, len(codes)), dtype = np.int64)
+    np.add.at(weights, (np.arange(n_reps)[:, None], rows), 1)
+    return weights
+
+def Solve_Coefficients(C, short, long, target):
+    """Coefficient of the target column in the short and long models for each of a stack of cross-product matrices
+
+    Keyword arguments:
+    C -- 3D array of cross-product matrices, one per replicate, with the outcome as the last row and column
+    short -- list of column indices in the short model
+    long -- list of column indices in the long model
+    target -- column index of the coefficient we track; must be in both models
+    """
+
+    y = C.shape[1] - 1
+    estimates = []
+    for cols in [short, long]:
+        XtX = C[:, cols][:, :, cols]
+        Xty = C[:, cols, y]
+        # a replicate can draw no students with some level of a dummy, making its system singular; those are solved against the identity and
+        # set to NaN, and dropped from the intervals
+        singular = np.linalg.matrix_rank(XtX) < len(cols)
+        XtX[singular] = np.eye(len(cols))
+        beta = np.linalg.solve(XtX, Xty[:, :, None])[:, :, 0]
+        beta[singular] = np.nan
+        estimates.append(beta[:, cols.index(target)])
+    return estimates[0], estimates[1]
+
+def Weighted_Coefficients(Z, weights, short, long, target):
+    """Coefficient of the target column in the short and long models for each row of weights, from weighted cross-products
+
+    Keyword arguments:
+    Z -- 2D array of design columns, with the outcome as the last column
+    weights -- 2D array of weights, one row per replicate
+    short -- list of column indices in the short model
+    long -- list of column indices in the long model
+    target -- column index of the coefficient we track; must be in both models
+    """
+
+    return Solve_Coefficients(Cross_Products(Z, weights), short, long, target)
+
+def Jackknife_Coefficients(Z, short, long, target, chunk_size = 500):
+    """Coefficient of the target column in the short and long models with each row left out in turn, used for the BCa acceleration
+
+    Keyword arguments:
+    Z -- 2D array of design columns, with the outcome as the last column
+    short -- list of column indices in the short model
+    long -- list of column indices in the long model
+    target -- column index of the coefficient we track; must be in both models
+    chunk_size -- number of left out rows whose cross-products are held in memory at once
+
+    Students are resampled one at a time within their cluster, so the jackknife leaves out one student at a time too (leaving out whole clusters
+    would match a bootstrap that resamples clusters). Each row's cross-products are the full cross-products less that row's own products.
+    """
+
+    C = Cross_Products(Z)
+    estimates = [[], []]
+    for start in range(0, len(Z), chunk_size):
+        rows = Z[start:start + chunk_size]
+        for i, estimate in enumerate(Solve_Coefficients(C[None, :, :] - rows[:, :, None] * rows[:, None, :], short, long, target)):
+            estimates[i].append(estimate)
+    return np.concatenate(estimates[0]), np.concatenate(estimates[1])
+
+def Bootstrap_Bias(df, focal = 'IntendedMajor', short = ['PreScores', 'IntendedMajor'], long = ['PreScores', 'IntendedMajor', 'Instruction'],
+                   outcome = 'PostScores', cluster = 'Class_ID', n_reps = 2000, chunk_size = 500, seed = 0, alpha = 0.05):
+    """Cluster bootstrap of the short and long model coefficients of a focal variable, and of their difference (the omitted variable bias)
+
+    Keyword arguments:
+    df -- dataframe with the variables, e.g., the Get_OVB_Master output for one assessment
+    focal -- variable whose coefficient we track; if it's categorical, the first non-reference level is used
+    short -- list of variables in the short model
+    long -- list of variables in the long model
+    outcome -- outcome variable
+    cluster -- column that students are resampled within
+    n_reps -- number of bootstrap replicates
+    chunk_size -- number of replicates (or jackknife rows) whose weights and cross-products are held in memory at once
+    seed -- seed for the random number generator; each chunk gets its own stream spawned from it, so results are reproducible for a given seed
+            and chunk_size
+    alpha -- intervals have coverage 1 - alpha
+
+    Returns a dataframe with one row for each of Short, Long, and Bias (short minus long) with the estimate on the real data, the bootstrap
+    standard error, and percentile and BCa intervals, and a dictionary of the bootstrap replicates.
+    """
+
+    from scipy import stats
+
+    variables = list(dict.fromkeys(short + long))
+    df = df[[outcome, cluster] + variables].replace('', np.nan).dropna()
+    design, blocks = Design_Blocks(df, variables)
+    Z = np.column_stack([np.ones(len(df)), design.to_numpy(), df[outcome].to_numpy(dtype = float)])
+    names = ['(Intercept)'] + list(design.columns)
+    short_cols = [0] + [names.index(name) for var in short for name in blocks[var]]
+    long_cols = [0] + [names.index(name) for var in long for name in blocks[var]]
+    target = names.index(blocks[focal][0])
+    clusters = df[cluster].to_numpy()
+
+    full = [estimate[0] for estimate in Weighted_Coefficients(Z, np.ones((1, len(Z))), short_cols, long_cols, target)]
+
+    # weights for a chunk of replicates are drawn, used, and thrown away before the next chunk, so memory doesn't grow with n_reps
+    chunks = [min(chunk_size, n_reps - start) for start in range(0, n_reps, chunk_size)]
+    replicates = [[], []]
+    for size, chunk_seed in zip(chunks, np.random.SeedSequence(seed).spawn(len(chunks))):
+        weights = Cluster_Weights(clusters, size, np.random.default_rng(chunk_seed)).astype(float)
+        for i, estimate in enumerate(Weighted_Coefficients(Z, weights, short_cols, long_cols, target)):
+            replicates[i].append(estimate)
+    replicates = {'Short':np.concatenate(replicates[0]), 'Long':np.concatenate(replicates[1])}
+    replicates['Bias'] = replicates['Short'] - replicates['Long']
+    estimates = {'Short':full[0], 'Long':full[1], 'Bias':full[0] - full[1]}
+
+    # the acceleration for BCa comes from the jackknife, leaving out one student at a time
+    jack_short, jack_long = Jackknife_Coefficients(Z, short_cols, long_cols, target, chunk_size = chunk_size)
+    jackknife = {'Short':jack_short, 'Long':jack_long, 'Bias':jack_short - jack_long}
+
+    rows = []
+    for key in ['Short', 'Long', 'Bias']:
+        boot = replicates[key][np.isfinite(replicates[key])]
+        percentile = np.quantile(boot, [alpha / 2, 1 - alpha / 2])
+
+        z0 = stats.norm.ppf((boot < estimates[key]).mean() + (boot == estimates[key]).mean() / 2)
+        jack = jackknife[key][np.isfinite(jackknife[key])]
+        d = jack.mean() - jack
+        a = (d**3).sum() / (6 * (d**2).sum()**1.5) if (d**2).sum() > 0 else 0.0
+        z = stats.norm.ppf([alpha / 2, 1 - alpha / 2])
+        bca = np.quantile(boot, stats.norm.cdf(z0 + (z0 + z) / (1 - a * (z0 + z))))
+
+        rows.append({'Estimate':key, 'Term':names[target], 'Value':estimates[key], 'Bootstrap_SE':boot.std(ddof = 1), 'Percentile_Lower':percentile[0],
+                     'Percentile_Upper':percentile[1], 'BCa_Lower':bca[0], 'BCa_Upper':bca[1], 'N_Reps':len(boot)})
+    return pd.DataFrame(rows), replicates
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+
+# Analytic omitted variable bias for standardized variables. In the model y = b1 x1 + b2 x2 + b3 x3, leaving out x3 biases the estimate of b1 by
+# b3 (r13 - r12 r23) / (1 - r12^2), where rij is the correlation between xi and xj. This is func and rev.func from OVB_E-CLASS_Analytic.Rmd, written
+# with numpy so that every argument can be an array and the bias surface over whole grids of correlations and effect sizes is evaluated at once.
+
+def Expected_Bias(beta3, r12, r13, r23):
+    """Expected bias on the coefficient of x1 when x3 is left out of the model; arguments are broadcast against each other
+
+    Keyword arguments:
+    beta3 -- true (standardized) effect size of the omitted variable x3
+    r12 -- correlation between the included variables x1 and x2
+    r13 -- correlation between x1 and the omitted variable x3
+    r23 -- correlation between x2 and the omitted variable x3
+    """
+
+    beta3, r12, r13, r23 = np.broadcast_arrays(*[np.asarray(arg, dtype = float) for arg in [beta3, r12, r13, r23]])
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        return beta3 * (r13 - r12 * r23) / (1 - r12**2)
+
+def Effect_Size(bias, r12, r13, r23):
+    """Effect size of the omitted variable x3 needed to bias the coefficient of x1 by bias; the inverse of Expected_Bias
+
+    Keyword arguments:
+    bias -- bias on the coefficient of x1
+    r12 -- correlation between the included variables x1 and x2
+    r13 -- correlation between x1 and the omitted variable x3
+    r23 -- correlation between x2 and the omitted variable x3
+    """
+
+    bias, r12, r13, r23 = np.broadcast_arrays(*[np.asarray(arg, dtype = float) for arg in [bias, r12, r13, r23]])
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        return bias / (r13 - r12 * r23) * (1 - r12**2) # infinite when x3 can't bias b1 at all (r13 = r12 r23)
+
+def Valid_Correlations(r12, r13, r23, tol = 1e-12):
+    """Boolean array, True where the correlations make a positive definite 3x3 correlation matrix; arguments are broadcast against each other
+
+    Keyword arguments:
+    r12 -- correlation between x1 and x2
+    r13 -- correlation between x1 and x3
+    r23 -- correlation between x2 and x3
+    tol -- tolerance on the determinant and on |r12| < 1
+
+    A correlation matrix with unit diagonal and |rij| <= 1 is positive semidefinite exactly when its determinant is non-negative. We also need
+    |r12| < 1 (x1 and x2 not collinear), otherwise b1 isn't identified and the bias is undefined.
+    """
+
+    r12, r13, r23 = np.broadcast_arrays(*[np.asarray(arg, dtype = float) for arg in [r12, r13, r23]])
+    det = 1 + 2 * r12 * r13 * r23 - r12**2 - r13**2 - r23**2
+    return (det >= -tol) & (np.abs(r12) < 1 - tol) & (np.abs(r13) <= 1) & (np.abs(r23) <= 1)
+
+def Bias_Grid(beta3, r12, r13, r23, tol = 1e-12):
+    """Expected bias on the coefficient of x1 over the full grid of effect sizes and correlations, masked where the correlations are impossible
+
+    Keyword arguments:
+    beta3 -- 1D array of effect sizes of the omitted variable
+    r12 -- 1D array of correlations between x1 and x2
+    r13 -- 1D array of correlations between x1 and x3
+    r23 -- 1D array of correlations between x2 and x3
+    tol -- tolerance passed to Valid_Correlations
+
+    Returns a masked array with shape (len(beta3), len(r12), len(r13), len(r23)). The grid is built by broadcasting open (1D) axes, so only the
+    result is ever allocated at full size.
+    """
+
+    beta3, r12, r13, r23 = np.ix_(*[np.atleast_1d(np.asarray(arg, dtype = float)) for arg in [beta3, r12, r13, r23]])
+    valid = Valid_Correlations(r12, r13, r23, tol = tol) # shape (1, len(r12), len(r13), len(r23)), the same for every effect size
+    bias = Expected_Bias(beta3, r12, r13, r23)
+    return np.ma.masked_array(bias, mask = np.broadcast_to(~valid, bias.shape))
+
+def Grid_Frame(bias_grid, beta3, r12, r13, r23):
+    """Long (tidy) dataframe of a grid from Bias_Grid, one row per valid scenario, for plotting
+
+    Keyword arguments:
+    bias_grid -- masked array from Bias_Grid
+    beta3, r12, r13, r23 -- the 1D arrays the grid was built from
+    """
+
+    index = np.nonzero(~np.ma.getmaskarray(bias_grid))
+    axes = [np.asarray(arg, dtype = float) for arg in [beta3, r12, r13, r23]]
+    return pd.DataFrame({'beta3':axes[0][index[0]], 'r12':axes[1][index[1]], 'r13':axes[2][index[2]], 'r23':axes[3][index[3]],
+                         'bias':bias_grid.data[index]})
+
+def Correlation_Matrices(r12, r13, r23):
+    """Stack of 3x3 correlation matrices, with shape (..., 3, 3), from broadcast arrays of pairwise correlations
+
+    Keyword arguments:
+    r12 -- correlation between x1 and x2
+    r13 -- correlation between x1 and x3
+    r23 -- correlation between x2 and x3
+    """
+
+    r12, r13, r23 = np.broadcast_arrays(*[np.asarray(arg, dtype = float) for arg in [r12, r13, r23]])
+    ones = np.ones_like(r12)
+    return np.stack([np.stack([ones, r12, r13], axis = -1), np.stack([r12, ones, r23], axis = -1), np.stack([r13, r23, ones], axis = -1)], axis = -2)
+
+def Valid_Matrices(R, tol = 1e-12):
+    """Boolean array, True where a correlation matrix in a stack of shape (..., p, p) is positive semidefinite
+
+    Keyword arguments:
+    R -- stack of symmetric correlation matrices
+    tol -- tolerance on the smallest eigenvalue
+    """
+
+    return np.linalg.eigvalsh(R)[..., 0] >= -tol
+
+def Bias_Matrix(R, included):
+    """Matrix A such that leaving out the omitted variables biases the included coefficients by A b_omitted; A = R11^-1 R12
+
+    Keyword arguments:
+    R -- stack of correlation matrices between all variables, with shape (..., p, p)
+    included -- list of indices of the k included variables; the other m = p - k variables are omitted
+
+    Returns an array with shape (..., k, m), NaN where the included variables are collinear.
+    """
+
+    R = np.asarray(R, dtype = float)
+    included = np.asarray(included)
+    omitted = np.setdiff1d(np.arange(R.shape[-1]), included)
+    R11 = R[..., included[:, None], included[None, :]]
+    R12 = R[..., included[:, None], omitted[None, :]]
+
+    # solve every scenario in the stack at once. Collinear included variables make R11 singular, so we swap in the identity for those scenarios
+    # and set their A to NaN afterwards
+    singular = np.abs(np.linalg.det(R11)) < 1e-12
+    A = np.linalg.solve(np.where(singular[..., None, None], np.eye(len(included)), R11), R12)
+    A[singular] = np.nan
+    return A
+
+def General_Bias(R, included, beta_omitted, tol = 1e-12):
+    """Expected bias on each of k included coefficients when m variables are left out of the model, for a stack of scenarios
+
+    Keyword arguments:
+    R -- stack of correlation matrices between all variables, with shape (..., p, p)
+    included -- list of indices of the k included variables; the other m = p - k variables are omitted
+    beta_omitted -- effect sizes of the omitted variables (in increasing index order), with shape (..., m), broadcast against the stack
+    tol -- tolerance passed to Valid_Matrices
+
+    Returns a masked array with shape (..., k), masked where R isn't positive semidefinite or the included variables are collinear. With
+    p = 3 and included = [0, 1], the first column is Expected_Bias.
+    """
+
+    A = Bias_Matrix(R, included)
+    bias = np.einsum('...km,...m->...k', A, np.asarray(beta_omitted, dtype = float))
+    invalid = ~Valid_Matrices(R, tol = tol)[..., None] | np.isnan(bias)
+    return np.ma.masked_array(bias, mask = np.broadcast_to(invalid, bias.shape))
+
+def General_Effect_Size(R, included, bias, target = None, tol = 1e-12):
+    """Smallest (minimum norm) effect sizes of the omitted variables that bias the target coefficients by bias; the inverse of General_Bias
+
+    Keyword arguments:
+    R -- stack of correlation matrices between all variables, with shape (..., p, p)
+    included -- list of indices of the k included variables; the other m = p - k variables are omitted
+    bias -- bias on each target coefficient, with shape (..., len(target)), broadcast against the stack
+    target -- positions in included of the coefficients whose bias is given; if None, all k included coefficients
+    tol -- tolerance passed to Valid_Matrices
+
+    With one omitted variable and target = [0] this is Effect_Size. When more than one set of effect sizes gives the same bias (more omitted
+    variables than targets), the one with the smallest norm is returned; when none does exactly, the least squares solution is returned.
+    """
+
+    A = Bias_Matrix(R, included)
+    if target is not None:
+        A = A[..., np.asarray(target), :]
+    beta = np.einsum('...mk,...k->...m', np.linalg.pinv(np.nan_to_num(A)), np.asarray(bias, dtype = float))
+    invalid = ~Valid_Matrices(R, tol = tol)[..., None] | np.isnan(A).any(axis = (-2, -1))[..., None]
+    return np.ma.masked_array(beta, mask = np.broadcast_to(invalid, beta.shape))
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+
+# registrar control variables built by Registrar_Merge; each one is a block of one (numeric) or more (dummy coded) columns that is either in or out
+# of a specification
+CONTROLS = ['GPA', 'ACT_SAT_Math_Percentile', 'AP_Calculus_AB', 'AP_Calculus_BC', 'AP_Physics_EM', 'AP_Physics_Mech', 'Gender', 'URM_Status',
+            'First_Gen_Status', 'Class_Standing']
+
+# reference levels for dummy coding, the same ones we relevel to in OVB_E-CLASS_Analytic.Rmd; other categorical variables use their first level
+REFERENCE_LEVELS = {'Class_Standing':'Fresh', 'Gender':'M', 'URM_Status':'Majority', 'First_Gen_Status':'ContGen', 'AP_Calculus_AB':'NotTaken',
+                    'AP_Calculus_BC':'NotTaken', 'AP_Physics_EM':'NotTaken', 'AP_Physics_Mech':'NotTaken', 'Semester':'FA', 'Sequence':'Engineering',
+                    'Instruction':'Old', 'IntendedMajor':'EngineeringOrOtherSci'}
+
+def Design_Blocks(df, variables):
+    """Numeric design columns for a list of variables, with categorical variables dummy coded against their reference level
+
+    Keyword arguments:
+    df -- dataframe with the variables, e.g., the Get_OVB_Master output for one assessment
+    variables -- list of variables
+
+    Returns a dataframe of design columns (named variable or variable[level]) and a dictionary mapping each variable to its list of columns.
+    """
+
+    columns = {}
+    blocks = {}
+    for var in variables:
+        if pd.api.types.is_numeric_dtype(df[var]) and not isinstance(df[var].dtype, pd.CategoricalDtype):
+            columns[var] = df[var].astype(float)
+            blocks[var] = [var]
+            continue
+        values = df[var].astype(object)
+        levels = sorted(values.dropna().unique(), key = str)
+        reference = REFERENCE_LEVELS.get(var, levels[0] if len(levels) > 0 else None)
+        blocks[var] = []
+        for level in levels:
+            if level != reference:
+                name = var + '[' + str(level) + ']'
+                columns[name] = (values == level).astype(float).where(values.notna())
+                blocks[var].append(name)
+    return pd.DataFrame(columns, index = df.index), blocks
+
+def Cross_Products(Z, weights = None):
+    """Weighted cross-product matrix Z'WZ of a 2D array, or a stack of them for a 2D array of weights (one row of weights per replicate)
+
+    Keyword arguments:
+    Z -- 2D array of design columns (with the outcome as the last column)
+    weights -- 1D array of row weights, 2D array of replicate by row weights, or None for unweighted cross-products
+    """
+
+    if weights is None:
+        return Z.T @ Z
+    if np.ndim(weights) == 1:
+        return (Z * weights[:, None]).T @ Z
+
+    # every replicate's cross-products are weighted sums of the same row products Z_i Z_j, so one matrix product of the weights with the
+    # products of each pair of columns does all the replicates at once, without a (replicates x rows x columns) intermediate
+    i, j = np.triu_indices(Z.shape[1])
+    C_flat = weights @ (Z[:, i] * Z[:, j])
+    C = np.empty((len(weights), Z.shape[1], Z.shape[1]))
+    C[:, i, j] = C_flat
+    C[:, j, i] = C_flat
+    return C
+
+def Sweep(A, k):
+    """Sweep a symmetric matrix on pivot k (Goodnight's sweep operator), returning a new matrix
+
+    Keyword arguments:
+    A -- symmetric matrix, e.g., the cross-product matrix [[X'X, X'y], [y'X, y'y]]
+    k -- pivot index
+
+    After sweeping the cross-product matrix on a set of columns S, A[S, y] holds the OLS coefficients of y on S, A[y, y] the residual sum of
+    squares, and -A[S, S] the inverse of X_S'X_S. Sweeps commute, so columns can be swept in one at a time as they enter a model.
+    """
+
+    d = A[k, k]
+    col = A[:, k].copy()
+    A = A - np.outer(col, col) / d
+    A[k, :] = col / d
+    A[:, k] = col / d
+    A[k, k] = -1 / d
+    return A
+
+def Fit_Subsets(df, outcome = 'PostScores', focal = ['IntendedMajor'], base = ['PreScores'], controls = CONTROLS, report = None, tol = 1e-10):
+    """Fit OLS models of the outcome on the focal and base variables plus every subset of the controls, from one cross-product matrix
+
+    Keyword arguments:
+    df -- dataframe with the variables, e.g., the Get_OVB_Master output for one assessment
+    outcome -- outcome variable
+    focal -- list of variables whose coefficients we track across specifications (e.g., IntendedMajor or Instruction)
+    base -- list of variables in every specification
+    controls -- list of control variables; all 2^k subsets are fit
+    report -- list of variables whose coefficients go in the table; if None, just the focal variables
+    tol -- pivots smaller than tol times the column's sum of squares are treated as collinear and left out of the model, like lm's NA coefficients
+
+    Returns a tidy dataframe with one row per specification and reported term: Specification (bitmask of included controls), Controls, N_Controls,
+    Term, Estimate, Std_Error, t_value, DF_Resid, and R_Squared.
+
+    X'X and X'y are computed once. Specifications are visited depth first, each one sweeping one control's columns into its parent's already
+    swept matrix, so nothing is refit. Rows missing any of the variables are dropped up front so every specification uses the same students,
+    and differences between specifications come from the controls rather than from changing samples.
+    """
+
+    report = focal if report is None else report
+    variables = list(dict.fromkeys(focal + base + controls))
+    df = df[[outcome] + variables].copy()
+    for var in variables:
+        if pd.api.types.is_string_dtype(df[var]) or (df[var].dtype == object):
+            df[var] = df[var].replace('', np.nan) # e.g., IntendedMajor is blank for students who didn't answer
+    df = df.dropna()
+
+    design, blocks = Design_Blocks(df, variables)
+    Z = np.column_stack([np.ones(len(df)), design.to_numpy(), df[outcome].to_numpy(dtype = float)])
+    names = ['(Intercept)'] + list(design.columns)
+    n, y = len(Z), Z.shape[1] - 1
+    column = {name:i for i, name in enumerate(names)}
+
+    A = Cross_Products(Z)
+    scale = np.diag(A).copy()
+
+    def Sweep_In(A, swept, cols):
+        for k in cols:
+            if A[k, k] > tol * scale[k]:
+                A = Sweep(A, k)
+                swept = swept + [k]
+        return A, swept
+
+    A, swept = Sweep_In(A, [], [0])
+    tss = A[y, y] # sweeping the intercept leaves the total sum of squares around the mean
+    A, swept = Sweep_In(A, swept, [column[name] for var in list(dict.fromkeys(base + focal)) for name in blocks[var]])
+
+    report_cols = [(var, name) for var in report for name in blocks[var]]
+    rows = []
+
+    def Visit(A, swept, i, mask):
+        if i < len(controls):
+            Visit(A, swept, i + 1, mask)
+            Visit(*Sweep_In(A, swept, [column[name] for name in blocks[controls[i]]]), i + 1, mask | (1 << i))
+            return
+
+        df_resid = n - len(swept)
+        sigma2 = A[y, y] / df_resid if df_resid > 0 else np.nan
+        included = [controls[j] for j in range(len(controls)) if mask & (1 << j)]
+        for var, name in report_cols:
+            k = column[name]
+            estimate = A[k, y] if k in swept else np.nan
+            se = np.sqrt(sigma2 * -A[k, k]) if k in swept else np.nan
+            rows.append({'Specification':mask, 'Controls':' + '.join(included) if included else '(none)', 'N_Controls':len(included), 'Term':name,
+                         'Estimate':estimate, 'Std_Error':se, 't_value':estimate / se, 'DF_Resid':df_resid, 'R_Squared':1 - A[y, y] / tss})
+
+    Visit(A, swept, 0, 0)
+    return pd.DataFrame(rows).sort_values(['Specification', 'Term'], kind = 'stable').reset_index(drop = True)
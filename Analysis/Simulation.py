@@ -0,0 +1,168 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from Sensitivity import Design_Blocks
+
+# Monte Carlo simulation of omitted variable bias and power. A population model is fit to real data (e.g., the Get_OVB_Master output for one
+# assessment), synthetic cohorts are drawn from it, and the included-variable model is fit to every cohort. Replicates are stacked into 3D arrays
+# and fit with one batched solve, and batches of replicates are spread over a process pool.
+
+def Population(df, outcome = 'PostScores', variables = ['PreScores', 'IntendedMajor', 'Instruction'], effects = None):
+    """Fit the population (data generating) model to real data
+
+    Keyword arguments:
+    df -- dataframe with the outcome and variables, e.g., the Get_OVB_Master output for one assessment
+    outcome -- outcome variable
+    variables -- list of variables in the population model; categorical variables are dummy coded as in Sensitivity.Design_Blocks
+    effects -- dictionary of coefficients to set by hand instead of using the fitted ones (e.g., {'Gender[F]':-0.2}), like setting fixef in simr
+
+    Returns a dictionary with the design column names, the design matrix of the real cohort (with an intercept column), its mean and covariance,
+    the coefficients, and the residual standard deviation.
+    """
+
+    df = df[[outcome] + variables].replace('', np.nan).dropna()
+    design, _ = Design_Blocks(df, variables)
+    X = np.column_stack([np.ones(len(design)), design.to_numpy()])
+    y = df[outcome].to_numpy(dtype = float)
+
+    beta, _, _, _ = np.linalg.lstsq(X, y, rcond = None)
+    sigma = np.sqrt(((y - X @ beta)**2).sum() / (len(y) - X.shape[1]))
+    names = ['(Intercept)'] + list(design.columns)
+    for name, value in (effects or {}).items():
+        beta[names.index(name)] = value
+
+    return {'names':names, 'X':X, 'mean':X[:, 1:].mean(axis = 0), 'cov':np.atleast_2d(np.cov(X[:, 1:], rowvar = False)), 'beta':beta, 'sigma':sigma}
+
+def Draw_Cohorts(population, n, n_reps, rng, method = 'resample'):
+    """Draw synthetic cohorts from a population model
+
+    Keyword arguments:
+    population -- dictionary from Population
+    n -- number of students per cohort
+    n_reps -- number of cohorts
+    rng -- numpy random Generator
+    method -- resample draws students (rows of the real design matrix) with replacement, keeping the real joint distribution of the variables;
+              normal draws from a multivariate normal with the real means and covariances
+
+    Returns the design matrices, with shape (n_reps, n, p), and outcomes, with shape (n_reps, n).
+    """
+
+    if method == 'resample':
+        X = population['X'][rng.integers(0, len(population['X']), size = (n_reps, n))]
+    elif method == 'normal':
+        X = np.concatenate([np.ones((n_reps, n, 1)), rng.multivariate_normal(population['mean'], population['cov'], size = (n_reps, n))], axis = 2)
+    else:
+        raise ValueError('method must be one of resample or normal, not ' + str(method))
+    y = X @ population['beta'] + rng.normal(0, population['sigma'], size = (n_reps, n))
+    return X, y
+
+def Batched_OLS(X, y):
+    """OLS coefficients and standard errors for a stack of regressions, solved together
+
+    Keyword arguments:
+    X -- design matrices, with shape (n_reps, n, p)
+    y -- outcomes, with shape (n_reps, n)
+
+    Returns coefficients and standard errors, both with shape (n_reps, p). Replicates with collinear designs get NaN.
+    """
+
+    XtX = np.matmul(X.transpose(0, 2, 1), X)
+    Xty = np.matmul(X.transpose(0, 2, 1), y[:, :, None])
+
+    # one batched solve of the normal equations for every replicate; a resampled cohort can miss a level of a dummy, so singular systems are
+    # swapped for the identity and set to NaN afterwards
+    singular = np.linalg.matrix_rank(XtX) < X.shape[2]
+    XtX[singular] = np.eye(X.shape[2])
+    XtX_inv = np.linalg.inv(XtX)
+    beta = np.matmul(XtX_inv, Xty)[:, :, 0]
+
+    resid = y - np.matmul(X, beta[:, :, None])[:, :, 0]
+    sigma2 = (resid**2).sum(axis = 1) / (X.shape[1] - X.shape[2])
+    se = np.sqrt(sigma2[:, None] * np.diagonal(XtX_inv, axis1 = 1, axis2 = 2))
+    beta[singular] = np.nan
+    se[singular] = np.nan
+    return beta, se
+
+def _Run_Batch(population, n, n_reps, included, seed, method):
+    rng = np.random.default_rng(seed)
+    X, y = Draw_Cohorts(population, n, n_reps, rng, method = method)
+    return Batched_OLS(X[:, :, included], y)
+
+def Simulate(population, n, n_reps, included = None, n_workers = 1, seed = 0, batch_size = 1000, method = 'resample'):
+    """Fit the included-variable model to n_reps synthetic cohorts drawn from the population model
+
+    Keyword arguments:
+    population -- dictionary from Population
+    n -- number of students per cohort
+    n_reps -- number of cohorts
+    included -- list of design columns in the fitted model, e.g., leaving out Instruction[New] to see the bias that omitting it causes; if None,
+                the population model is fit (for power)
+    n_workers -- number of processes to spread batches over; 1 runs in this process, None uses every core
+    seed -- seed for the random number generator
+    batch_size -- number of replicates per batch; memory use is about 8 * batch_size * n * p bytes per worker
+    method -- passed to Draw_Cohorts
+
+    Returns a dictionary with the fitted terms, arrays of estimates and standard errors with shape (n_reps, number of terms), and the residual
+    degrees of freedom of each fit.
+
+    Each batch gets its own random stream, spawned from the seed with SeedSequence, so results are reproducible and don't depend on n_workers.
+    """
+
+    included = population['names'] if included is None else ['(Intercept)'] + [name for name in included if name != '(Intercept)']
+    columns = [population['names'].index(name) for name in included]
+
+    sizes = [min(batch_size, n_reps - start) for start in range(0, n_reps, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(population, n, size, columns, batch_seed, method) for size, batch_seed in zip(sizes, seeds)]
+
+    n_workers = os.cpu_count() if n_workers is None else n_workers
+    if (n_workers == 1) or (len(args) == 1):
+        results = [_Run_Batch(*arg) for arg in args]
+    else:
+        with ProcessPoolExecutor(max_workers = min(n_workers, len(args))) as executor:
+            results = list(executor.map(_Run_Batch, *zip(*args)))
+
+    return {'terms':included, 'estimates':np.concatenate([beta for beta, _ in results]), 'std_errors':np.concatenate([se for _, se in results]),
+            'df_resid':n - len(columns)}
+
+def Summarize(simulation, population, alpha = 0.05):
+    """Summarize a simulation: true value, average estimate, bias, spread of estimates, and power for each fitted term
+
+    Keyword arguments:
+    simulation -- dictionary from Simulate
+    population -- dictionary from Population that the simulation was run with
+    alpha -- significance level for power
+    """
+
+    from scipy import stats
+
+    estimates, std_errors = simulation['estimates'], simulation['std_errors']
+    t_values = estimates / std_errors
+    critical = stats.t.ppf(1 - alpha / 2, simulation['df_resid'])
+    truth = np.array([population['beta'][population['names'].index(term)] for term in simulation['terms']])
+    mean_estimate = np.nanmean(estimates, axis = 0)
+    return pd.DataFrame({'Term':simulation['terms'], 'True_Value':truth, 'Mean_Estimate':mean_estimate, 'Bias':mean_estimate - truth,
+                         'Relative_Bias':(mean_estimate - truth) / truth, 'Empirical_SE':np.nanstd(estimates, axis = 0, ddof = 1),
+                         'Mean_SE':np.nanmean(std_errors, axis = 0), 'Power':np.nanmean(np.abs(t_values) > critical, axis = 0),
+                         'N_Reps':np.isfinite(estimates).sum(axis = 0)})
+
+def Power_Curve(population, sizes, n_reps, term, included = None, n_workers = 1, seed = 0, batch_size = 1000, method = 'resample', alpha = 0.05):
+    """Power to detect one term at each of several cohort sizes, like the sample size loops in Version1/PowerAnalysis.Rmd
+
+    Keyword arguments:
+    population -- dictionary from Population
+    sizes -- list of cohort sizes
+    n_reps -- number of cohorts per size
+    term -- design column to test, e.g., Gender[F]
+    included, n_workers, seed, batch_size, method -- passed to Simulate
+    alpha -- significance level
+    """
+
+    rows = []
+    for i, n in enumerate(sizes):
+        simulation = Simulate(population, n, n_reps, included = included, n_workers = n_workers, seed = [seed, i], batch_size = batch_size,
+                              method = method)
+        summary = Summarize(simulation, population, alpha = alpha)
+        rows.append(summary[summary['Term'] == term].assign(N = n))
+    return pd.concat(rows, axis = 0).reset_index(drop = True)
@@ -0,0 +1,46 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# the analysis scripts live one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Bootstrap import Jackknife_Coefficients, Bootstrap_Bias
+
+def Cohort(rng, n_classes = 8, class_size = 30):
+    """Students in several classes where the short model's coefficient of x1 is 1.1, the long model's is 0.5, and the bias is 0.6"""
+
+    n = n_classes * class_size
+    x1 = rng.normal(size = n)
+    x2 = 0.6 * x1 + rng.normal(size = n)
+    y = 1 + 0.5 * x1 + x2 + rng.exponential(size = n) - 1 # skewed errors, so the BCa adjustment has something to do
+    return pd.DataFrame({'Class_ID':np.repeat(np.arange(n_classes), class_size).astype(str), 'x1':x1, 'x2':x2, 'y':y})
+
+def test_jackknife_leaves_out_one_row_at_a_time():
+    rng = np.random.default_rng(0)
+    df = Cohort(rng, n_classes = 4, class_size = 10)
+    Z = np.column_stack([np.ones(len(df)), df[['x1', 'x2', 'y']].to_numpy()])
+    jack_short, jack_long = Jackknife_Coefficients(Z, [0, 1], [0, 1, 2], 1, chunk_size = 7)
+
+    for i in range(len(Z)):
+        keep = np.arange(len(Z)) != i
+        short = np.linalg.lstsq(Z[keep][:, [0, 1]], Z[keep, 3], rcond = None)[0]
+        long = np.linalg.lstsq(Z[keep][:, [0, 1, 2]], Z[keep, 3], rcond = None)[0]
+        assert np.isclose(jack_short[i], short[1])
+        assert np.isclose(jack_long[i], long[1])
+
+def test_bca_intervals_cover_the_true_values():
+    rng = np.random.default_rng(1)
+    truth = {'Short':1.1, 'Long':0.5, 'Bias':0.6}
+    covered = {key:0 for key in truth}
+    n_sims = 200
+    for sim in range(n_sims):
+        result, _ = Bootstrap_Bias(Cohort(rng), focal = 'x1', short = ['x1'], long = ['x1', 'x2'], outcome = 'y', n_reps = 400, seed = sim,
+                                   alpha = 0.1)
+        for row in result.itertuples():
+            covered[row.Estimate] += row.BCa_Lower <= truth[row.Estimate] <= row.BCa_Upper
+
+    # 90% intervals over 200 samples should cover about 180 times; the binomial standard deviation is about 4
+    for key in truth:
+        assert 165 <= covered[key] <= 193, (key, covered[key])
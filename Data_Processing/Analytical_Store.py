@@ -0,0 +1,147 @@
+import sqlite3
+import numpy as np
+import pandas as pd
+
+# A local SQLite file that master datasets can be written to alongside (or instead of) csv files, with indexes on the columns analyses filter on, so
+# pulling out one assessment or class is an indexed query instead of parsing the whole csv file every time. Each master dataset is its own table,
+# e.g., OVB_Master from Get_OVB_Master and CSEM_Master from BuildMasterCSEMDataset. In R, DBI::dbGetQuery with RSQLite reads the same file.
+INDEX_COLUMNS = ['Assessment', 'Class_ID', 'Student_ID', 'Netid']
+
+def Connect(file):
+    """Open a connection to a store
+
+    Keyword arguments:
+    file -- file path to SQLite store; created if it doesn't exist
+    """
+
+    return sqlite3.connect(file)
+
+def Quote(name):
+    """Quote a table, column, or index name for SQL, doubling any double quotes in it so it can't end the name early"""
+
+    return '"' + str(name).replace('"', '""') + '"'
+
+def Table_Columns(con, table):
+    """Names of the columns of a table, or an empty list if there's no such table"""
+
+    return [row[1] for row in con.execute('PRAGMA table_info(' + Quote(table) + ')')]
+
+def Write_Store(df, file, table, index_columns = INDEX_COLUMNS):
+    """Write a master dataset to a table in a store, replacing the table if it's already there, and index it
+
+    Keyword arguments:
+    df -- master dataframe to write
+    file -- file path to SQLite store
+    table -- name of the table, e.g., OVB_Master
+    index_columns -- columns to index; columns that aren't in df are skipped
+    """
+
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object) # stored as text
+    staging = str(table) + '_staging'
+    con = Connect(file)
+    try:
+        # to_sql commits as it goes, so the rows go into a staging table first, and it's swapped in and indexed in one transaction; readers see
+        # either the old table or the whole new one, never a half written one
+        df.to_sql(staging, con, if_exists = 'replace', index = False)
+        with con:
+            con.execute('BEGIN') # sqlite3 doesn't open a transaction on its own before DROP or ALTER
+            con.execute('DROP TABLE IF EXISTS ' + Quote(table))
+            con.execute('ALTER TABLE ' + Quote(staging) + ' RENAME TO ' + Quote(table))
+            for col in dict.fromkeys(index_columns):
+                if col in df.columns:
+                    con.execute('CREATE INDEX IF NOT EXISTS ' + Quote(str(table) + '_' + str(col)) + ' ON ' + Quote(table) + ' (' + Quote(col) + ')')
+    finally:
+        con.close()
+
+def Where_Clause(filters, columns):
+    """SQL where clause and parameters for equality filters, e.g., {'Assessment':'ECLASS', 'Course':['P1112', 'P1116']}
+
+    Keyword arguments:
+    filters -- dictionary of column names and values; a list of values keeps rows matching any of them
+    columns -- columns of the table, so filters on columns that don't exist raise an error instead of going into the SQL
+    """
+
+    clauses, params = [], []
+    for col, value in filters.items():
+        if col not in columns:
+            raise KeyError('no column ' + str(col) + ' to filter on')
+        values = list(value) if isinstance(value, (list, tuple, set, np.ndarray, pd.Series)) else [value]
+        clauses.append(Quote(col) + ' IN (' + ', '.join(['?'] * len(values)) + ')')
+        params.extend(value.item() if isinstance(value, np.generic) else value for value in values)
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+def Select(file, table = 'OVB_Master', columns = None, **filters):
+    """Read the rows of a table that match some filters
+
+    Keyword arguments:
+    file -- file path to SQLite store
+    table -- name of the table
+    columns -- list of columns to read; if None, all columns are read
+    filters -- values of columns to keep, e.g., Assessment = 'ECLASS' or Class_ID = ['2017FA-1112', '2018SP-1112']
+    """
+
+    con = Connect(file)
+    try:
+        table_columns = Table_Columns(con, table)
+        if len(table_columns) == 0:
+            raise KeyError('no table ' + str(table) + ' in ' + str(file))
+        columns = table_columns if columns is None else columns
+        missing = [col for col in columns if col not in table_columns]
+        if missing:
+            raise KeyError('no columns ' + str(missing) + ' in ' + str(table))
+        where, params = Where_Clause(filters, table_columns)
+        return pd.read_sql_query('SELECT ' + ', '.join(Quote(col) for col in columns) + ' FROM ' + Quote(table) + where, con, params = params)
+    finally:
+        con.close()
+
+def Select_Arrays(file, columns, table = 'OVB_Master', dtype = float, **filters):
+    """Read columns of the rows of a table that match some filters as numpy arrays, e.g., for the Analysis scripts
+
+    Keyword arguments:
+    file -- file path to SQLite store
+    columns -- list of columns to read
+    table -- name of the table
+    dtype -- numpy dtype of the arrays; missing values become NaN with float
+    filters -- values of columns to keep, passed to Select
+    """
+
+    df = Select(file, table = table, columns = columns, **filters)
+    return {col:df[col].to_numpy(dtype = dtype, na_value = np.nan if np.dtype(dtype).kind == 'f' else None) for col in columns}
+
+def Desc_Stats(file, var, table = 'OVB_Master', outcomes = ['PreScores', 'PostScores'], **filters):
+    """Descriptive statistics of pre and post scores grouped by a variable, computed in the store, like desc.stats in OVB_E-CLASS_Analytic.Rmd
+
+    Keyword arguments:
+    file -- file path to SQLite store
+    var -- column to group by, e.g., IntendedMajor or Instruction
+    table -- name of the table
+    outcomes -- score columns to summarize
+    filters -- values of columns to keep, passed to Select, e.g., Assessment = 'ECLASS'
+
+    Returns a dataframe with N (number of rows in each group), and the number of non-missing values, mean, and standard deviation of each outcome.
+    Unlike R's mean, missing scores are left out rather than making the mean missing.
+    """
+
+    con = Connect(file)
+    try:
+        table_columns = Table_Columns(con, table)
+        for col in [var] + outcomes:
+            if col not in table_columns:
+                raise KeyError('no column ' + str(col) + ' in ' + str(table))
+        where, params = Where_Clause(filters, table_columns)
+        # SQLite has no standard deviation, so we get sums and sums of squares and finish up here
+        sums = ', '.join('COUNT({0}) AS {1}, AVG({0}) AS {2}, SUM({0} * {0}) AS {3}'.format(Quote(col), Quote('n_' + col), Quote('avg_' + col),
+                                                                                             Quote('ss_' + col)) for col in outcomes)
+        df = pd.read_sql_query('SELECT ' + Quote(var) + ', COUNT(*) AS N, ' + sums + ' FROM ' + Quote(table) + where + ' GROUP BY ' + Quote(var) +
+                               ' ORDER BY ' + Quote(var), con, params = params)
+    finally:
+        con.close()
+
+    for col in outcomes:
+        n = df['n_' + col].astype(float)
+        variance = (df.pop('ss_' + col) - n * df['avg_' + col]**2) / (n - 1)
+        df['sd_' + col] = np.sqrt(variance.clip(lower = 0).where(n > 1))
+    return df[[var, 'N'] + [prefix + col for col in outcomes for prefix in ['n_', 'avg_', 'sd_']]]
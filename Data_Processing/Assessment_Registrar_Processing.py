@@ -1,84 +1,117 @@
 import os
 import numpy as np
 import pandas as pd
-
-def Registrar_Processing(file, consent_file):
+from File_Cache import Hash_Files, Cached_Frame
+from Columnar_Output import Write_Master
+from Registrar_Schema import (Apply_Ingest_Schema, Map_Categories, Composite_Label, CLASS_STANDING, URM_STATUS, FIRST_GEN_STATUS, SEMESTER, SEQUENCE,
+                              COURSE_CONTENT, INSTRUCTION, AP_SCORE, PERCENTILE)
+from Matching_Engine import Key_Codes, Join_Keys, Anti_Join
+from Consent_Registry import Get_Consent_Index
+from Instrumentation import Stage, Profiled
+from Streaming_Reader import Stream_CSV, CHUNKSIZE
+from Conversion_Tables import Convert, Fingerprint
+
+# lists of students who were taught with different lab instruction in 2017FA-1116 and 2018SP-2217
+FA2017_1116_FILE = 'C:/Users/Cole/Documents/DATA/Fa2017-1116_ID-condition.csv'
+SP2018_2217_FILE = 'C:/Users/Cole/Documents/DATA/Sp2018_2217_ID-condition.csv'
+
+# Cornell classes in the master PLIC dataset, and the columns we need from it
+PLIC_CLASSES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'PLIC_Classes.csv')
+PLIC_COLUMNS = ['Class_ID', 'Survey_x', 'Survey_y', 'PreScores', 'PostScores', 'Q5a_x', 'Q5a_y']
+
+# ID columns in the CSEM, MBT, and E-CLASS master files; these are read as text, like the registrar's, otherwise a file where every ID happens to be
+# numeric is read as numbers and nobody in it matches on student ID
+ID_COLUMNS = ['NetID', 'Q39', 'QC', 'QD', 'Q3_3_TEXT']
+
+# registrar score columns and the conversion tables (in Conversion_Tables.csv) used to turn them into percentiles, and AP score columns and the
+# tables used to turn them into credit cutoffs (along with the columns they go in)
+PERCENTILE_TABLES = [('ACT | Math', 'ACT_Math'), ('SAT I | Math', 'SAT_Math'), ('SAT I | Math Section Score', 'SAT_Math_Section')]
+AP_TABLES = [('AP Calculus AB Max Score', 'AP_Calculus', 'AP_Calculus_AB'), ('AP | Mathematics: Calculus BC', 'AP_Calculus', 'AP_Calculus_BC'),
+             ('AP | Physics C - Electricity & Magt', 'AP_Physics_C', 'AP_Physics_EM'), ('AP | Physics C - Mechanics', 'AP_Physics_C', 'AP_Physics_Mech')]
+
+# bump this whenever Registrar_Processing changes, so cached registrar files built by older code aren't reused
+REGISTRAR_CACHE_VERSION = 3
+
+@Profiled()
+def Registrar_Processing(file, consent_file, FA2017_1116_file = FA2017_1116_FILE, SP2018_2217_file = SP2018_2217_FILE, conversion_versions = None):
     """Process registrar file to match with assessment data
 
     Keyword arguments:
     file -- file path to registrar file
     consent_file -- file path to list of students who have opted out of research
+    FA2017_1116_file -- file path to csv file listing lab condition of students in 2017FA-1116
+    SP2018_2217_file -- file path to csv file listing lab condition of students in 2018SP-2217
+    conversion_versions -- dictionary of versions of conversion tables to use instead of the defaults, e.g., {'SAT_Math':'2024'} (see Conversion_Tables)
 
     Note that I've also included csv files with lists of students who were taught with different lab instruction in 2017FA-1116 and 2018FA-2217. Paths to
     these files whould be confirmed.
     """
 
-    df_registrar = pd.read_excel(file).drop(columns = ['ACT | Combined English/Writing', 'ACT | English', 'ACT | Reading', 'ACT | Writing',
-                                                        'ACT | Writing Subject Score 9/15', 'SAT I | Critical Reading', 'SAT I | Read/Writing Sect Score',
-                                                        'SAT I | Writing Score', 'Subject']) # we don't really care about all these reading and writing scores here
+    conversion_versions = conversion_versions or {}
+    with Stage('read registrar') as stage:
+        df_registrar = pd.read_excel(file)
+        stage.Rows_Out(df_registrar)
+    df_registrar = df_registrar.drop(columns = ['ACT | Combined English/Writing', 'ACT | English', 'ACT | Reading', 'ACT | Writing',
+                                                'ACT | Writing Subject Score 9/15', 'SAT I | Critical Reading', 'SAT I | Read/Writing Sect Score',
+                                                'SAT I | Writing Score', 'Subject']) # we don't really care about all these reading and writing scores here
     df_registrar = df_registrar.rename(columns = {'Employee Id':'Student_ID', 'Academic Term Sdescr':'Term', 'Catalog Nbr':'Course',
                                                     'Acad Level Ldescr':'Class_Standing', 'Academic Plan':'Major', 'Effdt Gender':'Gender',
                                                     'St Urm Flag':'URM_Status', 'Student Group Sdescr':'First_Gen_Status', 'Cum GPA':'GPA'})
-    df_registrar['URM_Status'] = df_registrar['URM_Status'].map({'Y':'URM', 'N':'Majority'})
-    df_registrar['First_Gen_Status'] = df_registrar['First_Gen_Status'].fillna('ContGen').map({'Frst Gen':'FirstGen', 'ContGen':'ContGen'})
-    df_registrar['Semester'] = df_registrar['Term'].apply(lambda x: x[-2:]) # get last two characters which are the semester
-    df_registrar['Sequence'] = df_registrar['Course'].map({1112:'Engineering', 2213:'Engineering', 1116:'Honours', 2217:'Honours'})
-    df_registrar['Course_Content'] = df_registrar['Course'].map({1112:'Mechanics', 2213:'EM', 1116:'Mechanics', 2217:'EM'})
-    df_registrar['Class_ID'] = df_registrar['Term'] + '-' + df_registrar['Course'].astype(str) # class is unique combo of term and course
-    df_registrar['Year'] = df_registrar['Term'].apply(lambda x: x[:4]).astype(str)
-
-    df_registrar[['Course', 'Student_ID']] = df_registrar[['Course', 'Student_ID']].astype(str)
-    df_registrar['Term_Number'] = df_registrar['Term'].map({'2017FA':1, '2018SP':2, '2018FA':3, '2019SP':4}) # get term order
+    df_registrar = Apply_Ingest_Schema(df_registrar) # low-cardinality columns are categoricals from here on
+    df_registrar['Student_ID'] = df_registrar['Student_ID'].astype(str)
+
+    df_registrar['URM_Status'] = Map_Categories(df_registrar['URM_Status'], {'Y':'URM', 'N':'Majority'}, URM_STATUS)
+    First_Gen_Status = Map_Categories(df_registrar['First_Gen_Status'], {'Frst Gen':'FirstGen'}, FIRST_GEN_STATUS)
+    First_Gen_Status[df_registrar['First_Gen_Status'].isnull()] = 'ContGen' # students who aren't in a student group are continuing generation
+    df_registrar['First_Gen_Status'] = First_Gen_Status
+    df_registrar['Semester'] = Map_Categories(df_registrar['Term'], lambda x: x[-2:], SEMESTER) # get last two characters which are the semester
+    df_registrar['Sequence'] = Map_Categories(df_registrar['Course'], {'1112':'Engineering', '2213':'Engineering', '1116':'Honours', '2217':'Honours'},
+                                              SEQUENCE)
+    df_registrar['Course_Content'] = Map_Categories(df_registrar['Course'], {'1112':'Mechanics', '2213':'EM', '1116':'Mechanics', '2217':'EM'},
+                                                    COURSE_CONTENT)
+    df_registrar['Class_ID'] = Composite_Label(df_registrar, ['Term', 'Course']) # class is unique combo of term and course
+    df_registrar['Year'] = Map_Categories(df_registrar['Term'], lambda x: x[:4], 'category')
+
+    df_registrar['Term_Number'] = df_registrar['Term'].map({'2017FA':1, '2018SP':2, '2018FA':3, '2019SP':4}, na_action = 'ignore').astype(float) # get term order
     # if a student takes the same course more than once, drop the first
     df_registrar = df_registrar.sort_values(by = 'Term_Number').drop_duplicates(subset = ['Student_ID', 'Course'],
                                                 keep = 'last').drop(columns = ['Term_Number'])
 
-    df_consent = pd.read_excel(consent_file).drop_duplicates() # list of students who did not consent to research
-    df_consent['Course'] = df_consent['Course'].str.split().str.get(1).apply(lambda x: x[:-1])
-    df_consent['Net ID:'] = df_consent['Net ID:'].str.lower().str.strip(' ')
-
-    df_registrar = df_registrar.merge(df_consent[['Net ID:', 'Course']], how = 'left', left_on = ['Netid', 'Course'], right_on = ['Net ID:', 'Course'],
-                                        indicator = 'OptOut?')
-    df_registrar = df_registrar.loc[df_registrar['OptOut?'] == 'left_only', :].drop(columns = ['OptOut?', 'Net ID:']) # remove students who opted out of research
+    # remove students who opted out of research
+    with Stage('registrar opt outs', rows_in = df_registrar) as stage:
+        Opted_Out = Get_Consent_Index(consent_file).Opted_Out_NetID(df_registrar['Course'].cat.rename_categories(lambda x: 'P' + x), df_registrar['Netid'])
+        df_registrar = df_registrar.loc[~Opted_Out, :]
+        stage.Rows_Out(df_registrar)
 
     # there are some continuing ed students, students with no URM info (grad students and continuing ed students I believe), and students with no ACT/SAT math
     # info...we remove all those student. There's like 15 out of 3039 so no biggie.
-    df_registrar = df_registrar[(df_registrar['Class_Standing'] == 'Fresh') | (df_registrar['Class_Standing'] == 'Sophomore') |
-                               (df_registrar['Class_Standing'] == 'Junior') | (df_registrar['Class_Standing'] == 'Senior')]
-    df_registrar = df_registrar[~pd.isnull(df_registrar['URM_Status'])]
-    df_registrar = df_registrar[(~pd.isnull(df_registrar['ACT | Math'])) | (~pd.isnull(df_registrar['SAT I | Math'])) |
-                               (~pd.isnull(df_registrar['SAT I | Math Section Score']))]
+    with Stage('registrar missing info', rows_in = df_registrar) as stage:
+        df_registrar = df_registrar[(df_registrar['Class_Standing'] == 'Fresh') | (df_registrar['Class_Standing'] == 'Sophomore') |
+                                   (df_registrar['Class_Standing'] == 'Junior') | (df_registrar['Class_Standing'] == 'Senior')]
+        df_registrar['Class_Standing'] = df_registrar['Class_Standing'].astype(CLASS_STANDING)
+        df_registrar = df_registrar[~pd.isnull(df_registrar['URM_Status'])]
+        df_registrar = df_registrar[(~pd.isnull(df_registrar['ACT | Math'])) | (~pd.isnull(df_registrar['SAT I | Math'])) |
+                                   (~pd.isnull(df_registrar['SAT I | Math Section Score']))]
+        stage.Rows_Out(df_registrar)
 
     ### convert ACT and SAT scores to percentiles using information provided by blog.prepscholar.com ###
 
-    ACT_Math_Dict = {1:1, 2:1, 3:1, 4:1, 5:1, 6:1, 7:1, 8:1, 9:1, 10:1, 11:1, 12:1, 13:3, 14:8, 15:18, 16:29, 17:38, 18:46, 19:51, 20:55, 21:59, 22:63, 23:68,
-                        24:73, 25:78, 26:83, 27:88, 28:91, 29:93, 30:95, 31:96, 32:97, 33:98, 34:99, 35:99, 36:100}
-
-    SAT_Math_Dict = {200:1, 210:1, 220:1, 230:1, 240:1, 250:1, 260:1, 270:1, 280:1, 290:1, 300:1, 310:1, 320:1, 330:2, 340:3, 350:4, 360:6, 370:7, 380:9,
-                        390:11, 400:13, 410:15, 420:17, 430:20, 440:22, 450:25, 460:28, 470:31, 480:34, 490:37, 500:40, 510:44, 520:49, 530:53, 540:57, 550:61,
-                        560:64, 570:66, 580:69, 590:72, 600:75, 610:77, 620:79, 630:81, 640:83, 650:85, 660:86, 670:88, 680:89, 690:91, 700:92, 710:93, 720:94,
-                        730:95, 740:96, 750:96, 760:97, 770:98, 780:98, 790:99, 800:99}
-
-    SAT_MathSection_Dict = {200:0, 210:1, 220:1, 230:1, 240:1, 250:2, 260:2, 270:2, 280:3, 290:3, 300:4, 310:5, 320:6, 330:7, 340:8, 350:10, 360:12, 370:14,
-                                380:17, 390:19, 400:22, 410:25, 420:29, 430:32, 440:35, 450:39, 460:42, 470:46, 480:49, 490:53, 500:56, 510:59, 520:62, 530:65,
-                                540:68, 550:71, 560:74, 570:76, 580:78, 590:80, 600:82, 610:84, 620:86, 630:88, 640:89, 650:91, 660:92, 670:93, 680:94, 690:95,
-                                700:96, 710:96, 720:97, 730:98, 740:98, 750:98, 760:99, 770:99, 780:99, 790:99, 800:99}
-
-    df_registrar['ACT | Math'] = df_registrar['ACT | Math'].map(ACT_Math_Dict)
-    df_registrar['SAT I | Math'] = df_registrar['SAT I | Math'].map(SAT_Math_Dict)
-    df_registrar['SAT I | Math Section Score'] = df_registrar['SAT I | Math Section Score'].map(SAT_MathSection_Dict)
+    with Stage('registrar percentiles', rows_in = df_registrar) as stage:
+        for col, table in PERCENTILE_TABLES:
+            df_registrar[col] = Convert(df_registrar[col], table, conversion_versions.get(table))
+        stage.Rows_Out(df_registrar)
 
     # if students submitted more than one score, we took the max since students can always choose not to report low scores anyway
-    df_registrar['ACT_SAT_Math_Percentile'] = df_registrar[['ACT | Math', 'SAT I | Math', 'SAT I | Math Section Score']].max(axis = 1, skipna = True)
+    df_registrar['ACT_SAT_Math_Percentile'] = pd.Series(np.fmax.reduce([df_registrar[col].to_numpy() for col, _ in PERCENTILE_TABLES]),
+                                                        index = df_registrar.index).astype(PERCENTILE)
 
     ### collapse AP scores using cutoffs applied by Cornell when determining course credit ###
 
     # students can take the AB test separately or as part of the BC test, so they can have two scores... we take the max
-    df_registrar['AP Calculus AB Max Score'] = df_registrar[['AP | Calculus AB Subscore Grade', 'AP | Mathematics: Calculus AB']].max(axis = 1, skipna = True)
-    df_registrar['AP_Calculus_AB'] = df_registrar['AP Calculus AB Max Score'].map({0:'Poor', 1:'Poor', 2:'Poor', 3:'Poor', 4:'Well', 5:'Well'})
-    df_registrar['AP_Calculus_BC'] = df_registrar['AP | Mathematics: Calculus BC'].map({0:'Poor', 1:'Poor', 2:'Poor', 3:'Poor', 4:'Well', 5:'Well'})
-    df_registrar['AP_Physics_EM'] = df_registrar['AP | Physics C - Electricity & Magt'].map({0:'Poor', 1:'Poor', 2:'Poor', 3:'Poor', 4:'Poor', 5:'Well'})
-    df_registrar['AP_Physics_Mech'] = df_registrar['AP | Physics C - Mechanics'].map({0:'Poor', 1:'Poor', 2:'Poor', 3:'Poor', 4:'Poor', 5:'Well'})
+    df_registrar['AP Calculus AB Max Score'] = np.fmax(df_registrar['AP | Calculus AB Subscore Grade'].to_numpy(dtype = float, na_value = np.nan),
+                                                       df_registrar['AP | Mathematics: Calculus AB'].to_numpy(dtype = float, na_value = np.nan))
+    for col, table, out_col in AP_TABLES:
+        df_registrar[out_col] = pd.Series(Convert(df_registrar[col], table, conversion_versions.get(table)), index = df_registrar.index).astype(AP_SCORE)
 
     df_registrar[['AP_Calculus_AB', 'AP_Calculus_BC', 'AP_Physics_EM', 'AP_Physics_Mech']] = df_registrar[['AP_Calculus_AB', 'AP_Calculus_BC', 'AP_Physics_EM',
                     'AP_Physics_Mech']].fillna('NotTaken')
@@ -88,30 +121,78 @@ def Registrar_Processing(file, consent_file):
     df_registrar.loc[(df_registrar['Course'] == '1112') & (df_registrar['Term'] == '2019SP'), 'Instruction'] = 'New'
 
     df_registrar.loc[(df_registrar['Course'] == '1116') & (df_registrar['Term'] != '2017FA'), 'Instruction'] = 'New'
-    FA2017_1116_Intervention = pd.read_csv('C:/Users/Cole/Documents/DATA/Fa2017-1116_ID-condition.csv')
+    FA2017_1116_Intervention = pd.read_csv(FA2017_1116_file)
     FA2017_1116_Intervention = FA2017_1116_Intervention.loc[FA2017_1116_Intervention['Lab.Intervention'] == 1, 'Username'] # NetID
     df_registrar.loc[(df_registrar['Course'] == '1116') & (df_registrar['Term'] == '2017FA') &
                      (df_registrar['Netid'].isin(FA2017_1116_Intervention)), 'Instruction'] = 'New'
 
     df_registrar.loc[(df_registrar['Course'] == '2217') & ((df_registrar['Term'] == '2018FA') | (df_registrar['Term'] == '2019SP')), 'Instruction'] = 'New'
-    SP2018_2217_Intervention = pd.read_csv('C:/Users/Cole/Documents/DATA/Sp2018_2217_ID-condition.csv')
+    SP2018_2217_Intervention = pd.read_csv(SP2018_2217_file)
     SP2018_2217_Intervention = SP2018_2217_Intervention.loc[SP2018_2217_Intervention['Lab.Condition'] == 'I', 'Username'] # NetID
     df_registrar.loc[(df_registrar['Course'] == '2217') & (df_registrar['Term'] == '2018SP') &
                         (df_registrar['Netid'].isin(SP2018_2217_Intervention)), 'Instruction'] = 'New'
 
     # all the courses I haven't identified as 'New' are 'Old'
-    df_registrar['Instruction'] = df_registrar['Instruction'].fillna('Old')
+    df_registrar['Instruction'] = df_registrar['Instruction'].fillna('Old').astype(INSTRUCTION)
 
     # a couple final tweaks to line up with conventions I've used with assessment data
-    df_registrar['Course'] = 'P' + df_registrar['Course']
+    df_registrar['Course'] = df_registrar['Course'].cat.rename_categories(lambda x: 'P' + x)
+    df_registrar[['Term', 'Class_ID', 'Year', 'Major']] = df_registrar[['Term', 'Class_ID', 'Year', 'Major']].apply(lambda x: x.cat.remove_unused_categories())
 
     return(df_registrar)
 
-def Process_PLIC(df_Complete, Class_ID, Year, Semester, Course):
-    df = df_Complete[df_Complete['Class_ID'] == Class_ID]
-    df['Course'] = Course
-    df['Semester'] = Semester
-    df['Year'] = Year
+@Profiled()
+def Get_Processed_Registrar(file, consent_file, cache_dir = None, FA2017_1116_file = FA2017_1116_FILE, SP2018_2217_file = SP2018_2217_FILE,
+                            conversion_versions = None):
+    """Process registrar file, reusing a cached copy if none of the source files have changed
+
+    Keyword arguments:
+    file -- file path to registrar file
+    consent_file -- file path to list of students who have opted out of research
+    cache_dir -- directory to cache the processed registrar data in (as parquet); if None, the registrar file is processed without caching
+    FA2017_1116_file -- file path to csv file listing lab condition of students in 2017FA-1116
+    SP2018_2217_file -- file path to csv file listing lab condition of students in 2018SP-2217
+    conversion_versions -- dictionary of versions of conversion tables to use instead of the defaults, passed to Registrar_Processing
+    """
+
+    conversion_versions = conversion_versions or {}
+    build = lambda: Registrar_Processing(file, consent_file, FA2017_1116_file = FA2017_1116_file, SP2018_2217_file = SP2018_2217_file,
+                                         conversion_versions = conversion_versions)
+    if cache_dir is None:
+        return build()
+
+    # the cache is keyed by the contents of every input, so editing any of them (or the processing code, or the conversion tables) forces a rebuild
+    tables = [table for _, table in PERCENTILE_TABLES] + [table for _, table, _ in AP_TABLES]
+    key = Hash_Files([file, consent_file, FA2017_1116_file, SP2018_2217_file], REGISTRAR_CACHE_VERSION, Fingerprint(tables, conversion_versions))
+    return Cached_Frame(cache_dir, 'Registrar', key, build)
+
+def PLIC_Classes(file = PLIC_CLASSES_FILE):
+    """Read the table of Cornell PLIC classes: the Class_ID (Qualtrics response set ID) of each class in the master PLIC dataset, and its Year,
+    Semester, and Course
+
+    Keyword arguments:
+    file -- file path to csv file with Class_ID, Year, Semester, and Course columns
+    """
+
+    return pd.read_csv(file, dtype = str)
+
+def Process_PLIC(df_Complete, df_Classes):
+    """Pull the Cornell classes out of the master PLIC dataset, in one pass
+
+    Keyword arguments:
+    df_Complete -- master PLIC dataframe (built in the PLIC repository)
+    df_Classes -- table of Cornell classes, from PLIC_Classes
+
+    Rows come out grouped by class, in the order of df_Classes, and in their original order within each class.
+    """
+
+    # one filter for all our classes, then each remaining response looks up its class's row in the table
+    df = df_Complete.loc[df_Complete['Class_ID'].isin(df_Classes['Class_ID'])]
+    position = pd.Index(df_Classes['Class_ID']).get_indexer(df['Class_ID'])
+    order = np.argsort(position, kind = 'stable')
+    df = df.iloc[order].reset_index(drop = True)
+    df[['Course', 'Semester', 'Year']] = df_Classes[['Course', 'Semester', 'Year']].iloc[position[order]].to_numpy()
+
     df.loc[df['Survey_x'] == 'F', 'PreScores'] = np.nan # the PLIC had some response surveys that we'll treat as missing
     df.loc[df['Survey_y'] == 'F', 'PostScores'] = np.nan
     df = df[~(pd.isnull(df['PreScores'])) | ~(pd.isnull(df['PostScores']))].reset_index(drop = True) # we only need entries where there was at least one score
@@ -120,15 +201,87 @@ def Process_PLIC(df_Complete, Class_ID, Year, Semester, Course):
     df['Student_ID'] = df['Q5a_y'].fillna(df['Q5a_x'])
     return df[['Student_ID', 'PreScores', 'PostScores', 'Semester', 'Course', 'Year']]
 
-def Registrar_Merge(assessment_file, assessment, registrar_file, consent_file):
+def Match_Registrar(df, df_Registrar, netid_col = 'Netid', fuzzy = False):
+    """Inner join assessment data with registrar data, matching students on student ID and then on NetID
+
+    Keyword arguments:
+    df -- assessment dataframe with Course, Year, and Semester columns (using the registrar's categories), Student_ID, and a NetID column
+    df_Registrar -- processed registrar data
+    netid_col -- column of df to match with the registrar's NetIDs
+    fuzzy -- whether to also match leftover students in the same class on NetIDs that are close but not equal (see Fuzzy_Matching); the similarity
+             of each of these matches is kept in Fuzzy_Score, which is missing for exact matches. Student IDs are only matched exactly, since a
+             mistyped digit usually gives another student's ID
+
+    A registered student matched both ways keeps the NetID match, like the old pair of merges concatenated with drop_duplicates(keep = 'last').
+    IDs and class columns come from the registrar side.
+    """
+
+    class_cols = ['Course', 'Year', 'Semester']
+    df_idx, registrar_idx = Join_Keys(df, df_Registrar, [(class_cols + ['Student_ID'], class_cols + ['Student_ID']),
+                                                         (class_cols + [netid_col], class_cols + ['Netid'])])
+    score = np.full(len(df_idx), np.nan)
 
-    df_Registrar = Registrar_Processing(registrar_file, consent_file)
-    df = pd.read_csv(assessment_file)
+    if fuzzy:
+        from Fuzzy_Matching import Fuzzy_Match
+
+        df_left = np.setdiff1d(np.arange(len(df)), df_idx)
+        registrar_left = np.setdiff1d(np.arange(len(df_Registrar)), registrar_idx)
+        fuzzy_df, fuzzy_registrar, _, fuzzy_score = Fuzzy_Match(df.iloc[df_left], df_Registrar.iloc[registrar_left], [('netID', [netid_col], ['Netid'])],
+                                                                block_cols = class_cols)
+        df_idx = np.concatenate([df_idx, df_left[fuzzy_df]])
+        registrar_idx = np.concatenate([registrar_idx, registrar_left[fuzzy_registrar]])
+        score = np.concatenate([score, fuzzy_score])
+
+    df_merged = pd.concat([df.iloc[df_idx].drop(columns = class_cols + ['Student_ID', 'Netid'], errors = 'ignore').reset_index(drop = True),
+                           df_Registrar.iloc[registrar_idx].reset_index(drop = True)], axis = 1)
+    if fuzzy:
+        df_merged['Fuzzy_Score'] = score
+    return df_merged
+
+def Unmatched_Registrar(df_Registrar, df_merged):
+    """Students in registrar data that were registered for classes present in the merged assessment data, but aren't in it themselves
+
+    Keyword arguments:
+    df_Registrar -- processed registrar data
+    df_merged -- assessment data merged with registrar data, from Match_Registrar
+    """
+
+    # composite keys are factorized into integer codes, so the anti-join is a lookup of integers rather than of tuples
+    class_cols = ['Course', 'Year', 'Semester']
+    registrar_classes, merged_classes = Key_Codes(df_Registrar, df_merged, class_cols, class_cols)
+    registrar_students, merged_students = Key_Codes(df_Registrar, df_merged, class_cols + ['Student_ID'], class_cols + ['Student_ID'])
+    return df_Registrar.loc[np.isin(registrar_classes, merged_classes, kind = 'table') & Anti_Join(registrar_students, merged_students)]
+
+@Profiled()
+def Registrar_Merge(assessment_file, assessment, registrar_file, consent_file, df_Registrar = None, plic_classes_file = PLIC_CLASSES_FILE,
+                    fuzzy = False):
+    """Merge assessment master file with registrar data
+
+    Keyword arguments:
+    assessment_file -- file path to master assessment csv file
+    assessment -- name of the assessment; one of CSEM, ECLASS, MBT, or PLIC
+    registrar_file -- file path to registrar file
+    consent_file -- file path to list of students who have opted out of research
+    df_Registrar -- already processed registrar data (from Get_Processed_Registrar); if None, the registrar file is processed here
+    plic_classes_file -- file path to csv file of Cornell classes in the master PLIC dataset, read with PLIC_Classes; only used for the PLIC
+    fuzzy -- whether to also match students on NetIDs that are close but not equal, passed to Match_Registrar; adds a Fuzzy_Score column
+    """
+
+    if df_Registrar is None:
+        df_Registrar = Registrar_Processing(registrar_file, consent_file)
+    with Stage('read ' + assessment) as stage:
+        if(assessment == 'PLIC'): # the master PLIC file has classes from everywhere, so we only keep the Cornell ones as it's read
+            Class_IDs = set(PLIC_Classes(plic_classes_file)['Class_ID'])
+            df = Stream_CSV(assessment_file, lambda chunk: chunk.loc[chunk['Class_ID'].isin(Class_IDs)], columns = PLIC_COLUMNS,
+                            dtype = {'Q5a_x':'str', 'Q5a_y':'str'}, chunksize = CHUNKSIZE)
+        else:
+            df = pd.read_csv(assessment_file, dtype = {col:str for col in ID_COLUMNS})
+        stage.Rows_Out(df)
     if(assessment == 'CSEM'):
-        df['IntendedMajor'] = ''
         df = df[['NetID', 'Q39', 'Total_Score_x', 'Total_Score_y', 'Semester', 'Course', 'Year']].rename(columns = {'NetID':'Netid', 'Q39':'Student_ID',
                                                                                                                     'Total_Score_x':'PreScores',
                                                                                                                     'Total_Score_y':'PostScores'})
+        df['IntendedMajor'] = ''
     elif(assessment == 'ECLASS'):
 
         conditions = [
@@ -140,65 +293,81 @@ def Registrar_Merge(assessment_file, assessment, registrar_file, consent_file):
                     'EngineeringOrOtherSci'
                     ]
 
-        df['IntendedMajor'] = np.select(conditions, output, None) # in v2 of this paper we focus on this variable and the E-CLASS
-        df = df[['Q3_3_TEXT', 'Student_Score_x', 'Student_Score_y', 'IntendedMajor', 'Semester', 'Course', 'Year']].rename(columns = {'Q3_3_TEXT':'Student_ID',
-                                                                                                                                        'Student_Score_x':'PreScores',
-                                                                                                                                        'Student_Score_y':'PostScores'})
+        IntendedMajor = np.select(conditions, output, None) # in v2 of this paper we focus on this variable and the E-CLASS
+        df = df[['Q3_3_TEXT', 'Student_Score_x', 'Student_Score_y', 'Semester', 'Course', 'Year']].rename(columns = {'Q3_3_TEXT':'Student_ID',
+                                                                                                                        'Student_Score_x':'PreScores',
+                                                                                                                        'Student_Score_y':'PostScores'})
+        df['IntendedMajor'] = IntendedMajor # added after picking out the columns we need, since adding it to the whole (wide) master file fragments it
     elif(assessment == 'MBT'):
-        df['IntendedMajor'] = ''
         df = df[['QC', 'QD', 'Total_Score_x', 'Total_Score_y', 'Semester', 'Course', 'Year']].rename(columns = {'QC':'Netid', 'QD':'Student_ID',
                                                                                                                 'Total_Score_x':'PreScores',
                                                                                                                 'Total_Score_y':'PostScores'})
+        df['IntendedMajor'] = ''
     else: # we build the master PLIC dataset elsewhere, but we only need Cornell classes here, so we'll fetch those
-        Fall2017_1112 = Process_PLIC(df, 'R_2xOT2Y1NtNiseCk', '2017', 'FA', 'P1112')
-        Fall2017_2213 = Process_PLIC(df, 'R_zfk080BHz6RWixb', '2017', 'FA', 'P2213')
-        Fall2017_1116 = Process_PLIC(df, 'R_1Oko8BpPfb9rt0G', '2017', 'FA', 'P1116')
-        Fall2017_2217 = Process_PLIC(df, 'R_12QFe4VQPh6oNW1', '2017', 'FA', 'P2217')
-
-        Spring2018_1112 = Process_PLIC(df, 'R_1LHvn3R5Afj8eUc', '2018', 'SP', 'P1112')
-        Spring2018_1116 = Process_PLIC(df, 'R_2R8MnTyv2jFgPzA', '2018', 'SP', 'P1116')
-
-        Fall2018_1112 = Process_PLIC(df, 'R_3ijRcPfXo8MUfFj', '2018', 'FA', 'P1112')
-        Fall2018_1116 = Process_PLIC(df, 'R_1IB300CxBKh0Tw7', '2018', 'FA', 'P1116')
-
-        Spring2019_1112 = Process_PLIC(df, 'R_RKRNIWFu1gZuSPf', '2019', 'SP', 'P1112')
-
-        df = pd.concat([Fall2017_1112, Fall2017_2213, Fall2017_1116, Fall2017_2217, Spring2018_1112, Spring2018_1116, Fall2018_1112, Fall2018_1116,
-                        Spring2019_1112]).reset_index(drop = True)
+        df = Process_PLIC(df, PLIC_Classes(plic_classes_file))
         df['IntendedMajor'] = ''
 
     df['Year'] = df['Year'].astype(str) # being read as int and wouldn't merge
-    df1 = pd.merge(df, df_Registrar, on = ['Course', 'Year', 'Semester', 'Student_ID'], how = 'inner')
-    if((assessment == 'ECLASS') | (assessment == 'PLIC')): # these assessments only have the one ID column and sometimes use student ID and sometimes NetID
-        df2 = pd.merge(df, df_Registrar, left_on = ['Course', 'Year', 'Semester', 'Student_ID'], right_on = ['Course', 'Year', 'Semester', 'Netid'],
-                        how = 'inner').rename(columns = {'Student_ID_y':'Student_ID'})
-    else:
-        df2 = pd.merge(df, df_Registrar, on = ['Course', 'Year', 'Semester', 'Netid'], how = 'inner').rename(columns = {'Student_ID_y':'Student_ID'})
-
-    df_merged = pd.concat([df1, df2]).drop_duplicates(subset = ['Course', 'Year', 'Semester', 'Student_ID'], keep = 'last').reset_index(drop = True)
-
-    index_vals = [tuple(v) for v in df_merged[['Course', 'Year', 'Semester', 'Student_ID']].values] # students that are in assessment dataset
-    # get dataframe of students in registrar data that were registered for classes present in the assessment dataset
-    df_courses = df_Registrar.loc[(df_Registrar['Course'] + '-' + df_Registrar['Year'] + '-' + df_Registrar['Semester']).isin(df_merged['Course'] + '-' +
-                                    df_merged['Year'] + '-' + df_merged['Semester'])].set_index(['Course', 'Year', 'Semester', 'Student_ID'])
-    filtered = df_courses.loc[~df_courses.index.isin(index_vals)].reset_index() # get students that are not in the merged dataset
+    # use the registrar's categories for the class columns, so merges compare integer codes (classes that aren't in the registrar data become missing,
+    # which doesn't matter since they can't match anyway)
+    df[['Course', 'Year', 'Semester']] = df[['Course', 'Year', 'Semester']].astype(df_Registrar[['Course', 'Year', 'Semester']].dtypes)
+    # ECLASS and PLIC only have the one ID column, which is sometimes a student ID and sometimes a NetID
+    netid_col = 'Student_ID' if((assessment == 'ECLASS') | (assessment == 'PLIC')) else 'Netid'
+    with Stage(assessment + ' identity merges', rows_in = df) as stage:
+        df_merged = Match_Registrar(df, df_Registrar, netid_col, fuzzy = fuzzy)
+        stage.Rows_Out(df_merged)
+
+    with Stage(assessment + ' unmatched registrar students', rows_in = df_Registrar) as stage:
+        filtered = Unmatched_Registrar(df_Registrar, df_merged)
+        stage.Rows_Out(filtered)
 
     df_out = pd.concat([df_merged, filtered]).reset_index(drop = True)
     df_out['Assessment'] = assessment
     df_out = df_out.loc[:, ['Student_ID', 'Netid', 'Course', 'Class_Standing', 'Major', 'Gender', 'URM_Status', 'First_Gen_Status', 'GPA',
                             'ACT_SAT_Math_Percentile', 'AP_Calculus_AB', 'AP_Calculus_BC', 'AP_Physics_EM',	'AP_Physics_Mech', 'PreScores', 'PostScores',
-                            'Assessment', 'Semester', 'Sequence', 'Course_Content', 'Instruction', 'IntendedMajor', 'Class_ID']]
+                            'Assessment', 'Semester', 'Sequence', 'Course_Content', 'Instruction', 'IntendedMajor', 'Class_ID'] +
+                        (['Fuzzy_Score'] if fuzzy else [])]
 
     return df_out
 
-def Get_OVB_Master(CSEM_file, ECLASS_file, MBT_file, PLIC_file, Registrar_file, Consent_file, outfile):
+@Profiled()
+def Get_OVB_Master(CSEM_file, ECLASS_file, MBT_file, PLIC_file, Registrar_file, Consent_file, outfile, cache_dir = None, out_format = 'csv',
+                   FA2017_1116_file = FA2017_1116_FILE, SP2018_2217_file = SP2018_2217_FILE, PLIC_classes_file = PLIC_CLASSES_FILE,
+                   store = None, fuzzy = False, conversion_versions = None):
+    """Merge all four assessments with registrar data and write one master file
+
+    Keyword arguments:
+    CSEM_file -- file path to master CSEM csv file
+    ECLASS_file -- file path to master E-CLASS csv file
+    MBT_file -- file path to master MBT csv file
+    PLIC_file -- file path to master PLIC csv file
+    Registrar_file -- file path to registrar file
+    Consent_file -- file path to list of students who have opted out of research
+    outfile -- file path to write the master dataset to
+    cache_dir -- directory to cache the processed registrar data in, passed to Get_Processed_Registrar
+    out_format -- one of csv, parquet, or feather; parquet and feather output is a directory partitioned by Assessment and Class_ID
+    FA2017_1116_file -- file path to csv file listing lab condition of students in 2017FA-1116, passed to Get_Processed_Registrar
+    SP2018_2217_file -- file path to csv file listing lab condition of students in 2018SP-2217, passed to Get_Processed_Registrar
+    PLIC_classes_file -- file path to csv file of Cornell classes in the master PLIC dataset, passed to Registrar_Merge
+    store -- file path to a SQLite store to also write the master dataset to, as table OVB_Master, for querying with Analytical_Store
+    fuzzy -- whether to also match students to the registrar on NetIDs that are close but not equal, passed to Registrar_Merge
+    conversion_versions -- dictionary of versions of conversion tables to use instead of the defaults, passed to Get_Processed_Registrar
+    """
+
+    conversion_versions = conversion_versions or {}
+
+    # the registrar data is the same for every assessment, so we only process it once
+    df_Registrar = Get_Processed_Registrar(Registrar_file, Consent_file, cache_dir = cache_dir, FA2017_1116_file = FA2017_1116_file,
+                                           SP2018_2217_file = SP2018_2217_file, conversion_versions = conversion_versions)
 
-    df_CSEM = Registrar_Merge(CSEM_file, 'CSEM', Registrar_file, Consent_file)
-    df_ECLASS = Registrar_Merge(ECLASS_file, 'ECLASS', Registrar_file, Consent_file)
-    df_MBT = Registrar_Merge(MBT_file, 'MBT', Registrar_file, Consent_file)
-    df_PLIC = Registrar_Merge(PLIC_file, 'PLIC', Registrar_file, Consent_file)
+    df_CSEM = Registrar_Merge(CSEM_file, 'CSEM', Registrar_file, Consent_file, df_Registrar = df_Registrar, fuzzy = fuzzy)
+    df_ECLASS = Registrar_Merge(ECLASS_file, 'ECLASS', Registrar_file, Consent_file, df_Registrar = df_Registrar, fuzzy = fuzzy)
+    df_MBT = Registrar_Merge(MBT_file, 'MBT', Registrar_file, Consent_file, df_Registrar = df_Registrar, fuzzy = fuzzy)
+    df_PLIC = Registrar_Merge(PLIC_file, 'PLIC', Registrar_file, Consent_file, df_Registrar = df_Registrar, plic_classes_file = PLIC_classes_file,
+                              fuzzy = fuzzy)
 
     df = pd.concat([df_CSEM, df_ECLASS, df_MBT, df_PLIC], axis = 0).reset_index(drop = True)
-    df.to_csv(outfile, index = False)
+    with Stage('write master', rows_in = df):
+        Write_Master(df, outfile, out_format = out_format, partition_cols = ['Assessment', 'Class_ID'], store = store, table = 'OVB_Master')
 
     return df
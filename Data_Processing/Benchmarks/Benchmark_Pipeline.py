@@ -0,0 +1,209 @@
+import os
+import sys
+import glob
+import json
+import time
+import pickle
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+
+# the processing scripts live one directory up
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+PROCESSING_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, PROCESSING_DIR)
+
+STAGES = ['Clean_CSEM', 'Clean_MBT', 'Clean_ECLASS', 'Match_CSEM', 'Match_MBT', 'MergePrePost', 'Registrar_Processing', 'Registrar_Merge',
+          'Get_OVB_Master']
+
+# stages that read the registrar workbook, which can't be written for more than Synthetic_Data.EXCEL_MAX_ROWS enrollments
+REGISTRAR_STAGES = ['Registrar_Processing', 'Registrar_Merge', 'Get_OVB_Master']
+
+def Prepare(dir, n, seed = 0):
+    """Generate synthetic data for one size and build the assessment master files and processed registrar data that later stages read
+
+    Keyword arguments:
+    dir -- directory to write to
+    n -- number of enrollments, passed to Synthetic_Data.Generate
+    seed -- seed for the random number generator
+    """
+
+    from Synthetic_Data import Generate, EXCEL_MAX_ROWS
+    import Consent_Registry
+
+    paths = Generate(dir, n = n, seed = seed, registrar = n <= EXCEL_MAX_ROWS)
+    Consent_Registry.Configure(master_list = paths['consent'], eclass_answers = paths['eclass_answers'])
+
+    from CSEM_Processing import BuildMasterCSEMDataset
+    from MBT_Processing import BuildMasterMBTDataset
+    from ECLASS_Processing import BuildMasterECLASSDataset
+    BuildMasterCSEMDataset(paths['CSEM_dir'])
+    BuildMasterMBTDataset(paths['MBT_dir'])
+    BuildMasterECLASSDataset(paths['ECLASS_dir'])
+    paths['CSEM_master'] = os.path.join(paths['CSEM_dir'], 'CSEM_Master.csv')
+    paths['MBT_master'] = os.path.join(paths['MBT_dir'], 'MBT_Master.csv')
+    paths['ECLASS_master'] = os.path.join(paths['ECLASS_dir'], 'E-CLASS_Master.csv')
+
+    if n <= EXCEL_MAX_ROWS:
+        from Assessment_Registrar_Processing import Registrar_Processing
+        paths['registrar_pickle'] = os.path.join(dir, 'Registrar.pkl')
+        with open(paths['registrar_pickle'], 'wb') as f:
+            pickle.dump(Registrar_Processing(paths['registrar'], paths['consent'], FA2017_1116_file = paths['FA2017_1116'],
+                                             SP2018_2217_file = paths['SP2018_2217']), f)
+
+    with open(os.path.join(dir, 'paths.json'), 'w') as f:
+        json.dump(paths, f)
+    return paths
+
+def Count_Rows(file):
+    """Number of lines in a file, not counting the header"""
+
+    with open(file, 'rb') as f:
+        return sum(1 for _ in f) - 1
+
+def Run_Stage(stage, dir):
+    """Run one pipeline stage on prepared data and report wall time, CPU time, memory, and rows in and out; meant to be run in a fresh process
+
+    Keyword arguments:
+    stage -- one of STAGES
+    dir -- directory prepared with Prepare
+    """
+
+    with open(os.path.join(dir, 'paths.json')) as f:
+        paths = json.load(f)
+    import Consent_Registry
+    Consent_Registry.Configure(master_list = paths['consent'], eclass_answers = paths['eclass_answers'])
+    import CSEM_Processing, MBT_Processing, ECLASS_Processing, Assessment_Registrar_Processing
+
+    first = lambda test, pattern: sorted(glob.glob(os.path.join(paths[test + '_dir'], 'RAW', '**', pattern), recursive = True))[0]
+    registrar_files = {'FA2017_1116_file':paths.get('FA2017_1116'), 'SP2018_2217_file':paths.get('SP2018_2217')}
+    if stage == 'Clean_CSEM':
+        inputs, run = [first('CSEM', '*Pre*csv')], lambda: CSEM_Processing.Clean_CSEM(first('CSEM', '*Pre*csv'), time_cutoff = 300)
+    elif stage == 'Clean_MBT':
+        inputs, run = [first('MBT', '*Pre*csv')], lambda: MBT_Processing.Clean_MBT(first('MBT', '*Pre*csv'), 300)
+    elif stage == 'Clean_ECLASS':
+        inputs, run = [first('ECLASS', '*PRE*csv')], lambda: ECLASS_Processing.Clean_ECLASS(first('ECLASS', '*PRE*csv'), 'P1112')
+    elif stage == 'Match_CSEM':
+        inputs = [first('CSEM', '*Pre*csv'), first('CSEM', '*Post*csv')]
+        run = lambda: CSEM_Processing.Match_CSEM(*inputs, 'FA', '2017', time_cutoff = 300)
+    elif stage == 'Match_MBT':
+        inputs = [first('MBT', '*Pre*csv'), first('MBT', '*Post*csv')]
+        run = lambda: MBT_Processing.Match_MBT(*inputs, 'FA', '2017', time_cutoff = 300)
+    elif stage == 'MergePrePost':
+        inputs = [first('ECLASS', '*PRE*csv'), first('ECLASS', '*POST*csv')]
+        run = lambda: ECLASS_Processing.MergePrePost(*inputs, 'P1112', 'FA', '2017')
+    elif stage == 'Registrar_Processing':
+        inputs = [paths['registrar']]
+        run = lambda: Assessment_Registrar_Processing.Registrar_Processing(paths['registrar'], paths['consent'], **registrar_files)
+    elif stage == 'Registrar_Merge':
+        with open(paths['registrar_pickle'], 'rb') as f:
+            df_Registrar = pickle.load(f)
+        inputs = [paths['CSEM_master']]
+        run = lambda: Assessment_Registrar_Processing.Registrar_Merge(paths['CSEM_master'], 'CSEM', None, None, df_Registrar = df_Registrar)
+    elif stage == 'Get_OVB_Master':
+        inputs = [paths['CSEM_master'], paths['ECLASS_master'], paths['MBT_master'], paths['PLIC'], paths['registrar']]
+        outfile = os.path.join(dir, 'OVB_Master.csv')
+        run = lambda: Assessment_Registrar_Processing.Get_OVB_Master(*inputs, paths['consent'], outfile, **registrar_files)
+    else:
+        raise ValueError('unknown stage ' + str(stage))
+
+    # the consent list and answer key are loaded before timing starts; every stage shares them
+    Consent_Registry.Get_Consent_Index()
+    Consent_Registry.Get_ECLASS_Answers()
+
+    from Instrumentation import Peak_RSS
+
+    rss_before = Peak_RSS()
+    wall, cpu = time.perf_counter(), time.process_time()
+    df = run()
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    rss_after = Peak_RSS()
+
+    # Peak_RSS is in bytes, and None on Windows, where memory isn't reported
+    rss_kb = None if rss_after is None else rss_after // 1024
+    rss_increase_kb = None if rss_after is None else (rss_after - rss_before) // 1024
+    return {'stage':stage, 'wall_seconds':wall, 'cpu_seconds':cpu, 'peak_rss_kb':rss_kb, 'peak_rss_increase_kb':rss_increase_kb,
+            'rows_in':sum(Count_Rows(file) for file in inputs if file.endswith('.csv')), 'rows_out':len(df)}
+
+def Git_Commit():
+    """Commit hash of the working tree, or None outside a git repository"""
+
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd = PROCESSING_DIR, capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def Run(sizes = [10**3, 10**4, 10**5], stages = STAGES, outfile = None, data_dir = None, seed = 0):
+    """Time and memory profile pipeline stages over a range of data sizes, each stage in its own process, and write the results as JSON
+
+    Keyword arguments:
+    sizes -- list of numbers of enrollments; survey files are sized in proportion (roughly a fifth of the enrollments per survey file)
+    stages -- list of stages to run, from STAGES
+    outfile -- file path to write JSON results to; if None, results are only returned
+    data_dir -- directory to generate data in (one subdirectory per size, reused by later runs); if None, a temporary directory is used
+    seed -- seed for the random number generator
+
+    Stages that need the registrar workbook are skipped for sizes above Synthetic_Data.EXCEL_MAX_ROWS, which an xlsx worksheet can't hold.
+    """
+
+    from Synthetic_Data import EXCEL_MAX_ROWS
+    import numpy, pandas
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = tmp if data_dir is None else data_dir
+        results = []
+        for n in sizes:
+            dir = os.path.join(data_dir, 'n' + str(n) + '_seed' + str(seed))
+            # data is prepared in its own process too: linux carries the peak RSS of a process across exec, so a parent that had built the
+            # masters itself would pass its peak on to every stage
+            if not os.path.isfile(os.path.join(dir, 'paths.json')):
+                subprocess.run([sys.executable, os.path.abspath(__file__), 'prepare', dir, str(n), str(seed)], capture_output = True, check = True)
+            for stage in stages:
+                if (stage in REGISTRAR_STAGES) and (n > EXCEL_MAX_ROWS):
+                    results.append({'stage':stage, 'size':n, 'skipped':'registrar workbook too large'})
+                    continue
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), stage, dir], capture_output = True, text = True, check = True)
+                results.append(dict(json.loads(out.stdout.strip().splitlines()[-1]), size = n))
+
+    report = {'benchmark':'pipeline', 'commit':Git_Commit(), 'timestamp':datetime.now(timezone.utc).isoformat(), 'python':platform.python_version(),
+              'pandas':pandas.__version__, 'numpy':numpy.__version__, 'machine':platform.machine(), 'cpu_count':os.cpu_count(), 'seed':seed,
+              'results':results}
+    if outfile is not None:
+        with open(outfile, 'w') as f:
+            json.dump(report, f, indent = 2)
+    return report
+
+def Compare(old_file, new_file):
+    """Compare two result files from Run (e.g., from two commits), stage by stage and size by size
+
+    Keyword arguments:
+    old_file -- file path to JSON results of the baseline
+    new_file -- file path to JSON results to compare with the baseline
+
+    Returns a dataframe with wall time and peak memory increase from both runs and their ratios (new / old; below 1 is an improvement).
+    """
+
+    import pandas as pd
+
+    frames = []
+    for file in [old_file, new_file]:
+        with open(file) as f:
+            report = json.load(f)
+        df = pd.DataFrame([result for result in report['results'] if 'skipped' not in result])
+        frames.append(df.set_index(['stage', 'size'])[['wall_seconds', 'peak_rss_increase_kb']])
+    df = frames[0].join(frames[1], lsuffix = '_old', rsuffix = '_new', how = 'inner')
+    df['wall_ratio'] = df['wall_seconds_new'] / df['wall_seconds_old']
+    df['memory_ratio'] = df['peak_rss_increase_kb_new'] / df['peak_rss_increase_kb_old']
+    return df.reset_index()
+
+if __name__ == '__main__':
+    if (len(sys.argv) == 3) and (sys.argv[1] in STAGES):
+        print(json.dumps(Run_Stage(sys.argv[1], sys.argv[2])))
+    elif (len(sys.argv) == 5) and (sys.argv[1] == 'prepare'):
+        Prepare(sys.argv[2], int(sys.argv[3]), seed = int(sys.argv[4]))
+    elif (len(sys.argv) == 4) and (sys.argv[1] == 'compare'):
+        print(Compare(sys.argv[2], sys.argv[3]).to_string())
+    else:
+        sizes = [int(size) for size in sys.argv[2:]] if len(sys.argv) > 2 else [10**3, 10**4, 10**5]
+        Run(sizes = sizes, outfile = sys.argv[1] if len(sys.argv) > 1 else 'benchmark_results.json')
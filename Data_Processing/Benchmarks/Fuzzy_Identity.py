@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+
+# the processing scripts live one directory up
+PROCESSING_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROCESSING_DIR)
+
+SYLLABLES = np.array(['an', 'ba', 'ce', 'di', 'el', 'fo', 'ga', 'ha', 'is', 'jo', 'ka', 'li', 'ma', 'ne', 'or', 'pa', 'qu', 'ra', 'si', 'ta', 'un',
+                      've', 'wa', 'xi', 'ya', 'zo', 'ch', 'sh', 'th', 'ng'])
+
+def Names(n, rng):
+    """Random names of two to four syllables"""
+
+    names = np.char.add(rng.choice(SYLLABLES, n), rng.choice(SYLLABLES, n))
+    for _ in range(2):
+        names = np.where(rng.random(n) < 0.5, np.char.add(names, rng.choice(SYLLABLES, n)), names)
+    return names
+
+def Typo(value, rng):
+    """A string with one random substitution, deletion, insertion, or swap of neighbouring characters"""
+
+    i = int(rng.integers(0, len(value) - 1))
+    letter = chr(int(rng.integers(97, 123)))
+    kind = rng.integers(0, 4)
+    if kind == 0:
+        return value[:i] + letter + value[i + 1:]
+    if kind == 1:
+        return value[:i] + value[i + 1:]
+    if kind == 2:
+        return value[:i] + letter + value[i:]
+    return value[:i] + value[i + 1] + value[i] + value[i + 2:]
+
+def Synthetic_Pairs(n, typo_rate = 0.1, response_rate = 0.9, seed = 0):
+    """Pretest and posttest responses of n students in 20 courses, where some posttest responses have a typo in the first or last name and the NetID
+
+    Keyword arguments:
+    n -- number of students
+    typo_rate -- fraction of posttest responses with a typo
+    response_rate -- fraction of students that take each test
+    seed -- random seed
+
+    Returns the pretest and posttest dataframes, with a Truth column holding the student's row in the roster.
+    """
+
+    rng = np.random.default_rng(seed)
+    ids = rng.permutation(np.arange(1000000, 1000000 + 10 * n))[:n]
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    initials = np.char.add(np.char.add(rng.choice(letters, n), rng.choice(letters, n)), rng.choice(letters, n))
+    roster = pd.DataFrame({'Truth':np.arange(n), 'First':Names(n, rng), 'Last':Names(n, rng), 'NetID':np.char.add(initials, (ids - 1000000).astype(str)),
+                           'Course':rng.integers(0, 20, n).astype(str)})
+
+    df_pre = roster[rng.random(n) < response_rate].sample(frac = 1, random_state = 1).reset_index(drop = True)
+    df_post = roster[rng.random(n) < response_rate].sample(frac = 1, random_state = 2).reset_index(drop = True)
+    typos = np.flatnonzero(rng.random(len(df_post)) < typo_rate)
+    cols = rng.choice(['First', 'Last'], len(typos))
+    for row, col in zip(typos, cols): # a typo in the name and the NetID, so the exact keys can't match them
+        df_post.loc[row, col] = Typo(df_post.loc[row, col], rng)
+        df_post.loc[row, 'NetID'] = Typo(df_post.loc[row, 'NetID'], rng)
+    return df_pre, df_post
+
+def Run(n, typo_rate = 0.1):
+    """Time fuzzy matching of the pretest and posttest responses of n students, and check the matches against the truth
+
+    Keyword arguments:
+    n -- number of students
+    typo_rate -- fraction of posttest responses with a typo
+    """
+
+    from Matching_Engine import Merge_Pre_Post
+
+    df_pre, df_post = Synthetic_Pairs(n, typo_rate = typo_rate)
+    keys = [('name', ['First', 'Last'], ['First', 'Last']), ('netID', ['NetID'], ['NetID'])]
+
+    start = time.perf_counter()
+    df, stats = Merge_Pre_Post(df_pre, df_post, keys)
+    exact_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df, stats = Merge_Pre_Post(df_pre, df_post, keys, fuzzy_keys = keys, block_cols = ['Course'])
+    fuzzy_seconds = time.perf_counter() - start
+
+    matched = df.dropna(subset = ['Truth_x', 'Truth_y'])
+    fuzzy = matched.loc[matched['Fuzzy_Score'].notna()]
+    both = np.intersect1d(df_pre['Truth'], df_post['Truth'])
+    exact_missed = len(both) - (len(matched) - len(fuzzy)) # students that took both tests but didn't match exactly, i.e., had a typo in both keys
+    return {'benchmark':'fuzzy_matching', 'students':n, 'pre':len(df_pre), 'post':len(df_post), 'took_both':len(both),
+            'exact_matches':len(matched) - len(fuzzy), 'fuzzy_matches':len(fuzzy), 'fuzzy_correct':int((fuzzy['Truth_x'] == fuzzy['Truth_y']).sum()),
+            'fuzzy_recall':float((fuzzy['Truth_x'] == fuzzy['Truth_y']).sum() / max(exact_missed, 1)), 'exact_seconds':exact_seconds,
+            'fuzzy_seconds':fuzzy_seconds, 'fuzzy_us_per_row':1e6 * (fuzzy_seconds - exact_seconds) / (len(df_pre) + len(df_post))}
+
+def Scaling(sizes = [10**4, 10**5, 2 * 10**5]):
+    """Run the benchmark at several sizes; roughly constant fuzzy_us_per_row across sizes means the blocking keeps the work linear
+
+    Keyword arguments:
+    sizes -- list of numbers of students to try
+    """
+
+    return [Run(n) for n in sizes]
+
+if __name__ == '__main__':
+    sizes = [int(size) for size in sys.argv[1:]] if len(sys.argv) > 1 else [10**4, 10**5, 2 * 10**5]
+    print(json.dumps(Scaling(sizes), indent = 2))
@@ -0,0 +1,32 @@
+import os
+import sys
+import json
+import subprocess
+
+# the processing scripts live one directory up
+PROCESSING_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# pandas and numpy are imported first, so we only time what the processing scripts themselves do at import
+SNIPPET = """
+import time
+import numpy, pandas
+start = time.perf_counter()
+import ECLASS_Processing, CSEM_Processing, MBT_Processing, Assessment_Registrar_Processing
+print(time.perf_counter() - start)
+"""
+
+def Time_Imports(repeats = 5):
+    """Time importing the processing scripts in fresh python processes
+
+    Keyword arguments:
+    repeats -- number of fresh processes to time the imports in
+    """
+
+    times = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, '-c', SNIPPET], cwd = PROCESSING_DIR, capture_output = True, text = True, check = True)
+        times.append(float(out.stdout.strip()))
+    return {'benchmark':'import_time', 'repeats':repeats, 'min_seconds':min(times), 'max_seconds':max(times)}
+
+if __name__ == '__main__':
+    print(json.dumps(Time_Imports(), indent = 2))
@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+
+# the processing scripts live one directory up
+PROCESSING_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROCESSING_DIR)
+
+def Legacy_Match(df, df_Registrar):
+    """The old pair of merges on student ID and NetID, concatenated and deduplicated"""
+
+    df1 = pd.merge(df, df_Registrar, on = ['Course', 'Year', 'Semester', 'Student_ID'], how = 'inner')
+    df2 = pd.merge(df, df_Registrar, on = ['Course', 'Year', 'Semester', 'Netid'], how = 'inner').rename(columns = {'Student_ID_y':'Student_ID'})
+    return pd.concat([df1, df2]).drop_duplicates(subset = ['Course', 'Year', 'Semester', 'Student_ID'], keep = 'last').reset_index(drop = True)
+
+def Legacy_Unmatched(df_Registrar, df_merged):
+    """The old anti-join, kept as it was in Registrar_Merge: classes are picked out with concatenated strings, and students with a MultiIndex
+    checked against a list of tuples. It needs plain string columns (see Registrar_Memory.Untyped), which is what the old code worked on
+    """
+
+    index_vals = [tuple(v) for v in df_merged[['Course', 'Year', 'Semester', 'Student_ID']].values] # students that are in assessment dataset
+    # get dataframe of students in registrar data that were registered for classes present in the assessment dataset
+    df_courses = df_Registrar.loc[(df_Registrar['Course'] + '-' + df_Registrar['Year'] + '-' + df_Registrar['Semester']).isin(df_merged['Course'] + '-' +
+                                    df_merged['Year'] + '-' + df_merged['Semester'])].set_index(['Course', 'Year', 'Semester', 'Student_ID'])
+    filtered = df_courses.loc[~df_courses.index.isin(index_vals)].reset_index() # get students that are not in the merged dataset
+    return filtered
+
+def Best_Time(function, *args, repeats = 3):
+    """Fastest of several runs of a function, in seconds"""
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def Run(n, repeats = 3):
+    """Time the old and new registrar matching and anti-join on a synthetic registrar with n students, about half of whom took the assessment
+
+    Keyword arguments:
+    n -- number of students in the registrar data
+    repeats -- number of runs to take the fastest of
+    """
+
+    from Registrar_Memory import Synthetic_Registrar, Untyped
+    from Assessment_Registrar_Processing import Match_Registrar, Unmatched_Registrar
+
+    df_Registrar = Synthetic_Registrar(n)
+    # a third of the students who took the assessment only match on student ID and a third only on NetID
+    df = df_Registrar.sample(frac = 0.5, random_state = 0)[['Course', 'Year', 'Semester', 'Student_ID', 'Netid']].reset_index(drop = True)
+    third = len(df) // 3
+    df.loc[:third, 'Netid'] = 'x' + df.loc[:third, 'Netid']
+    df.loc[third:2 * third, 'Student_ID'] = 'x' + df.loc[third:2 * third, 'Student_ID']
+    df['PreScores'] = np.random.default_rng(1).integers(0, 33, len(df))
+
+    df_merged = Match_Registrar(df, df_Registrar)
+    # the old code worked on plain strings, so it gets the same data with the categoricals undone
+    df_untyped, df_Registrar_untyped, df_merged_untyped = Untyped(df), Untyped(df_Registrar), Untyped(df_merged)
+    unmatched = Unmatched_Registrar(df_Registrar, df_merged)
+    legacy_unmatched = Legacy_Unmatched(df_Registrar_untyped, df_merged_untyped)
+    Keys = lambda df: sorted(df[['Course', 'Year', 'Semester', 'Student_ID']].astype(str).itertuples(index = False, name = None))
+    result = {'benchmark':'registrar_anti_join', 'rows':n, 'assessment_rows':len(df), 'unmatched_rows':len(unmatched),
+              'same':Keys(unmatched) == Keys(legacy_unmatched)}
+    for name, function, args in [('legacy_match', Legacy_Match, (df_untyped, df_Registrar_untyped)), ('match', Match_Registrar, (df, df_Registrar)),
+                                 ('legacy_unmatched', Legacy_Unmatched, (df_Registrar_untyped, df_merged_untyped)),
+                                 ('unmatched', Unmatched_Registrar, (df_Registrar, df_merged))]:
+        seconds = Best_Time(function, *args, repeats = repeats)
+        result[name + '_seconds'] = seconds
+        result[name + '_ns_per_row'] = 1e9 * seconds / n
+    return result
+
+def Scaling(sizes = [10**4, 10**5, 10**6]):
+    """Run the comparison at several sizes; roughly constant ns_per_row across sizes means linear scaling
+
+    Keyword arguments:
+    sizes -- list of numbers of students to try
+    """
+
+    return [Run(n) for n in sizes]
+
+if __name__ == '__main__':
+    sizes = [int(size) for size in sys.argv[1:]] if len(sys.argv) > 1 else [10**4, 10**5, 10**6]
+    print(json.dumps(Scaling(sizes), indent = 2))
@@ -0,0 +1,353 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import subprocess
+import numpy as np
+import pandas as pd
+
+# the processing scripts live one directory up
+PROCESSING_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROCESSING_DIR)
+
+# Peak memory of the whole registrar stage (reading the registrar workbook, Registrar_Processing, and Registrar_Merge on a CSEM master file) with the
+# code from before the categorical schema and with the current code, each run in its own process on the same synthetic data. The old code is kept
+# below as it was, apart from the function names.
+
+def Synthetic_Registrar(n, seed = 0):
+    """Build a processed registrar dataframe (as returned by Registrar_Processing) with fake students
+
+    Keyword arguments:
+    n -- number of students
+    seed -- seed for the random number generator
+    """
+
+    from Registrar_Schema import (CLASS_STANDING, URM_STATUS, FIRST_GEN_STATUS, SEMESTER, SEQUENCE, COURSE_CONTENT, INSTRUCTION, AP_SCORE, PERCENTILE,
+                                  Composite_Label)
+
+    rng = np.random.default_rng(seed)
+    terms = np.array([str(year) + semester for year in range(2010, 2020) for semester in ['FA', 'SP']])
+    courses = np.array(['P1112', 'P2213', 'P1116', 'P2217'])
+    df = pd.DataFrame({'Student_ID':rng.permutation(10 * n)[:n].astype(str), 'Netid':np.char.add('ab', rng.permutation(10 * n)[:n].astype(str)),
+                       'Term':pd.Categorical(rng.choice(terms, n)), 'Course':pd.Categorical(rng.choice(courses, n)),
+                       'Class_Standing':pd.Categorical(rng.choice(CLASS_STANDING.categories, n), dtype = CLASS_STANDING),
+                       'Major':pd.Categorical(rng.choice(['ENGR', 'PHYS', 'MATH', 'CS', 'CHEM'], n)),
+                       'Gender':pd.Categorical(rng.choice(['M', 'F'], n)),
+                       'URM_Status':pd.Categorical(rng.choice(URM_STATUS.categories, n), dtype = URM_STATUS),
+                       'First_Gen_Status':pd.Categorical(rng.choice(FIRST_GEN_STATUS.categories, n), dtype = FIRST_GEN_STATUS),
+                       'GPA':rng.uniform(2, 4.3, n).round(2),
+                       'ACT_SAT_Math_Percentile':pd.array(rng.integers(1, 101, n), dtype = PERCENTILE)})
+    df['Semester'] = df['Term'].map(lambda x: x[-2:]).astype(SEMESTER)
+    df['Year'] = df['Term'].map(lambda x: x[:4]).astype('category')
+    df['Class_ID'] = Composite_Label(df, ['Term', 'Course'])
+    df['Sequence'] = df['Course'].map({'P1112':'Engineering', 'P2213':'Engineering', 'P1116':'Honours', 'P2217':'Honours'}).astype(SEQUENCE)
+    df['Course_Content'] = df['Course'].map({'P1112':'Mechanics', 'P2213':'EM', 'P1116':'Mechanics', 'P2217':'EM'}).astype(COURSE_CONTENT)
+    df['Instruction'] = pd.Categorical(rng.choice(INSTRUCTION.categories, n), dtype = INSTRUCTION)
+    for col in ['AP_Calculus_AB', 'AP_Calculus_BC', 'AP_Physics_EM', 'AP_Physics_Mech']:
+        df[col] = pd.Categorical(rng.choice(AP_SCORE.categories, n), dtype = AP_SCORE)
+    return df
+
+def Untyped(df):
+    """Convert a typed registrar dataframe back to plain strings and floats, the way Registrar_Processing used to return it
+
+    Keyword arguments:
+    df -- registrar dataframe from Synthetic_Registrar or Registrar_Processing
+    """
+
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif df[col].dtype == 'UInt8':
+            df[col] = df[col].astype(float)
+    return df
+
+def Legacy_Registrar_Processing(file, consent_file, FA2017_1116_file, SP2018_2217_file):
+    """Registrar_Processing from before the categorical schema, kept verbatim (plain strings and floats throughout)
+
+    Keyword arguments:
+    file -- file path to registrar file
+    consent_file -- file path to list of students who have opted out of research
+    FA2017_1116_file -- file path to csv file listing lab condition of students in 2017FA-1116
+    SP2018_2217_file -- file path to csv file listing lab condition of students in 2018SP-2217
+
+    Note that I've also included csv files with lists of students who were taught with different lab instruction in 2017FA-1116 and 2018FA-2217. Paths to
+    these files whould be confirmed.
+    """
+
+    df_registrar = pd.read_excel(file).drop(columns = ['ACT | Combined English/Writing', 'ACT | English', 'ACT | Reading', 'ACT | Writing',
+                                                        'ACT | Writing Subject Score 9/15', 'SAT I | Critical Reading', 'SAT I | Read/Writing Sect Score',
+                                                        'SAT I | Writing Score', 'Subject']) # we don't really care about all these reading and writing scores here
+    df_registrar = df_registrar.rename(columns = {'Employee Id':'Student_ID', 'Academic Term Sdescr':'Term', 'Catalog Nbr':'Course',
+                                                    'Acad Level Ldescr':'Class_Standing', 'Academic Plan':'Major', 'Effdt Gender':'Gender',
+                                                    'St Urm Flag':'URM_Status', 'Student Group Sdescr':'First_Gen_Status', 'Cum GPA':'GPA'})
+    df_registrar['URM_Status'] = df_registrar['URM_Status'].map({'Y':'URM', 'N':'Majority'})
+    df_registrar['First_Gen_Status'] = df_registrar['First_Gen_Status'].fillna('ContGen').map({'Frst Gen':'FirstGen', 'ContGen':'ContGen'})
+    df_registrar['Semester'] = df_registrar['Term'].apply(lambda x: x[-2:]) # get last two characters which are the semester
+    df_registrar['Sequence'] = df_registrar['Course'].map({1112:'Engineering', 2213:'Engineering', 1116:'Honours', 2217:'Honours'})
+    df_registrar['Course_Content'] = df_registrar['Course'].map({1112:'Mechanics', 2213:'EM', 1116:'Mechanics', 2217:'EM'})
+    df_registrar['Class_ID'] = df_registrar['Term'] + '-' + df_registrar['Course'].astype(str) # class is unique combo of term and course
+    df_registrar['Year'] = df_registrar['Term'].apply(lambda x: x[:4]).astype(str)
+
+    df_registrar[['Course', 'Student_ID']] = df_registrar[['Course', 'Student_ID']].astype(str)
+    df_registrar['Term_Number'] = df_registrar['Term'].map({'2017FA':1, '2018SP':2, '2018FA':3, '2019SP':4}) # get term order
+    # if a student takes the same course more than once, drop the first
+    df_registrar = df_registrar.sort_values(by = 'Term_Number').drop_duplicates(subset = ['Student_ID', 'Course'],
+                                                keep = 'last').drop(columns = ['Term_Number'])
+
+    df_consent = pd.read_excel(consent_file).drop_duplicates() # list of students who did not consent to research
+    df_consent['Course'] = df_consent['Course'].str.split().str.get(1).apply(lambda x: x[:-1])
+    df_consent['Net ID:'] = df_consent['Net ID:'].str.lower().str.strip(' ')
+
+    df_registrar = df_registrar.merge(df_consent[['Net ID:', 'Course']], how = 'left', left_on = ['Netid', 'Course'], right_on = ['Net ID:', 'Course'],
+                                        indicator = 'OptOut?')
+    df_registrar = df_registrar.loc[df_registrar['OptOut?'] == 'left_only', :].drop(columns = ['OptOut?', 'Net ID:']) # remove students who opted out of research
+
+    # there are some continuing ed students, students with no URM info (grad students and continuing ed students I believe), and students with no ACT/SAT math
+    # info...we remove all those student. There's like 15 out of 3039 so no biggie.
+    df_registrar = df_registrar[(df_registrar['Class_Standing'] == 'Fresh') | (df_registrar['Class_Standing'] == 'Sophomore') |
+                               (df_registrar['Class_Standing'] == 'Junior') | (df_registrar['Class_Standing'] == 'Senior')]
+    df_registrar = df_registrar[~pd.isnull(df_registrar['URM_Status'])]
+    df_registrar = df_registrar[(~pd.isnull(df_registrar['ACT | Math'])) | (~pd.isnull(df_registrar['SAT I | Math'])) |
+                               (~pd.isnull(df_registrar['SAT I | Math Section Score']))]
+
+    ### convert ACT and SAT scores to percentiles using information provided by blog.prepscholar.com ###
+
+    ACT_Math_Dict = {1:1, 2:1, 3:1, 4:1, 5:1, 6:1, 7:1, 8:1, 9:1, 10:1, 11:1, 12:1, 13:3, 14:8, 15:18, 16:29, 17:38, 18:46, 19:51, 20:55, 21:59, 22:63, 23:68,
+                        24:73, 25:78, 26:83, 27:88, 28:91, 29:93, 30:95, 31:96, 32:97, 33:98, 34:99, 35:99, 36:100}
+
+    SAT_Math_Dict = {200:1, 210:1, 220:1, 230:1, 240:1, 250:1, 260:1, 270:1, 280:1, 290:1, 300:1, 310:1, 320:1, 330:2, 340:3, 350:4, 360:6, 370:7, 380:9,
+                        390:11, 400:13, 410:15, 420:17, 430:20, 440:22, 450:25, 460:28, 470:31, 480:34, 490:37, 500:40, 510:44, 520:49, 530:53, 540:57, 550:61,
+                        560:64, 570:66, 580:69, 590:72, 600:75, 610:77, 620:79, 630:81, 640:83, 650:85, 660:86, 670:88, 680:89, 690:91, 700:92, 710:93, 720:94,
+                        730:95, 740:96, 750:96, 760:97, 770:98, 780:98, 790:99, 800:99}
+
+    SAT_MathSection_Dict = {200:0, 210:1, 220:1, 230:1, 240:1, 250:2, 260:2, 270:2, 280:3, 290:3, 300:4, 310:5, 320:6, 330:7, 340:8, 350:10, 360:12, 370:14,
+                                380:17, 390:19, 400:22, 410:25, 420:29, 430:32, 440:35, 450:39, 460:42, 470:46, 480:49, 490:53, 500:56, 510:59, 520:62, 530:65,
+                                540:68, 550:71, 560:74, 570:76, 580:78, 590:80, 600:82, 610:84, 620:86, 630:88, 640:89, 650:91, 660:92, 670:93, 680:94, 690:95,
+                                700:96, 710:96, 720:97, 730:98, 740:98, 750:98, 760:99, 770:99, 780:99, 790:99, 800:99}
+
+    df_registrar['ACT | Math'] = df_registrar['ACT | Math'].map(ACT_Math_Dict)
+    df_registrar['SAT I | Math'] = df_registrar['SAT I | Math'].map(SAT_Math_Dict)
+    df_registrar['SAT I | Math Section Score'] = df_registrar['SAT I | Math Section Score'].map(SAT_MathSection_Dict)
+
+    # if students submitted more than one score, we took the max since students can always choose not to report low scores anyway
+    df_registrar['ACT_SAT_Math_Percentile'] = df_registrar[['ACT | Math', 'SAT I | Math', 'SAT I | Math Section Score']].max(axis = 1, skipna = True)
+
+    ### collapse AP scores using cutoffs applied by Cornell when determining course credit ###
+
+    # students can take the AB test separately or as part of the BC test, so they can have two scores... we take the max
+    df_registrar['AP Calculus AB Max Score'] = df_registrar[['AP | Calculus AB Subscore Grade', 'AP | Mathematics: Calculus AB']].max(axis = 1, skipna = True)
+    df_registrar['AP_Calculus_AB'] = df_registrar['AP Calculus AB Max Score'].map({0:'Poor', 1:'Poor', 2:'Poor', 3:'Poor', 4:'Well', 5:'Well'})
+    df_registrar['AP_Calculus_BC'] = df_registrar['AP | Mathematics: Calculus BC'].map({0:'Poor', 1:'Poor', 2:'Poor', 3:'Poor', 4:'Well', 5:'Well'})
+    df_registrar['AP_Physics_EM'] = df_registrar['AP | Physics C - Electricity & Magt'].map({0:'Poor', 1:'Poor', 2:'Poor', 3:'Poor', 4:'Poor', 5:'Well'})
+    df_registrar['AP_Physics_Mech'] = df_registrar['AP | Physics C - Mechanics'].map({0:'Poor', 1:'Poor', 2:'Poor', 3:'Poor', 4:'Poor', 5:'Well'})
+
+    df_registrar[['AP_Calculus_AB', 'AP_Calculus_BC', 'AP_Physics_EM', 'AP_Physics_Mech']] = df_registrar[['AP_Calculus_AB', 'AP_Calculus_BC', 'AP_Physics_EM',
+                    'AP_Physics_Mech']].fillna('NotTaken')
+
+    # add column to registrar data identifying the type of lab instruction students received...in 2017FA 1116 and 2018SP 2217 there was a split
+    # I pulled data from files made by Emily Smith to construct lists of students in each type of lab during those semesters...confirm correctness of file paths
+    df_registrar.loc[(df_registrar['Course'] == '1112') & (df_registrar['Term'] == '2019SP'), 'Instruction'] = 'New'
+
+    df_registrar.loc[(df_registrar['Course'] == '1116') & (df_registrar['Term'] != '2017FA'), 'Instruction'] = 'New'
+    FA2017_1116_Intervention = pd.read_csv(FA2017_1116_file)
+    FA2017_1116_Intervention = FA2017_1116_Intervention.loc[FA2017_1116_Intervention['Lab.Intervention'] == 1, 'Username'] # NetID
+    df_registrar.loc[(df_registrar['Course'] == '1116') & (df_registrar['Term'] == '2017FA') &
+                     (df_registrar['Netid'].isin(FA2017_1116_Intervention)), 'Instruction'] = 'New'
+
+    df_registrar.loc[(df_registrar['Course'] == '2217') & ((df_registrar['Term'] == '2018FA') | (df_registrar['Term'] == '2019SP')), 'Instruction'] = 'New'
+    SP2018_2217_Intervention = pd.read_csv(SP2018_2217_file)
+    SP2018_2217_Intervention = SP2018_2217_Intervention.loc[SP2018_2217_Intervention['Lab.Condition'] == 'I', 'Username'] # NetID
+    df_registrar.loc[(df_registrar['Course'] == '2217') & (df_registrar['Term'] == '2018SP') &
+                        (df_registrar['Netid'].isin(SP2018_2217_Intervention)), 'Instruction'] = 'New'
+
+    # all the courses I haven't identified as 'New' are 'Old'
+    df_registrar['Instruction'] = df_registrar['Instruction'].fillna('Old')
+
+    # a couple final tweaks to line up with conventions I've used with assessment data
+    df_registrar['Course'] = 'P' + df_registrar['Course']
+
+    return(df_registrar)
+
+def Legacy_Process_PLIC(df_Complete, Class_ID, Year, Semester, Course):
+    """Process_PLIC from before the categorical schema, kept verbatim"""
+
+    df = df_Complete[df_Complete['Class_ID'] == Class_ID]
+    df['Course'] = Course
+    df['Semester'] = Semester
+    df['Year'] = Year
+    df.loc[df['Survey_x'] == 'F', 'PreScores'] = np.nan # the PLIC had some response surveys that we'll treat as missing
+    df.loc[df['Survey_y'] == 'F', 'PostScores'] = np.nan
+    df = df[~(pd.isnull(df['PreScores'])) | ~(pd.isnull(df['PostScores']))].reset_index(drop = True) # we only need entries where there was at least one score
+    df['Q5a_x'] = df['Q5a_x'].astype(str).str.split('@').str.get(0).str.lower()
+    df['Q5a_y'] = df['Q5a_y'].astype(str).str.split('@').str.get(0).str.lower()
+    df['Student_ID'] = df['Q5a_y'].fillna(df['Q5a_x'])
+    return df[['Student_ID', 'PreScores', 'PostScores', 'Semester', 'Course', 'Year']]
+
+def Legacy_Registrar_Merge(assessment_file, assessment, registrar_file, consent_file, df_Registrar = None):
+    """Registrar_Merge from before the categorical schema, kept verbatim
+
+    Keyword arguments:
+    assessment_file -- file path to master assessment csv file
+    assessment -- name of the assessment; one of CSEM, ECLASS, MBT, or PLIC
+    registrar_file -- file path to registrar file
+    consent_file -- file path to list of students who have opted out of research
+    df_Registrar -- already processed registrar data (from Get_Processed_Registrar); if None, the registrar file is processed here
+    """
+
+    if df_Registrar is None:
+        df_Registrar = Legacy_Registrar_Processing(registrar_file, consent_file)
+    df = pd.read_csv(assessment_file)
+    if(assessment == 'CSEM'):
+        df = df[['NetID', 'Q39', 'Total_Score_x', 'Total_Score_y', 'Semester', 'Course', 'Year']].rename(columns = {'NetID':'Netid', 'Q39':'Student_ID',
+                                                                                                                    'Total_Score_x':'PreScores',
+                                                                                                                    'Total_Score_y':'PostScores'})
+        df['IntendedMajor'] = ''
+    elif(assessment == 'ECLASS'):
+
+        conditions = [
+                        (df['Q47'] == 1) | (df['Q47'] == 6) | (df['Q47'] == 7) | (df['Q47'] == 8) | (df['Q47'] == 9),
+                        df['Q47'] < 14
+                        ]
+        output = [
+                    'Physics',
+                    'EngineeringOrOtherSci'
+                    ]
+
+        df['IntendedMajor'] = np.select(conditions, output, None) # in v2 of this paper we focus on this variable and the E-CLASS
+        df = df[['Q3_3_TEXT', 'Student_Score_x', 'Student_Score_y', 'IntendedMajor', 'Semester', 'Course', 'Year']].rename(columns = {'Q3_3_TEXT':'Student_ID',
+                                                                                                                                        'Student_Score_x':'PreScores',
+                                                                                                                                        'Student_Score_y':'PostScores'})
+    elif(assessment == 'MBT'):
+        df = df[['QC', 'QD', 'Total_Score_x', 'Total_Score_y', 'Semester', 'Course', 'Year']].rename(columns = {'QC':'Netid', 'QD':'Student_ID',
+                                                                                                                'Total_Score_x':'PreScores',
+                                                                                                                'Total_Score_y':'PostScores'})
+        df['IntendedMajor'] = ''
+    else: # we build the master PLIC dataset elsewhere, but we only need Cornell classes here, so we'll fetch those
+        Fall2017_1112 = Legacy_Process_PLIC(df, 'R_2xOT2Y1NtNiseCk', '2017', 'FA', 'P1112')
+        Fall2017_2213 = Legacy_Process_PLIC(df, 'R_zfk080BHz6RWixb', '2017', 'FA', 'P2213')
+        Fall2017_1116 = Legacy_Process_PLIC(df, 'R_1Oko8BpPfb9rt0G', '2017', 'FA', 'P1116')
+        Fall2017_2217 = Legacy_Process_PLIC(df, 'R_12QFe4VQPh6oNW1', '2017', 'FA', 'P2217')
+
+        Spring2018_1112 = Legacy_Process_PLIC(df, 'R_1LHvn3R5Afj8eUc', '2018', 'SP', 'P1112')
+        Spring2018_1116 = Legacy_Process_PLIC(df, 'R_2R8MnTyv2jFgPzA', '2018', 'SP', 'P1116')
+
+        Fall2018_1112 = Legacy_Process_PLIC(df, 'R_3ijRcPfXo8MUfFj', '2018', 'FA', 'P1112')
+        Fall2018_1116 = Legacy_Process_PLIC(df, 'R_1IB300CxBKh0Tw7', '2018', 'FA', 'P1116')
+
+        Spring2019_1112 = Legacy_Process_PLIC(df, 'R_RKRNIWFu1gZuSPf', '2019', 'SP', 'P1112')
+
+        df = pd.concat([Fall2017_1112, Fall2017_2213, Fall2017_1116, Fall2017_2217, Spring2018_1112, Spring2018_1116, Fall2018_1112, Fall2018_1116,
+                        Spring2019_1112]).reset_index(drop = True)
+        df['IntendedMajor'] = ''
+
+    df['Year'] = df['Year'].astype(str) # being read as int and wouldn't merge
+    df1 = pd.merge(df, df_Registrar, on = ['Course', 'Year', 'Semester', 'Student_ID'], how = 'inner')
+    if((assessment == 'ECLASS') | (assessment == 'PLIC')): # these assessments only have the one ID column and sometimes use student ID and sometimes NetID
+        df2 = pd.merge(df, df_Registrar, left_on = ['Course', 'Year', 'Semester', 'Student_ID'], right_on = ['Course', 'Year', 'Semester', 'Netid'],
+                        how = 'inner').rename(columns = {'Student_ID_y':'Student_ID'})
+    else:
+        df2 = pd.merge(df, df_Registrar, on = ['Course', 'Year', 'Semester', 'Netid'], how = 'inner').rename(columns = {'Student_ID_y':'Student_ID'})
+
+    df_merged = pd.concat([df1, df2]).drop_duplicates(subset = ['Course', 'Year', 'Semester', 'Student_ID'], keep = 'last').reset_index(drop = True)
+
+    index_vals = [tuple(v) for v in df_merged[['Course', 'Year', 'Semester', 'Student_ID']].values] # students that are in assessment dataset
+    # get dataframe of students in registrar data that were registered for classes present in the assessment dataset
+    df_courses = df_Registrar.loc[(df_Registrar['Course'] + '-' + df_Registrar['Year'] + '-' + df_Registrar['Semester']).isin(df_merged['Course'] + '-' +
+                                    df_merged['Year'] + '-' + df_merged['Semester'])].set_index(['Course', 'Year', 'Semester', 'Student_ID'])
+    filtered = df_courses.loc[~df_courses.index.isin(index_vals)].reset_index() # get students that are not in the merged dataset
+
+    df_out = pd.concat([df_merged, filtered]).reset_index(drop = True)
+    df_out['Assessment'] = assessment
+    df_out = df_out.loc[:, ['Student_ID', 'Netid', 'Course', 'Class_Standing', 'Major', 'Gender', 'URM_Status', 'First_Gen_Status', 'GPA',
+                            'ACT_SAT_Math_Percentile', 'AP_Calculus_AB', 'AP_Calculus_BC', 'AP_Physics_EM',	'AP_Physics_Mech', 'PreScores', 'PostScores',
+                            'Assessment', 'Semester', 'Sequence', 'Course_Content', 'Instruction', 'IntendedMajor', 'Class_ID']]
+
+    return df_out
+
+def Prepare(dir, n, seed = 0):
+    """Generate synthetic data for one size (with Benchmark_Pipeline.Prepare) and a CSEM master file both versions of Registrar_Merge can read
+
+    Keyword arguments:
+    dir -- directory to write to
+    n -- number of enrollments, at most Synthetic_Data.EXCEL_MAX_ROWS
+    seed -- seed for the random number generator
+    """
+
+    from Benchmark_Pipeline import Prepare as Prepare_Pipeline
+
+    paths = Prepare_Pipeline(dir, n, seed = seed)
+    # the old Registrar_Merge reads IDs with read_csv's default types, so numeric student IDs come in as ints and can't be merged with the registrar's
+    # text IDs. Prefixing them keeps them text; neither version can match on them then, so both match on NetID only
+    df = pd.read_csv(paths['CSEM_master'], dtype = {'NetID':str, 'Q39':str})
+    df['Q39'] = 'x' + df['Q39'].fillna('')
+    paths['CSEM_text_ids'] = os.path.join(dir, 'CSEM_Master_Text_IDs.csv')
+    df.to_csv(paths['CSEM_text_ids'], index = False)
+    with open(os.path.join(dir, 'registrar_memory.json'), 'w') as f:
+        json.dump(paths, f)
+    return paths
+
+def Run(dir, legacy):
+    """Process the registrar workbook and merge it with a CSEM master file, reporting time and memory of each step; meant to be run in a fresh process
+
+    Keyword arguments:
+    dir -- directory prepared with Prepare
+    legacy -- whether to run the code from before the categorical schema or the current code
+    """
+
+    from Instrumentation import Peak_RSS
+
+    with open(os.path.join(dir, 'registrar_memory.json')) as f:
+        paths = json.load(f)
+    if legacy:
+        processing, merge = Legacy_Registrar_Processing, Legacy_Registrar_Merge
+    else:
+        import Consent_Registry
+        Consent_Registry.Configure(master_list = paths['consent'], eclass_answers = paths['eclass_answers'])
+        from Assessment_Registrar_Processing import Registrar_Processing as processing, Registrar_Merge as merge
+
+    # Peak_RSS is in bytes, and None on Windows, where memory isn't reported
+    Kilobytes = lambda after, before = 0: None if after is None else (after - before) // 1024
+    rss_start, start = Peak_RSS(), time.perf_counter()
+    df_Registrar = processing(paths['registrar'], paths['consent'], FA2017_1116_file = paths['FA2017_1116'], SP2018_2217_file = paths['SP2018_2217'])
+    rss_processed, processed = Peak_RSS(), time.perf_counter()
+    df = merge(paths['CSEM_text_ids'], 'CSEM', None, None, df_Registrar = df_Registrar)
+    rss_merged, merged = Peak_RSS(), time.perf_counter()
+
+    return {'benchmark':'registrar_memory', 'legacy':legacy, 'registrar_rows':len(df_Registrar), 'merged_rows':len(df),
+            'registrar_bytes':int(df_Registrar.memory_usage(deep = True).sum()), 'merged_bytes':int(df.memory_usage(deep = True).sum()),
+            'processing_seconds':processed - start, 'merge_seconds':merged - processed, 'peak_rss_kb':Kilobytes(rss_merged),
+            'processing_rss_increase_kb':Kilobytes(rss_processed, rss_start), 'merge_rss_increase_kb':Kilobytes(rss_merged, rss_processed),
+            'peak_rss_increase_kb':Kilobytes(rss_merged, rss_start)}
+
+def Compare(sizes = [10**4, 10**5], data_dir = None, seed = 0):
+    """Run the registrar stage with the old and new code at several sizes, each run in its own process so each has its own peak RSS
+
+    Keyword arguments:
+    sizes -- list of numbers of enrollments; the registrar workbook is written with openpyxl, which gets slow well before Excel's row limit
+    data_dir -- directory to generate data in (one subdirectory per size, reused by later runs); if None, a temporary directory is used
+    seed -- seed for the random number generator
+    """
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = tmp if data_dir is None else data_dir
+        for n in sizes:
+            dir = os.path.join(data_dir, 'n' + str(n) + '_seed' + str(seed))
+            if not os.path.isfile(os.path.join(dir, 'registrar_memory.json')):
+                subprocess.run([sys.executable, os.path.abspath(__file__), 'prepare', dir, str(n), str(seed)], capture_output = True, check = True)
+            for legacy in [True, False]:
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), 'run', dir, str(legacy)], capture_output = True, text = True,
+                                     check = True)
+                results.append(dict(json.loads(out.stdout.strip().splitlines()[-1]), rows = n))
+    return results
+
+if __name__ == '__main__':
+    if (len(sys.argv) == 5) and (sys.argv[1] == 'prepare'):
+        Prepare(sys.argv[2], int(sys.argv[3]), seed = int(sys.argv[4]))
+    elif (len(sys.argv) == 4) and (sys.argv[1] == 'run'):
+        print(json.dumps(Run(sys.argv[2], sys.argv[3] == 'True')))
+    else:
+        sizes = [int(size) for size in sys.argv[1:]] if len(sys.argv) > 1 else [10**4, 10**5]
+        print(json.dumps(Compare(sizes), indent = 2))
@@ -0,0 +1,77 @@
+import os
+import sys
+import json
+import time
+import numpy as np
+import pandas as pd
+
+# the processing scripts live one directory up
+PROCESSING_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROCESSING_DIR)
+
+def Legacy_Dict(table):
+    """The dictionary Registrar_Processing used to map scores with, rebuilt from a conversion table"""
+
+    from Conversion_Tables import CONVERSION_TABLES_FILE
+
+    df = pd.read_csv(CONVERSION_TABLES_FILE)
+    df = df.loc[df['Table'] == table]
+    return dict(zip(df['Score'], pd.to_numeric(df['Value'])))
+
+def Synthetic_Scores(n, seed = 0):
+    """ACT and SAT math scores of n students, with most students missing all but one of them"""
+
+    rng = np.random.default_rng(seed)
+    missing = lambda: rng.random(n) < 0.6
+    return pd.DataFrame({'ACT | Math':np.where(missing(), np.nan, rng.integers(1, 37, n)),
+                         'SAT I | Math':np.where(missing(), np.nan, 10 * rng.integers(20, 81, n)),
+                         'SAT I | Math Section Score':np.where(missing(), np.nan, 10 * rng.integers(20, 81, n))})
+
+def Legacy_Percentiles(df, dicts):
+    """The old conversion: Series.map with a dictionary per column, then a row-wise max"""
+
+    df = df.copy()
+    for col, d in dicts.items():
+        df[col] = df[col].map(d)
+    return df.max(axis = 1, skipna = True)
+
+def Percentiles(df, tables):
+    """The new conversion: one lookup in a dense array per column, then an elementwise max"""
+
+    from Conversion_Tables import Convert
+
+    return np.fmax.reduce([Convert(df[col], table) for col, table in tables])
+
+def Best_Time(function, *args, repeats = 3):
+    """Fastest of several runs of a function, in seconds"""
+
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+def Run(n, repeats = 3):
+    """Time the old and new percentile conversions on n students, and check they agree
+
+    Keyword arguments:
+    n -- number of students
+    repeats -- number of runs to take the fastest of
+    """
+
+    from Assessment_Registrar_Processing import PERCENTILE_TABLES
+
+    df = Synthetic_Scores(n)
+    dicts = {col:Legacy_Dict(table) for col, table in PERCENTILE_TABLES}
+    same = np.array_equal(Legacy_Percentiles(df, dicts).to_numpy(), Percentiles(df, PERCENTILE_TABLES), equal_nan = True)
+    result = {'benchmark':'score_conversion', 'rows':n, 'same':bool(same)}
+    for name, function, args in [('legacy', Legacy_Percentiles, (df, dicts)), ('tables', Percentiles, (df, PERCENTILE_TABLES))]:
+        seconds = Best_Time(function, *args, repeats = repeats)
+        result[name + '_seconds'] = seconds
+        result[name + '_ns_per_row'] = 1e9 * seconds / n
+    return result
+
+if __name__ == '__main__':
+    sizes = [int(size) for size in sys.argv[1:]] if len(sys.argv) > 1 else [10**4, 10**5, 10**6]
+    print(json.dumps([Run(n) for n in sizes], indent = 2))
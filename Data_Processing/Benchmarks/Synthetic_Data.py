@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+
+# fake versions of every file the pipeline reads, laid out the way the BuildMasterXXXDataset and Get_OVB_Master functions expect, so the pipeline can
+# be run (and timed) without the real Cornell data
+
+FIRST_NAMES = np.array(['Ann', 'Bob', 'Cara', 'Dan', 'Eve', 'Fay', 'Gus', 'Hal', 'Ivy', 'Jon', 'Kim', 'Lee', 'Max', 'Nia', 'Oma', 'Pat', 'Quin', 'Ray',
+                        'Sam', 'Tia', 'Uma', 'Vic', 'Wes', 'Xia', 'Yan', 'Zoe'])
+LAST_NAMES = np.array(['Smith', 'Jones', 'Wu', 'Li', 'Brown', 'Khan', 'Diaz', 'Ng', 'Park', 'Roe', 'Shah', 'Kim', 'Lopez', 'Chen', 'Patel', 'Nguyen',
+                       'Garcia', 'Cohen', 'Okafor', 'Silva', 'Rossi', 'Muller', 'Dubois', 'Sato', 'Ivanov', 'Haddad'])
+
+TERMS = ['2017FA', '2018SP', '2018FA', '2019SP']
+COURSES = ['1112', '2213', '1116', '2217']
+FILE_TERMS = {'FA':'Fa', 'SP':'Sp'}
+
+# CSEM course codes (see Clean_CSEM) and E-CLASS/MBT courses
+CSEM_COURSES = {'2213':3, '2217':4}
+MBT_COURSES = {'1112':2, '1116':3}
+ECLASS_COURSES = ['1112', '1116']
+
+# Qualtrics survey IDs of the Cornell PLIC classes, from the same table Registrar_Merge uses, as (Class_ID, Year, Semester, Course) with course numbers
+# like the registrar's
+PLIC_CLASSES = [(class_id, year, semester, course[1:]) for class_id, year, semester, course in
+                pd.read_csv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'PLIC_Classes.csv'),
+                            dtype = str)[['Class_ID', 'Year', 'Semester', 'Course']].itertuples(index = False)]
+
+CSEM_ANSWERS = 32
+MBT_ANSWERS = 26
+ECLASS_ITEMS = 30
+
+# xlsx worksheets can't hold more rows than this, so larger registrar files can't be written
+EXCEL_MAX_ROWS = 1048575
+
+def Synthetic_Roster(n, rng):
+    """Enrollments of fake students: one row per student and class, with IDs, names, and term
+
+    Keyword arguments:
+    n -- number of enrollments
+    rng -- numpy random Generator
+    """
+
+    ids = rng.permutation(np.arange(1000000, 1000000 + 10 * n))[:n]
+    letters = np.array(list('abcdefghijklmnopqrstuvwxyz'))
+    initials = np.char.add(np.char.add(rng.choice(letters, n), rng.choice(letters, n)), rng.choice(letters, n))
+    return pd.DataFrame({'Student_ID':ids, 'Netid':np.char.add(initials, (ids - 1000000).astype(str)), 'First':rng.choice(FIRST_NAMES, n),
+                         'Last':rng.choice(LAST_NAMES, n), 'Term':rng.choice(TERMS, n), 'Course':rng.choice(COURSES, n)})
+
+def Class_Roster(roster, term, courses):
+    """Enrollments in some courses in one term
+
+    Keyword arguments:
+    roster -- dataframe from Synthetic_Roster
+    term -- term, e.g., 2018FA
+    courses -- list of courses
+    """
+
+    return roster[(roster['Term'] == term) & roster['Course'].isin(courses)].reset_index(drop = True)
+
+def Respondents(class_roster, rng, response_rate, duplicate_rate, mismatch_rate):
+    """Students who took a survey: a sample of the class, with some students submitting twice and some typing their IDs differently
+
+    Keyword arguments:
+    class_roster -- enrollments of the class, from Class_Roster
+    rng -- numpy random Generator
+    response_rate -- fraction of the class that takes the survey
+    duplicate_rate -- fraction of responses that are resubmitted
+    mismatch_rate -- fraction of responses with a typo in the NetID, an unknown student ID, and first and last names swapped, so they only match on
+                     some keys
+    """
+
+    df = class_roster[rng.random(len(class_roster)) < response_rate]
+    df = pd.concat([df, df[rng.random(len(df)) < duplicate_rate]], axis = 0).sample(frac = 1, random_state = rng.integers(2**31)).reset_index(drop = True)
+    df['Student_ID'] = df['Student_ID'].astype(str)
+    mismatched = rng.random(len(df)) < mismatch_rate
+    kind = rng.integers(0, 3, len(df))
+    df.loc[mismatched & (kind == 0), 'Netid'] = df.loc[mismatched & (kind == 0), 'Netid'] + 'x'
+    df.loc[mismatched & (kind == 1), 'Student_ID'] = rng.integers(9000000, 9999999, (mismatched & (kind == 1)).sum()).astype(str)
+    swap = mismatched & (kind == 2)
+    df.loc[swap, ['First', 'Last']] = df.loc[swap, ['Last', 'First']].to_numpy()
+    return df
+
+def Timestamps(n, rng, start = '2018-09-01 10:00:00'):
+    """Start and end timestamps of n responses, with durations between 1 and 60 minutes"""
+
+    start = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, 14 * 24 * 3600, n), unit = 's')
+    end = start + pd.to_timedelta(rng.integers(60, 3600, n), unit = 's')
+    return start.strftime('%Y-%m-%d %H:%M:%S'), end.strftime('%Y-%m-%d %H:%M:%S')
+
+def Responses(n, n_items, rng, prefix = 'Q', missing_rate = 0.03):
+    """Dataframe of multiple choice (1 to 5) responses to n_items questions, with some skipped"""
+
+    responses = rng.integers(1, 6, (n, n_items)).astype(float)
+    responses[rng.random((n, n_items)) < missing_rate] = np.nan
+    return pd.DataFrame(responses, columns = [prefix + str(i + 1) for i in range(n_items)])
+
+def Write_Qualtrics(df, file, import_ids = False):
+    """Write a dataframe as a Qualtrics export: column names, a row of question text, and (for newer exports) a row of import IDs"""
+
+    with open(file, 'w', newline = '') as f:
+        f.write(','.join(df.columns) + '\n')
+        f.write(','.join('"Question text for ' + col + '"' for col in df.columns) + '\n')
+        if import_ids:
+            f.write(','.join('"{""ImportId"":""' + col + '""}"' for col in df.columns) + '\n')
+        df.to_csv(f, index = False, header = False)
+
+def Write_CSEM(roster, file, term, rng, response_rate, duplicate_rate, mismatch_rate):
+    """Write a raw CSEM export for both CSEM courses in one term"""
+
+    df = Respondents(Class_Roster(roster, term, list(CSEM_COURSES)), rng, response_rate, duplicate_rate, mismatch_rate)
+    start, end = Timestamps(len(df), rng)
+    email = rng.random(len(df)) < 0.5 # some students typed their email address instead of NetID
+    out = pd.DataFrame({'V1':['R_' + str(i) for i in rng.integers(10**9, 10**10, len(df))], 'V3':start, 'V4':end, 'Name':df['Last'], 'Q38':df['First'],
+                        'NetID':np.where(email, df['Netid'] + '@cornell.edu', df['Netid']), 'Q39':df['Student_ID'],
+                        'Course':df['Course'].map(CSEM_COURSES)})
+    Write_Qualtrics(pd.concat([out, Responses(len(df), CSEM_ANSWERS, rng)], axis = 1), file)
+    return len(out)
+
+def Write_MBT(roster, file, term, rng, response_rate, duplicate_rate, mismatch_rate, two_headers):
+    """Write a raw MBT export in one term, in the older (one header row, P1112 only) or newer (two header rows, P1112 and P1116) layout"""
+
+    df = Respondents(Class_Roster(roster, term, list(MBT_COURSES) if two_headers else ['1112']), rng, response_rate, duplicate_rate, mismatch_rate)
+    responses = Responses(len(df), MBT_ANSWERS, rng)
+    response_ids = ['R_' + str(i) for i in rng.integers(10**9, 10**10, len(df))]
+    if two_headers:
+        out = pd.DataFrame({'ResponseId':response_ids, 'Duration (in seconds)':rng.integers(60, 3600, len(df)), 'Q47':df['Course'].map(MBT_COURSES),
+                            'Q49':df['First'], 'Q51':df['Last'], 'Q53':df['Netid'], 'Q61':df['Student_ID']})
+    else:
+        start, end = Timestamps(len(df), rng)
+        out = pd.DataFrame({'V1':response_ids, 'V3':start, 'V4':end, 'QA':df['First'], 'QB':df['Last'], 'QC':df['Netid'], 'QD':df['Student_ID']})
+    Write_Qualtrics(pd.concat([out, responses], axis = 1), file, import_ids = two_headers)
+    return len(out)
+
+def ECLASS_Questions():
+    """Names of the E-CLASS items: what students think (a) and what they think an expert would say (b)"""
+
+    return ['q' + str(i) + part for i in range(1, ECLASS_ITEMS + 1) for part in ['a', 'b']]
+
+def Write_ECLASS(roster, file, term, course, rng, response_rate, duplicate_rate, mismatch_rate, post, attention_fail_rate = 0.05):
+    """Write a raw E-CLASS export for one course in one term; intended major (Q47) is only asked on the posttest"""
+
+    df = Respondents(Class_Roster(roster, term, [course]), rng, response_rate, duplicate_rate, mismatch_rate)
+    email = rng.random(len(df)) < 0.5 # the ID question took either a NetID (often as an email address) or a student ID
+    student_id = rng.random(len(df)) < 0.3
+    ids = np.where(student_id, df['Student_ID'], np.where(email, df['Netid'] + '@cornell.edu', df['Netid']))
+    out = pd.DataFrame({'V1':['R_' + str(i) for i in rng.integers(10**9, 10**10, len(df))], 'Q3_1_TEXT':df['First'], 'Q3_2_TEXT':df['Last'],
+                        'Q3_3_TEXT':ids, 'q40a':np.where(rng.random(len(df)) < attention_fail_rate, 2, 4)})
+    if post:
+        out['Q47'] = rng.integers(1, 14, len(df))
+    responses = Responses(len(df), len(ECLASS_Questions()), rng)
+    responses.columns = ECLASS_Questions()
+    pd.concat([out, responses], axis = 1).to_csv(file, index = False)
+    return len(out)
+
+def Write_ECLASS_Answers(file, rng):
+    """Write an E-CLASS answer key workbook in the layout of Answers_Template.xlsx"""
+
+    questions = ECLASS_Questions()
+    answers = rng.choice(['A', 'D'], len(questions))
+    answers[[questions.index('q10a'), questions.index('q10b')]] = 'CONTROL' # one of the questions isn't scored
+    sheet = pd.DataFrame([['Answer'] + list(answers), [''] * (len(questions) + 1), ['Question'] + questions])
+    sheet.to_excel(file, sheet_name = 'Converted', index = False)
+
+def Write_Registrar(roster, file, rng):
+    """Write a registrar workbook with one row per enrollment, with the columns (and ranges of values) of the real registrar file"""
+
+    n = len(roster)
+    if n > EXCEL_MAX_ROWS:
+        raise ValueError('registrar workbooks hold at most ' + str(EXCEL_MAX_ROWS) + ' rows, not ' + str(n))
+    score = lambda low, high, rate: np.where(rng.random(n) < rate, rng.integers(low, high + 1, n), np.nan)
+    df = pd.DataFrame({'Employee Id':roster['Student_ID'], 'Academic Term Sdescr':roster['Term'], 'Catalog Nbr':roster['Course'].astype(int),
+                       'Acad Level Ldescr':rng.choice(['Fresh', 'Sophomore', 'Junior', 'Senior', 'Grad', 'Continuing Ed'], n,
+                                                      p = [0.45, 0.3, 0.13, 0.1, 0.01, 0.01]),
+                       'Academic Plan':rng.choice(['ENGR', 'PHYS', 'MATH', 'CS', 'CHEM', 'ASTRO'], n), 'Effdt Gender':rng.choice(['M', 'F'], n),
+                       'St Urm Flag':rng.choice(['Y', 'N', None], n, p = [0.2, 0.78, 0.02]),
+                       'Student Group Sdescr':rng.choice(['Frst Gen', None], n, p = [0.15, 0.85]), 'Cum GPA':rng.uniform(2, 4.3, n).round(2),
+                       'Netid':roster['Netid'], 'ACT | Math':score(15, 36, 0.5), 'SAT I | Math':score(40, 80, 0.4) * 10,
+                       'SAT I | Math Section Score':score(40, 80, 0.3) * 10, 'AP | Calculus AB Subscore Grade':score(1, 5, 0.2),
+                       'AP | Mathematics: Calculus AB':score(1, 5, 0.3), 'AP | Mathematics: Calculus BC':score(1, 5, 0.3),
+                       'AP | Physics C - Electricity & Magt':score(1, 5, 0.2), 'AP | Physics C - Mechanics':score(1, 5, 0.3)})
+    for col in ['ACT | Combined English/Writing', 'ACT | English', 'ACT | Reading', 'ACT | Writing', 'ACT | Writing Subject Score 9/15',
+                'SAT I | Critical Reading', 'SAT I | Read/Writing Sect Score', 'SAT I | Writing Score']:
+        df[col] = score(20, 36, 0.4)
+    df['Subject'] = 'PHYS'
+    df.to_excel(file, index = False)
+
+def Write_Consent_List(roster, file, rng, opt_out_rate):
+    """Write a list of students who opted out of research, in the layout of MasterList.xlsx"""
+
+    df = roster[rng.random(len(roster)) < opt_out_rate]
+    pd.DataFrame({'First Name:':df['First'], 'Last Name:':df['Last'], 'Course':'Phys ' + df['Course'] + ':',
+                  'Net ID:':' ' + df['Netid'].str.upper() + ' '}).to_excel(file, index = False)
+    return len(df)
+
+def Write_Instruction_Lists(roster, FA2017_1116_file, SP2018_2217_file, rng):
+    """Write the lists of students in each type of lab in 2017FA-1116 and 2018SP-2217"""
+
+    df = Class_Roster(roster, '2017FA', ['1116'])
+    pd.DataFrame({'Username':df['Netid'], 'Lab.Intervention':rng.integers(0, 2, len(df))}).to_csv(FA2017_1116_file, index = False)
+    df = Class_Roster(roster, '2018SP', ['2217'])
+    pd.DataFrame({'Username':df['Netid'], 'Lab.Condition':rng.choice(['I', 'C'], len(df))}).to_csv(SP2018_2217_file, index = False)
+
+def Write_PLIC_Master(roster, file, rng, response_rate, mismatch_rate):
+    """Write a master PLIC file (built in the PLIC repository) with the Cornell classes and some classes from other institutions"""
+
+    dfs = []
+    classes = [(survey_id, Class_Roster(roster, year + semester, [course])) for survey_id, year, semester, course in PLIC_CLASSES]
+    classes.append(('R_OtherSchool', Synthetic_Roster(max(len(roster) // 100, 10), rng))) # Registrar_Merge should leave this one out
+    for survey_id, class_roster in classes:
+        df = Respondents(class_roster, rng, response_rate, 0, mismatch_rate)
+        n = len(df)
+        dfs.append(pd.DataFrame({'Class_ID':survey_id, 'Survey_x':rng.choice(['C', 'F'], n, p = [0.95, 0.05]),
+                                 'Survey_y':rng.choice(['C', 'F'], n, p = [0.95, 0.05]),
+                                 'PreScores':np.where(rng.random(n) < 0.85, rng.uniform(0, 10, n).round(2), np.nan),
+                                 'PostScores':np.where(rng.random(n) < 0.75, rng.uniform(0, 10, n).round(2), np.nan),
+                                 'Q5a_x':df['Netid'].str.upper() + '@cornell.edu', 'Q5a_y':np.where(rng.random(n) < 0.75, df['Netid'] + '@cornell.edu', None)}))
+    df = pd.concat(dfs, axis = 0).reset_index(drop = True)
+    df.to_csv(file, index = False)
+    return len(df)
+
+def Generate(dir, n = 1000, response_rate = 0.8, duplicate_rate = 0.02, mismatch_rate = 0.05, opt_out_rate = 0.01, seed = 0, registrar = True):
+    """Write a complete set of fake raw data files
+
+    Keyword arguments:
+    dir -- directory to write to
+    n -- number of enrollments in the registrar data; every survey file is sized in proportion
+    response_rate -- fraction of each class that takes each survey
+    duplicate_rate -- fraction of survey responses that are resubmitted
+    mismatch_rate -- fraction of survey responses with a mistyped NetID, unknown student ID, or swapped first and last names
+    opt_out_rate -- fraction of students who opted out of research
+    seed -- seed for the random number generator
+    registrar -- whether to write the registrar workbook; it can't be written for n above EXCEL_MAX_ROWS
+
+    Returns a dictionary of file paths and the number of rows in each survey file. The raw survey files are written to dir/CSEM/RAW, dir/MBT/RAW, and
+    dir/ECLASS/RAW, ready for the BuildMasterXXXDataset functions; MBT files alternate between the two header layouts.
+    """
+
+    rng = np.random.default_rng(seed)
+    roster = Synthetic_Roster(n, rng)
+    paths = {'dir':dir, 'registrar':os.path.join(dir, 'Registrar.xlsx'), 'consent':os.path.join(dir, 'MasterList.xlsx'),
+             'eclass_answers':os.path.join(dir, 'Answers_Template.xlsx'), 'FA2017_1116':os.path.join(dir, 'Fa2017-1116_ID-condition.csv'),
+             'SP2018_2217':os.path.join(dir, 'Sp2018_2217_ID-condition.csv'), 'PLIC':os.path.join(dir, 'PLIC_Master.csv'),
+             'CSEM_dir':os.path.join(dir, 'CSEM'), 'MBT_dir':os.path.join(dir, 'MBT'), 'ECLASS_dir':os.path.join(dir, 'ECLASS'), 'rows':{}}
+    args = (response_rate, duplicate_rate, mismatch_rate)
+
+    for i, term in enumerate(TERMS):
+        year, semester = term[:4], term[4:]
+        short = FILE_TERMS[semester] + year[2:]
+        for test in ['CSEM', 'MBT']:
+            os.makedirs(os.path.join(dir, test, 'RAW', term), exist_ok = True)
+        os.makedirs(os.path.join(dir, 'ECLASS', 'RAW', semester + year), exist_ok = True)
+
+        # file names follow the patterns the BuildMasterXXXDataset functions parse semesters and years out of
+        for survey in ['Pre', 'Post']:
+            file = os.path.join(dir, 'CSEM', 'RAW', term, 'CSEM_Phys_' + survey + '_' + short + '_' + year + '.csv')
+            paths['rows'][file] = Write_CSEM(roster, file, term, rng, *args)
+            file = os.path.join(dir, 'MBT', 'RAW', term, 'MBT_Phys1112_Cornell_' + survey + '_' + short + '_' + year + '.csv')
+            paths['rows'][file] = Write_MBT(roster, file, term, rng, *args, two_headers = (i % 2 == 1))
+            for course in ECLASS_COURSES:
+                file = os.path.join(dir, 'ECLASS', 'RAW', semester + year, 'ECLASS_Phys' + course + '-' + survey.upper() + '-' + semester + '.csv')
+                paths['rows'][file] = Write_ECLASS(roster, file, term, course, rng, *args, post = (survey == 'Post'))
+
+    paths['rows'][paths['PLIC']] = Write_PLIC_Master(roster, paths['PLIC'], rng, response_rate, mismatch_rate)
+    Write_ECLASS_Answers(paths['eclass_answers'], rng)
+    Write_Consent_List(roster, paths['consent'], rng, opt_out_rate)
+    Write_Instruction_Lists(roster, paths['FA2017_1116'], paths['SP2018_2217'], rng)
+    if registrar:
+        Write_Registrar(roster, paths['registrar'], rng)
+    return paths
+
+if __name__ == '__main__':
+    print(json.dumps(Generate(sys.argv[1], n = int(sys.argv[2]) if len(sys.argv) > 2 else 1000), indent = 2))
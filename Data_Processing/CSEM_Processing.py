@@ -2,54 +2,74 @@ import os
 import pandas as pd
 from datetime import datetime
 from glob import glob
+from Consent_Registry import Get_Consent_Index
+from Matching_Engine import Merge_Pre_Post
+from Scoring_Engine import Response_Matrix, Score_Responses
+from Parallel_Processing import Map_Terms
+from Incremental_Build import Build_Terms
+from Columnar_Output import Write_Master
+from Streaming_Reader import Stream_CSV, CHUNKSIZE
+from Instrumentation import Stage, Profiled
 
 # dictionary of correct answers taken from PhysPort
 correct_ans = pd.Series({'Q1':2, 'Q2':1, 'Q3':2, 'Q4':2, 'Q5':3, 'Q6':5, 'Q7':2, 'Q8':2, 'Q9':2, 'Q10':3, 'Q11':5, 'Q12':4,
                          'Q13':5, 'Q14':4, 'Q15':1, 'Q16':5, 'Q17':5, 'Q18':4, 'Q19':1, 'Q20':4, 'Q21':5, 'Q22':4, 'Q23':1,
                          'Q24':3, 'Q25':4, 'Q26':1, 'Q27':5, 'Q28':3, 'Q29':3, 'Q30':1, 'Q31':5, 'Q32':4})
 
-# Natasha Holmes compiled an excel file of students that opted out of research...we need to remove those students from our dataset
-Consent_df = pd.read_excel('C:/Users/Cole/Documents/DATA/MasterList.xlsx')
-Consent_df['FullName'] = (Consent_df['First Name:'] + Consent_df['Last Name:']).str.lower().str.replace(' ', '')
-Consent_df['Course'] = Consent_df['Course'].str.split(' ').str.get(1).apply(lambda x: 'P' + x[:-1]) # some courses were logged as Phys xxxx, others just as xxxx
+# ID columns, and the smallest set of columns needed to filter, match, and score surveys
+ID_DTYPES = {'Name':'str', 'Q38':'str', 'NetID':'str', 'Q39':'str'}
+CSEM_COLUMNS = ['V1', 'V3', 'V4', 'Course'] + list(ID_DTYPES) + list(correct_ans.index)
 
-def Clean_CSEM(file, time_cutoff = None):
+@Profiled()
+def Clean_CSEM(file, time_cutoff = None, chunksize = CHUNKSIZE, columns = None):
     """Filter and score CSEM file
 
     Keyword arguments:
     file -- file path for raw CSEM csv file
     time_cutoff -- time to completion used to filter out responses in seconds
+    chunksize -- number of responses to read, filter, and score at a time, passed to Stream_CSV; if None, the whole file is read at once
+    columns -- columns to read, passed to Stream_CSV; if None, all columns are read. CSEM_COLUMNS has everything needed to match and score surveys
     """
-    # ADD REMOVE NON-CONSENTING STUDENTS
 
-    df = pd.read_csv(file, skiprows = [1]) # first line after header is descriptive text
-
-    if(time_cutoff is not None):
-        df[['V3', 'V4']] = df[['V3', 'V4']].apply(pd.to_datetime) # V3 and V4 are the start and end timetsamps, respectively
-        df['Time'] = (df['V4'] - df['V3']).dt.seconds
-        df = df.loc[df['Time'] >= time_cutoff, :] # filter out surveys that took less than a certain time
-
-    df['Name'] = df['Name'].str.lower().str.replace(' ', '')
-    df['Q38'] = df['Q38'].str.lower().str.replace(' ', '') # poorly formatted file, Q38 is actually first name
-    df['NetID'] = df['NetID'].astype(str).apply(lambda x: x.split('@')[0].lower()).str.replace(' ', '')
-    df['Q39'] = df['Q39'].astype(str).str.lower().str.replace(' ', '') # Q39 is student ID
-
-    df = df.drop_duplicates(subset = ['Name', 'Q38'],
-                            keep = 'last').drop_duplicates(subset = ['NetID'],
-                                                           keep = 'last').drop_duplicates(subset = ['Q39'], keep = 'last')
-
-    df['Course'] = df['Course'].map({1:'P1102', 2:'P2208', 3:'P2213', 4:'P2217'})
-    df['FullName'] = (df['Q38'] + df['Name']).str.lower().str.replace(' ', '')
-
-    df = pd.merge(df, Consent_df[['Course', 'FullName']], on = ['Course', 'FullName'], how = 'left', indicator = 'OptOut?')
-    df = df.loc[df['OptOut?'] == 'left_only', :].drop(columns = ['OptOut?', 'FullName'])
-
-    df[correct_ans.index] = 1 * (df[correct_ans.index] == correct_ans)
-    df['Total_Score'] = df[correct_ans.index].sum(axis = 1)
+    def Process_Chunk(df):
+        if(time_cutoff is not None):
+            with Stage('CSEM time cutoff', rows_in = df) as stage:
+                df[['V3', 'V4']] = df[['V3', 'V4']].apply(pd.to_datetime) # V3 and V4 are the start and end timetsamps, respectively
+                df['Time'] = (df['V4'] - df['V3']).dt.seconds
+                df = df.loc[df['Time'] >= time_cutoff, :].copy() # filter out surveys that took less than a certain time
+                stage.Rows_Out(df)
+
+        df['Name'] = df['Name'].str.lower().str.replace(' ', '')
+        df['Q38'] = df['Q38'].str.lower().str.replace(' ', '') # poorly formatted file, Q38 is actually first name
+        df['NetID'] = df['NetID'].astype(str).apply(lambda x: x.split('@')[0].lower()).str.replace(' ', '')
+        df['Q39'] = df['Q39'].astype(str).str.lower().str.replace(' ', '') # Q39 is student ID
+        df['Course'] = df['Course'].map({1:'P1102', 2:'P2208', 3:'P2213', 4:'P2217'})
+
+        item_scores, total_scores = Score_Responses(Response_Matrix(df, correct_ans.index), correct_ans.values)
+        df[list(correct_ans.index)] = item_scores
+        df['Total_Score'] = total_scores
+        return df
+
+    # first line after header is descriptive text. IDs are read as text so they look the same in every chunk
+    df = Stream_CSV(file, Process_Chunk, skiprows = [1], columns = columns, dtype = ID_DTYPES, chunksize = chunksize)
+
+    # duplicates and opt outs can only be found once all chunks are in
+    with Stage('CSEM duplicates', rows_in = df) as stage:
+        df = df.drop_duplicates(subset = ['Name', 'Q38'],
+                                keep = 'last').drop_duplicates(subset = ['NetID'],
+                                                               keep = 'last').drop_duplicates(subset = ['Q39'], keep = 'last')
+        stage.Rows_Out(df)
+
+    with Stage('CSEM opt outs', rows_in = df) as stage:
+        df['FullName'] = (df['Q38'] + df['Name']).str.lower().str.replace(' ', '')
+        df = df.loc[~Get_Consent_Index().Opted_Out_Name(df['Course'], df['FullName']), :].drop(columns = ['FullName']) # remove students who opted out of research
+        stage.Rows_Out(df)
 
     return df
 
-def Match_CSEM(pre_file, post_file, Semester, Year, raw = True, time_cutoff = None):
+@Profiled()
+def Match_CSEM(pre_file, post_file, Semester, Year, raw = True, time_cutoff = None, return_stats = False, chunksize = CHUNKSIZE, fuzzy = False,
+               all_columns = True):
     """Outer join pre and posttest CSEM files together
 
     Keyword arguments:
@@ -59,30 +79,23 @@ def Match_CSEM(pre_file, post_file, Semester, Year, raw = True, time_cutoff = No
     Year -- year that the survey was administered
     raw -- binary, whether the input files are raw or have been previously scored
     time_cutoff -- time cutoff to use when filtering surveys, passed to Clean_CSEM
+    return_stats -- whether to also return a dictionary with the number of students matched on each key
+    chunksize -- number of responses to read at a time, passed to Clean_CSEM
+    fuzzy -- whether to also match leftover students in the same course on names or NetIDs that are close but not equal, e.g., with a typo; the
+             similarity of each of these matches is kept in Fuzzy_Score
+    all_columns -- whether to read every column of the raw files; if False, only the columns needed to filter, match, and score surveys
+                   (CSEM_COLUMNS) are read, which is faster and uses less memory, but leaves the other survey questions out of the output
     """
 
     if raw:
-        df_pre = Clean_CSEM(pre_file, time_cutoff = time_cutoff)
-        df_post = Clean_CSEM(post_file, time_cutoff = time_cutoff)
+        columns = None if all_columns else CSEM_COLUMNS
+        df_pre = Clean_CSEM(pre_file, time_cutoff = time_cutoff, chunksize = chunksize, columns = columns)
+        df_post = Clean_CSEM(post_file, time_cutoff = time_cutoff, chunksize = chunksize, columns = columns)
 
-    # merge separately on full name, netID, and ID to capture as many students as possible that took both pre and posttests
-    df_name = pd.merge(df_pre, df_post, how = 'inner', on = ['Name', 'Q38'])
-    df_netID = pd.merge(df_pre, df_post, how = 'inner', on = 'NetID')
-    df_studentID = pd.merge(df_pre, df_post, how = 'inner', on = 'Q39')
-
-    # we make sure students aren't double counted
-    df_in = pd.concat([df_name, df_netID, df_studentID], axis = 0, join = 'outer').reset_index(drop = True).drop_duplicates(subset = ['V1_x']).drop_duplicates(subset = ['V1_y'])
-
-    # and put back students who only took one of the pre or posttest in our dataset
-    Pre_Cols = [col if col in df_in.columns else col + '_x' for col in df_pre.columns]
-    Out_Pre = df_pre.loc[~df_pre['V1'].isin(df_in['V1_x'])]
-    Out_Pre.columns = Pre_Cols
-
-    Post_Cols = [col if col in df_in.columns else col + '_y' for col in df_post.columns]
-    Out_Post = df_post.loc[~df_post['V1'].isin(df_in['V1_y'])]
-    Out_Post.columns = Post_Cols
-
-    df = pd.concat([df_in, Out_Pre, Out_Post], axis = 0, join = 'outer').reset_index(drop = True)
+    # match on full name, netID, and ID (in that order) to capture as many students as possible that took both pre and posttests, making sure
+    # students aren't double counted, and put back students who only took one of the pre or posttest in our dataset
+    keys = [('name', ['Name', 'Q38'], ['Name', 'Q38']), ('netID', ['NetID'], ['NetID']), ('studentID', ['Q39'], ['Q39'])]
+    df, match_stats = Merge_Pre_Post(df_pre, df_post, keys, fuzzy_keys = keys[:2] if fuzzy else None, block_cols = ['Course'])
 
     df['NetID'] = df['NetID'].fillna(df['NetID_y']).fillna(df['NetID_x'])
     df['Q39'] = df['Q39'].fillna(df['Q39_y']).fillna(df['Q39_x'])
@@ -92,23 +105,43 @@ def Match_CSEM(pre_file, post_file, Semester, Year, raw = True, time_cutoff = No
     df['Semester'] = Semester
     df['Year'] = Year
 
+    if return_stats:
+        return df, match_stats
     return df
 
-def BuildMasterCSEMDataset(dir, time_cutoff = None):
+@Profiled()
+def BuildMasterCSEMDataset(dir, time_cutoff = None, n_workers = 1, incremental = False, out_format = 'csv', chunksize = CHUNKSIZE, store = None,
+                           fuzzy = False, all_columns = True):
     """Construct master CSEM dataset of matched and unmatched surveys
 
     Keyword arguments:
     dir -- directory where CSEM raw files are stored
     time_cutoff -- time cutoff to use when filtering surveys, passed to Clean_CSEM
+    n_workers -- number of processes to match terms in, passed to Map_Terms
+    incremental -- whether to only rematch terms whose raw files changed since the last build, reusing cached output for the rest
+    out_format -- one of csv, parquet, or feather; parquet and feather output is a directory partitioned by Course, Year, and Semester
+    chunksize -- number of responses to read at a time, passed to Clean_CSEM
+    store -- file path to a SQLite store to also write the master dataset to, as table CSEM_Master
+    fuzzy -- whether to also match students on identifiers that are close but not equal, passed to Match_CSEM
+    all_columns -- whether to read every column of the raw files, passed to Match_CSEM
     """
 
-    os.chdir(dir)
-    pre_files = glob('RAW/**/*Pre*csv', recursive = True)
-    post_files = glob('RAW/**/*Post*csv', recursive = True)
-
-    # semester and year is in the filename, we'll just concatenate those together
-    matched_dfs = [Match_CSEM(pre_f, post_files[i], pre_f.split('_')[3][:2].upper(), pre_f.split('_')[4].split('.')[0], time_cutoff = time_cutoff) for i, pre_f in enumerate(pre_files)]
+    pre_files = sorted(glob(os.path.join(dir, 'RAW', '**', '*Pre*csv'), recursive = True))
+    post_files = sorted(glob(os.path.join(dir, 'RAW', '**', '*Post*csv'), recursive = True))
+
+    # semester and year is in the filename (relative to dir), we'll just concatenate those together
+    term_args = []
+    for i, pre_f in enumerate(pre_files):
+        rel_f = os.path.relpath(pre_f, dir)
+        term_args.append((pre_f, post_files[i], rel_f.split('_')[3][:2].upper(), rel_f.split('_')[4].split('.')[0]))
+    if incremental:
+        matched_dfs = Build_Terms(Match_CSEM, term_args, os.path.join(dir, '.build_cache'), n_workers = n_workers, time_cutoff = time_cutoff,
+                                  chunksize = chunksize, fuzzy = fuzzy, all_columns = all_columns)
+    else:
+        matched_dfs = Map_Terms(Match_CSEM, term_args, n_workers = n_workers, time_cutoff = time_cutoff, chunksize = chunksize, fuzzy = fuzzy,
+                                all_columns = all_columns)
     df = pd.concat(matched_dfs, axis = 0)
 
-    df.to_csv('CSEM_Master.csv', index = False)
+    outfile = os.path.join(dir, 'CSEM_Master.csv' if out_format == 'csv' else 'CSEM_Master')
+    Write_Master(df, outfile, out_format = out_format, partition_cols = ['Course', 'Year', 'Semester'], store = store, table = 'CSEM_Master')
     return df
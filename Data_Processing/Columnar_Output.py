@@ -0,0 +1,107 @@
+import os
+import shutil
+from glob import glob
+import pandas as pd
+
+# low-cardinality columns that are stored as dictionary encoded (categorical) columns instead of repeated strings
+CATEGORICAL_COLUMNS = ['Course', 'Semester', 'Year', 'Class_Standing', 'Gender', 'URM_Status', 'First_Gen_Status', 'AP_Calculus_AB', 'AP_Calculus_BC',
+                       'AP_Physics_EM', 'AP_Physics_Mech', 'Sequence', 'Course_Content', 'Instruction', 'IntendedMajor']
+
+def To_Categorical(df, columns = CATEGORICAL_COLUMNS):
+    """Convert low-cardinality string columns of a dataframe to categoricals
+
+    Keyword arguments:
+    df -- dataframe to convert
+    columns -- columns to convert; columns that aren't in df or aren't strings are skipped
+    """
+
+    df = df.copy()
+    for col in columns:
+        if (col in df.columns) and not isinstance(df[col].dtype, pd.CategoricalDtype) and not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype('category')
+    return df
+
+def Write_Master(df, outfile, out_format = 'csv', partition_cols = ['Assessment', 'Class_ID'], store = None, table = None):
+    """Write a master dataset as csv, or as a parquet or feather dataset partitioned into one directory per group
+
+    Keyword arguments:
+    df -- master dataframe to write
+    outfile -- file path for csv output, or directory path for parquet and feather output
+    out_format -- one of csv, parquet, or feather; parquet and feather require pyarrow
+    partition_cols -- columns to partition parquet and feather output by
+    store -- file path to a SQLite store (see Analytical_Store) to also write the dataset to; if None, it's only written to outfile
+    table -- name of the table in the store, e.g., OVB_Master
+    """
+
+    if store is not None: # indexed on the partition columns as well as the usual ID columns
+        from Analytical_Store import Write_Store, INDEX_COLUMNS
+        Write_Store(df, store, table, index_columns = partition_cols + INDEX_COLUMNS)
+
+    if out_format == 'csv':
+        df.to_csv(outfile, index = False)
+        return
+
+    if out_format not in ['parquet', 'feather']:
+        raise ValueError('out_format must be one of csv, parquet, or feather, not ' + str(out_format))
+
+    partition_cols = [col for col in partition_cols if col in df.columns]
+    df = To_Categorical(df, [col for col in CATEGORICAL_COLUMNS if col not in partition_cols])
+    df[partition_cols] = df[partition_cols].astype(str) # partition values become directory names
+
+    # the dataset is written to a new directory and then swapped in for the old one, so groups that are no longer in df (e.g., a class dropped
+    # from the PLIC class table) don't leave their old partitions behind, and readers never see a half written dataset
+    outfile = os.path.normpath(outfile)
+    tmp_dir = outfile + '.tmp-' + str(os.getpid())
+    shutil.rmtree(tmp_dir, ignore_errors = True)
+    if out_format == 'parquet':
+        df.to_parquet(tmp_dir, index = False, partition_cols = partition_cols)
+    else: # feather doesn't do partitioned datasets, so we lay the files out the same way parquet does
+        os.makedirs(tmp_dir)
+        for values, df_part in df.groupby(partition_cols, sort = False, observed = True):
+            values = values if isinstance(values, tuple) else (values,)
+            part_dir = os.path.join(tmp_dir, *[col + '=' + str(value) for col, value in zip(partition_cols, values)])
+            os.makedirs(part_dir, exist_ok = True)
+            df_part.drop(columns = partition_cols).reset_index(drop = True).to_feather(os.path.join(part_dir, 'part-0.feather'))
+
+    old_dir = outfile + '.old-' + str(os.getpid())
+    if os.path.isdir(outfile):
+        os.replace(outfile, old_dir)
+    elif os.path.exists(outfile):
+        os.remove(outfile)
+    os.replace(tmp_dir, outfile)
+    shutil.rmtree(old_dir, ignore_errors = True)
+
+def Read_Master(path, columns = None, **partitions):
+    """Read a master dataset written by Write_Master, only reading the partitions and columns that are asked for
+
+    Keyword arguments:
+    path -- csv file path, or parquet or feather dataset directory
+    columns -- list of columns to read; if None, all columns are read
+    partitions -- values of partition columns to keep, e.g., Assessment = 'ECLASS'
+    """
+
+    if os.path.isfile(path):
+        df = pd.read_csv(path)
+        for col, value in partitions.items():
+            df = df[df[col] == value]
+        return df if columns is None else df[columns]
+
+    feather_files = glob(os.path.join(path, '**', '*.feather'), recursive = True)
+    if len(feather_files) == 0:
+        filters = [(col, '==', str(value)) for col, value in partitions.items()] or None
+        return pd.read_parquet(path, columns = columns, filters = filters)
+
+    dfs = []
+    for file in feather_files:
+        values = dict(part.split('=', 1) for part in os.path.relpath(os.path.dirname(file), path).split(os.sep))
+        if all(values.get(col) == str(value) for col, value in partitions.items()):
+            file_columns = None if columns is None else [col for col in columns if col not in values]
+            df = pd.read_feather(file, columns = file_columns)
+            for col, value in values.items():
+                if (columns is None) or (col in columns):
+                    df[col] = value
+            dfs.append(df)
+    if len(dfs) == 0:
+        raise ValueError('no partitions of ' + path + ' match ' + str(partitions))
+    df = pd.concat(dfs, axis = 0).reset_index(drop = True)
+    return df if columns is None else df[columns]
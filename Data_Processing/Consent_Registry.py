@@ -0,0 +1,117 @@
+import os
+from functools import lru_cache
+
+# Natasha Holmes compiled an excel file of students that opted out of research and Emily Smith put together an excel file with the correct E-CLASS
+# answers. Every processing script needs these, so we load them here, only when they're first asked for, and at most once per process. Paths can be
+# set with Configure or the OVB_MASTER_LIST and OVB_ECLASS_ANSWERS environment variables.
+CONFIG = {'master_list': os.environ.get('OVB_MASTER_LIST', 'C:/Users/Cole/Documents/DATA/MasterList.xlsx'),
+          'eclass_answers': os.environ.get('OVB_ECLASS_ANSWERS', 'C:/Users/Cole/Documents/DATA/ECLASS_DATA/Answers_Template.xlsx')}
+
+def Configure(master_list = None, eclass_answers = None):
+    """Set file paths used by the registry
+
+    Keyword arguments:
+    master_list -- file path to excel list of students who have opted out of research
+    eclass_answers -- file path to excel file of correct E-CLASS answers
+    """
+
+    if master_list is not None:
+        CONFIG['master_list'] = master_list
+    if eclass_answers is not None:
+        CONFIG['eclass_answers'] = eclass_answers
+
+def Get_Config():
+    """Return a copy of the current registry configuration, e.g., to pass to Configure in a worker process"""
+
+    return dict(CONFIG)
+
+@lru_cache(maxsize = None)
+def _Load_Consent(file):
+    import pandas as pd
+
+    Consent_df = pd.read_excel(file)
+    Consent_df['FullName'] = (Consent_df['First Name:'] + Consent_df['Last Name:']).str.lower().str.replace(' ', '')
+    Consent_df['Course'] = Consent_df['Course'].str.split(' ').str.get(1).apply(lambda x: 'P' + x[:-1]) # some courses were logged as Phys xxxx, others just as xxxx
+    Consent_df['Netid'] = Consent_df['Net ID:'].str.lower().str.strip(' ')
+    return Consent_df
+
+def Hash_Keys(course, key):
+    """Hash (course, key) pairs into 64 bit integers; the same pair always gets the same hash, whether it's stored as strings or categoricals
+
+    Keyword arguments:
+    course -- course of each student (e.g., P1112), or one course for every student
+    key -- normalized full name or NetID of each student
+    """
+
+    import pandas as pd
+
+    key = pd.Series(key).reset_index(drop = True)
+    course = pd.Series(course).reset_index(drop = True) if hasattr(course, '__len__') and not isinstance(course, str) else course
+    return pd.util.hash_pandas_object(pd.DataFrame({'Course':course, 'Key':key}, index = key.index), index = False).to_numpy()
+
+class Consent_Index:
+    """Index of students who opted out of research, keyed by (course, full name) and (course, NetID)
+
+    Keyword arguments:
+    Consent_df -- dataframe of students who opted out of research, with normalized Course, FullName, and Netid columns (from Get_Consent_df)
+    """
+
+    def __init__(self, Consent_df):
+        import pandas as pd
+
+        # pandas indexes are hash tables, so each lookup is constant time no matter how long the list of opt outs gets
+        self.Names = pd.Index(Hash_Keys(Consent_df['Course'], Consent_df['FullName'])).unique()
+        self.NetIDs = pd.Index(Hash_Keys(Consent_df['Course'], Consent_df['Netid'])).unique()
+
+    def Opted_Out_Name(self, course, full_name):
+        """Boolean array, True for students whose (course, full name) is on the opt out list
+
+        Keyword arguments:
+        course -- course of each student (e.g., P1112), or one course for every student
+        full_name -- full name of each student, lower case with spaces removed
+        """
+
+        return self.Names.get_indexer(Hash_Keys(course, full_name)) >= 0
+
+    def Opted_Out_NetID(self, course, netid):
+        """Boolean array, True for students whose (course, NetID) is on the opt out list
+
+        Keyword arguments:
+        course -- course of each student (e.g., P1112), or one course for every student
+        netid -- lower case NetID of each student
+        """
+
+        return self.NetIDs.get_indexer(Hash_Keys(course, netid)) >= 0
+
+@lru_cache(maxsize = None)
+def _Load_Consent_Index(file):
+    return Consent_Index(_Load_Consent(file))
+
+@lru_cache(maxsize = None)
+def _Load_ECLASS_Answers(file):
+    import numpy as np
+    import pandas as pd
+
+    # strip the correct answers, noted as agree (A) or disagree (D), and convert A to 1 and D to -1. Answers are stored in a series
+    Correct_Answers = pd.read_excel(file, sheet_name = 'Converted').iloc[[0, 2], 1:].reset_index(drop = True)
+    Correct_Answers.columns = Correct_Answers.iloc[1, :]
+    return pd.Series(Correct_Answers.iloc[0, :].to_dict()).map({'A':1, 'D':-1, 'CONTROL':np.nan}).dropna()
+
+def Get_Consent_df():
+    """Return dataframe of students who opted out of research, with normalized FullName and Course columns. The dataframe is shared, so don't modify it"""
+
+    return _Load_Consent(CONFIG['master_list'])
+
+def Get_Consent_Index(file = None):
+    """Return the shared Consent_Index of students who opted out of research
+
+    Keyword arguments:
+    file -- file path to excel list of students who have opted out of research; if None, the configured master list is used
+    """
+
+    return _Load_Consent_Index(CONFIG['master_list'] if file is None else file)
+
+def Get_ECLASS_Answers():
+    """Return series of correct E-CLASS answers (1 for agree, -1 for disagree) indexed by question. The series is shared, so don't modify it"""
+
+    return _Load_ECLASS_Answers(CONFIG['eclass_answers'])
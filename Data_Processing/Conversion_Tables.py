@@ -0,0 +1,136 @@
+import os
+import hashlib
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+
+# Tables for converting test scores to something comparable across tests: ACT and SAT math scores to percentiles (from blog.prepscholar.com), and AP
+# scores to whether a student did well enough for Cornell to give course credit. Each table is stored as a dense array indexed by score (less the
+# lowest score, over the spacing between scores, so SAT scores in steps of 10 from 200 take 61 entries), and a whole column is converted with one
+# array lookup instead of hashing every score. Tables come in versions, so a new concordance (e.g., new SAT percentiles) can be added as rows with a
+# new Version in Conversion_Tables.csv, or loaded from another file with Load_Tables, and picked with the versions arguments in Registrar_Processing.
+CONVERSION_TABLES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Conversion_Tables.csv')
+
+TABLES = {} # (table, version) -> Conversion_Table
+DEFAULTS = {} # table -> version used when none is asked for, the first one registered
+
+class Conversion_Table:
+    """Dense lookup array for one version of a conversion table
+
+    Keyword arguments:
+    scores -- integer scores in the table
+    values -- value of each score: numbers (e.g., percentiles), or labels (e.g., Poor or Well), which come out as a categorical
+
+    Scores that aren't in the table (including missing scores and scores between the table's steps) convert to missing values.
+    """
+
+    def __init__(self, scores, values):
+        scores = np.asarray(scores, dtype = np.int64)
+        if len(scores) == 0 or len(np.unique(scores)) < len(scores):
+            raise ValueError('conversion table scores must be non-empty and unique')
+        self.offset = int(scores.min())
+        self.step = int(np.gcd.reduce(scores - self.offset)) or 1
+        slots = (scores - self.offset) // self.step
+
+        numeric = pd.to_numeric(pd.Series(values, dtype = object), errors = 'coerce')
+        if numeric.notna().all():
+            self.categories = None
+            self.array = np.full(slots.max() + 1, np.nan)
+            self.array[slots] = numeric.to_numpy(dtype = float)
+        else:
+            codes, self.categories = pd.factorize(pd.Series(values, dtype = object).astype(str), sort = True)
+            self.array = np.full(slots.max() + 1, -1, dtype = np.int8)
+            self.array[slots] = codes
+
+    def Slots(self, scores):
+        """Position of each score in the array, and whether it's in the table at all"""
+
+        scores = pd.Series(scores).to_numpy(dtype = float, na_value = np.nan)
+        slots = (scores - self.offset) / self.step
+        found = (slots >= 0) & (slots < len(self.array)) & (slots == np.floor(slots)) # comparisons with NaN are False, so missing scores aren't found
+        slots = np.where(found, slots, 0).astype(np.int64)
+        return slots, found
+
+    def Convert(self, scores):
+        """Convert an array or series of scores: a float array for numeric tables, or a categorical for label tables"""
+
+        slots, found = self.Slots(scores)
+        if self.categories is None:
+            return np.where(found, self.array[slots], np.nan)
+        return pd.Categorical.from_codes(np.where(found, self.array[slots], -1), categories = self.categories)
+
+    def Fingerprint(self):
+        """Hash of the table's contents"""
+
+        sha = hashlib.sha256(str((self.offset, self.step, None if self.categories is None else list(self.categories))).encode())
+        sha.update(self.array.tobytes())
+        return sha.hexdigest()
+
+def Register_Table(table, version, scores, values, default = False):
+    """Add a version of a conversion table, replacing any table already registered under the same name and version
+
+    Keyword arguments:
+    table -- name of the table, e.g., SAT_Math
+    version -- name of this version, e.g., the year of the concordance
+    scores -- integer scores in the table
+    values -- value of each score
+    default -- whether this version is used when no version is asked for; the first version registered for a table is the default until another
+               one is registered with default = True
+    """
+
+    Load_Tables() # so the tables in Conversion_Tables.csv keep being the defaults
+    _Register(table, version, scores, values, default)
+
+def _Register(table, version, scores, values, default = False):
+    TABLES[(table, str(version))] = Conversion_Table(scores, values)
+    if default or table not in DEFAULTS:
+        DEFAULTS[table] = str(version)
+
+@lru_cache(maxsize = None)
+def Load_Tables(file = CONVERSION_TABLES_FILE):
+    """Register every version of every table in a csv file with Table, Version, Score, and Value columns; each file is only read once per process
+
+    Keyword arguments:
+    file -- file path to csv file of conversion tables
+    """
+
+    df = pd.read_csv(file, dtype = {'Table':str, 'Version':str, 'Value':str})
+    for (table, version), df_table in df.groupby(['Table', 'Version'], sort = False):
+        _Register(table, version, df_table['Score'], df_table['Value'])
+    return sorted(df[['Table', 'Version']].drop_duplicates().itertuples(index = False, name = None))
+
+def Get_Table(table, version = None):
+    """Look up a registered conversion table, loading the tables in Conversion_Tables.csv the first time
+
+    Keyword arguments:
+    table -- name of the table, e.g., ACT_Math
+    version -- version of the table; if None, the table's default version
+    """
+
+    Load_Tables()
+    version = DEFAULTS.get(table) if version is None else str(version)
+    if (table, version) not in TABLES:
+        raise KeyError('no conversion table ' + str(table) + ' version ' + str(version) + '; registered tables are ' + str(sorted(TABLES)))
+    return TABLES[(table, version)]
+
+def Convert(scores, table, version = None):
+    """Convert scores with a registered conversion table
+
+    Keyword arguments:
+    scores -- array or series of scores
+    table -- name of the table, e.g., ACT_Math
+    version -- version of the table; if None, the table's default version
+    """
+
+    return Get_Table(table, version).Convert(scores)
+
+def Fingerprint(tables, versions = None):
+    """Hash of the contents of the tables that would be used, e.g., for cache keys, so registering or editing a table invalidates cached output
+
+    Keyword arguments:
+    tables -- list of table names
+    versions -- dictionary of table versions to use instead of the defaults
+    """
+
+    versions = versions or {}
+    return hashlib.sha256(''.join(Get_Table(table, versions.get(table)).Fingerprint() for table in tables).encode()).hexdigest()
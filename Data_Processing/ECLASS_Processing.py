@@ -2,52 +2,74 @@ import os
 import numpy as np
 import pandas as pd
 from glob import glob
-
-# Emily Smith put together an excel file and noted the correct answers for each question as agree (A) or disagree (D)
-# these commands process that excel file, strip the correct answers, and convert A to 1 and D to -1. Answers are stored in a series
-Correct_Answers = pd.read_excel('C:/Users/Cole/Documents/DATA/ECLASS_DATA/Answers_Template.xlsx', sheet_name = 'Converted').iloc[[0, 2], 1:].reset_index(drop = True)
-Correct_Answers.columns = Correct_Answers.iloc[1, :]
-Correct_Answers = pd.Series(Correct_Answers.iloc[0, :].to_dict()).map({'A':1, 'D':-1, 'CONTROL':np.nan}).dropna()
-
-# Natasha Holmes compiled an excel file of students that opted out of research...we need to remove those students from our dataset
-Consent_df = pd.read_excel('C:/Users/Cole/Documents/DATA/MasterList.xlsx')
-Consent_df['FullName'] = (Consent_df['First Name:'] + Consent_df['Last Name:']).str.lower().str.replace(' ', '')
-Consent_df['Course'] = Consent_df['Course'].str.split(' ').str.get(1).apply(lambda x: 'P' + x[:-1]) # some courses were logged as Phys xxxx, others just as xxxx
-
-def Clean_ECLASS(File, Course):
+from Consent_Registry import Get_Consent_Index, Get_ECLASS_Answers
+from Matching_Engine import Merge_Pre_Post
+from Scoring_Engine import LIKERT_COLLAPSE, Response_Matrix, Score_Responses
+from Parallel_Processing import Map_Terms
+from Incremental_Build import Build_Terms
+from Columnar_Output import Write_Master
+from Streaming_Reader import Stream_CSV, CHUNKSIZE
+from Instrumentation import Stage, Profiled
+
+# ID columns
+ID_DTYPES = {'Q3_1_TEXT':'str', 'Q3_2_TEXT':'str', 'Q3_3_TEXT':'str'}
+
+@Profiled()
+def Clean_ECLASS(File, Course, chunksize = CHUNKSIZE, columns = None):
     """Filter and score E-CLASS file.
 
     Keyword arguments:
     File -- an E-CLASS raw csv file to process
     Course -- Cornell course where the survey was administered
+    chunksize -- number of responses to read, filter, and score at a time, passed to Stream_CSV; if None, the whole file is read at once
+    columns -- columns to read, passed to Stream_CSV; if None, all columns are read. ECLASS_Columns() has everything needed to match and score surveys
     """
 
+    Correct_Answers = Get_ECLASS_Answers()
+
     Student_cols = [col for col in Correct_Answers.index if 'a' in col] # student columns ended in '_a'
     Expert_cols = [col for col in Correct_Answers.index if 'b' in col] # expert columns ended in '_b'
 
-    df = pd.read_csv(File)
-    df = df[df.loc[:, 'q40a'] == 4].drop(columns = ['q40a']) # this was a filtering question, students paying attention should have selected 4
+    def Process_Chunk(df):
+        with Stage('ECLASS attention check', rows_in = df) as stage:
+            df = df[df.loc[:, 'q40a'] == 4].drop(columns = ['q40a']) # this was a filtering question, students paying attention should have selected 4
+            stage.Rows_Out(df)
 
-    df['Q3_1_TEXT'] = df['Q3_1_TEXT'].str.lower().str.replace(' ', '')
-    df['Q3_2_TEXT'] = df['Q3_2_TEXT'].str.lower().str.replace(' ', '')
-    df['Q3_3_TEXT'] = df['Q3_3_TEXT'].apply(lambda x: x.split('@')[0].lower()).str.replace(' ', '')
+        df['Q3_1_TEXT'] = df['Q3_1_TEXT'].str.lower().str.replace(' ', '')
+        df['Q3_2_TEXT'] = df['Q3_2_TEXT'].str.lower().str.replace(' ', '')
+        df['Q3_3_TEXT'] = df['Q3_3_TEXT'].apply(lambda x: x.split('@')[0].lower()).str.replace(' ', '')
 
-    df = df.drop_duplicates(subset = ['Q3_1_TEXT', 'Q3_2_TEXT'], keep = 'last').drop_duplicates(subset = ['Q3_3_TEXT'], keep = 'last') # drop duplicated names or IDs
-    df['FullName'] = (df['Q3_1_TEXT'] + df['Q3_2_TEXT']).str.lower().str.replace(' ', '')
-    Opt_Outs = Consent_df.loc[(Consent_df['Course'] == Course), :] # students who opted out of research
-    df = df.loc[~df['FullName'].isin(Opt_Outs), :].drop(columns = ['FullName'])
+        # items are Likert and range from 1 to 5, correctness is only assessed on collapsed agree (4 or 5) or disagree (1 or 2). If the answers align (i.e., A and
+        # A, then students get 1 point, if answers are opposed (i.e., A and D), then students get -1 points, and if a student selects neutral they get 0 points
+        item_scores, _ = Score_Responses(Response_Matrix(df, Correct_Answers.index), Correct_Answers.values, collapse = LIKERT_COLLAPSE)
+        df[list(Correct_Answers.index)] = item_scores
 
-    # items are Likert and range from 1 to 5, correctness is only assessed on collapsed agree (4 or 5) or disagree (1 or 2). If the answers align (i.e., A and
-    # A, then students get 1 point, if answers are opposed (i.e., A and D), then students get -1 points, and if a student selects neutral they get 0 points
-    df.loc[:, Correct_Answers.index.values] = df.loc[:, Correct_Answers.index.values].apply(lambda x: x.map({1:-1, 2:-1, 3:0, 4:1, 5:1}))
-    df.loc[:, Correct_Answers.index.values] = df.loc[:, Correct_Answers.index.values] * Correct_Answers
+        df['Student_Score'] = np.nansum(item_scores[:, Correct_Answers.index.isin(Student_cols)], axis = 1)
+        df['Expert_Score'] = np.nansum(item_scores[:, Correct_Answers.index.isin(Expert_cols)], axis = 1)
+        return df
 
-    df['Student_Score'] = df.loc[:, Student_cols].sum(axis = 1)
-    df['Expert_Score'] = df.loc[:, Expert_cols].sum(axis = 1)
+    # IDs are read as text so they look the same in every chunk
+    df = Stream_CSV(File, Process_Chunk, columns = columns, dtype = ID_DTYPES, chunksize = chunksize)
+
+    # duplicates and opt outs can only be found once all chunks are in
+    with Stage('ECLASS duplicates', rows_in = df) as stage:
+        df = df.drop_duplicates(subset = ['Q3_1_TEXT', 'Q3_2_TEXT'], keep = 'last').drop_duplicates(subset = ['Q3_3_TEXT'], keep = 'last') # drop duplicated names or IDs
+        stage.Rows_Out(df)
+    with Stage('ECLASS opt outs', rows_in = df) as stage:
+        df['FullName'] = (df['Q3_1_TEXT'] + df['Q3_2_TEXT']).str.lower().str.replace(' ', '')
+        df = df.loc[~Get_Consent_Index().Opted_Out_Name(Course, df['FullName']), :].drop(columns = ['FullName']) # remove students who opted out of research
+        stage.Rows_Out(df)
 
     return df
 
-def MergePrePost(PreFile, PostFile, Course, Semester, Year, OutFileName = None):
+def ECLASS_Columns():
+    """Smallest set of columns needed to filter, match, and score E-CLASS surveys, to pass to Clean_ECLASS"""
+
+    return ['V1', 'q40a', 'Q47'] + list(ID_DTYPES) + list(Get_ECLASS_Answers().index)
+
+@Profiled()
+def MergePrePost(PreFile, PostFile, Course, Semester, Year, OutFileName = None, return_stats = False, chunksize = CHUNKSIZE, fuzzy = False,
+                 all_columns = True):
     """Outer join pre and post test files together for a single course
 
     Keyword arguments:
@@ -57,54 +79,68 @@ def MergePrePost(PreFile, PostFile, Course, Semester, Year, OutFileName = None):
     Semester -- semester that the survey was adminsitered; either Fall, Spring, or Summer
     Year -- year that the survey was administered
     OutFileName -- name of the file to write the merged dataset to
+    return_stats -- whether to also return a dictionary with the number of students matched on each key
+    chunksize -- number of responses to read at a time, passed to Clean_ECLASS
+    fuzzy -- whether to also match leftover students on names that are close but not equal, e.g., with a typo; the similarity of each of these
+             matches is kept in Fuzzy_Score
+    all_columns -- whether to read every column of the raw files; if False, only the columns needed to filter, match, and score surveys
+                   (ECLASS_Columns()) are read, which is faster and uses less memory, but leaves the other survey questions out of the output
     """
 
-    Predf = Clean_ECLASS(PreFile, Course)
-    Postdf = Clean_ECLASS(PostFile, Course)
+    columns = None if all_columns else ECLASS_Columns()
+    Predf = Clean_ECLASS(PreFile, Course, chunksize = chunksize, columns = columns)
+    Postdf = Clean_ECLASS(PostFile, Course, chunksize = chunksize, columns = columns)
 
-    # merge separately on full name, backwards name, and ID to capture as many students as possible that took both pre and posttests
-    Full_df = pd.merge(left = Predf, right = Postdf, how = 'inner', on = ['Q3_1_TEXT', 'Q3_2_TEXT'])
-    Back_df = pd.merge(left = Predf, right = Postdf, how = 'inner', left_on = ['Q3_1_TEXT', 'Q3_2_TEXT'], right_on = ['Q3_2_TEXT', 'Q3_1_TEXT'])
-    ID_df = pd.merge(left = Predf, right = Postdf, how = 'inner', on = 'Q3_3_TEXT').rename(columns = {'Q3_3_TEXT':'Q3_3_TEXT_y'})
+    # match on full name, backwards name, and ID (in that order) to capture as many students as possible that took both pre and posttests, making sure
+    # students aren't double counted, and put back students who only took one of the pre or posttest in our dataset
+    keys = [('name', ['Q3_1_TEXT', 'Q3_2_TEXT'], ['Q3_1_TEXT', 'Q3_2_TEXT']), ('backwardsName', ['Q3_1_TEXT', 'Q3_2_TEXT'], ['Q3_2_TEXT', 'Q3_1_TEXT']),
+            ('ID', ['Q3_3_TEXT'], ['Q3_3_TEXT'])]
+    Merged_df, match_stats = Merge_Pre_Post(Predf, Postdf, keys, unique_post = False, fuzzy_keys = keys[:2] if fuzzy else None)
+    Q3_3_TEXT = Merged_df['Q3_3_TEXT'].fillna(Merged_df['Q3_3_TEXT_y']).fillna(Merged_df['Q3_3_TEXT_x'])
+    Merged_df = Merged_df.drop(columns = ['Q3_3_TEXT', 'Q3_1_TEXT_x', 'Q3_1_TEXT_y', 'Q3_2_TEXT_x', 'Q3_2_TEXT_y', 'Q3_3_TEXT_x', 'Q3_3_TEXT_y'])
 
-    # we make sure students aren't double counted
-    Merged_df = pd.concat([Full_df, Back_df, ID_df], axis = 0, join = 'outer').drop_duplicates(subset = ['V1_x'])
-
-    # and put back students who only took one of the pre or posttest in our dataset
-    Pre_Cols = [col if col in Merged_df.columns else col + '_x' for col in Predf.columns]
-    Out_Pre = Predf.loc[~Predf['V1'].isin(Merged_df['V1_x'])]
-    Out_Pre.columns = Pre_Cols
-
-    Post_Cols = [col if col in Merged_df.columns else col + '_y' for col in Postdf.columns]
-    Out_Post = Postdf.loc[~Postdf['V1'].isin(Merged_df['V1_y'])]
-    Out_Post.columns = Post_Cols
-
-    Merged_df = pd.concat([Merged_df, Out_Pre, Out_Post]).reset_index(drop = True)
-    Merged_df['Q3_3_TEXT'] = Merged_df['Q3_3_TEXT_y'].fillna(Merged_df['Q3_3_TEXT_x'])
-    Merged_df = Merged_df.drop(columns = ['Q3_1_TEXT_x', 'Q3_1_TEXT_y', 'Q3_2_TEXT_x', 'Q3_2_TEXT_y', 'Q3_3_TEXT_x', 'Q3_3_TEXT_y'])
-
-    Merged_df['Course'] = Course
-    Merged_df['Semester'] = Semester
-    Merged_df['Year'] = Year
+    # new columns go on in one concat, since adding them one at a time to a frame this wide fragments it
+    Merged_df = pd.concat([Merged_df, pd.DataFrame({'Q3_3_TEXT':Q3_3_TEXT, 'Course':Course, 'Semester':Semester, 'Year':Year}, index = Merged_df.index)],
+                          axis = 1)
 
     if OutFileName is not None:
         Merged_df.to_csv(OutFileName, index = False)
 
+    if return_stats:
+        return Merged_df, match_stats
     return Merged_df
 
-def BuildMasterECLASSDataset(dir):
+@Profiled()
+def BuildMasterECLASSDataset(dir, n_workers = 1, incremental = False, out_format = 'csv', chunksize = CHUNKSIZE, store = None, fuzzy = False,
+                             all_columns = True):
     """Construct master E-CLASS dataset of matched and unmatched surveys
 
     Keyword arguments:
     dir -- directory where E-CLASS raw files are stored
+    n_workers -- number of processes to match terms in, passed to Map_Terms
+    incremental -- whether to only rematch terms whose raw files changed since the last build, reusing cached output for the rest
+    out_format -- one of csv, parquet, or feather; parquet and feather output is a directory partitioned by Course, Year, and Semester
+    chunksize -- number of responses to read at a time, passed to Clean_ECLASS
+    store -- file path to a SQLite store to also write the master dataset to, as table ECLASS_Master
+    fuzzy -- whether to also match students on identifiers that are close but not equal, passed to MergePrePost
+    all_columns -- whether to read every column of the raw files, passed to MergePrePost
     """
 
-    os.chdir(dir)
-    pre_files = glob('RAW/**/*PRE*csv', recursive = True)
-    post_files = glob('RAW/**/*POST*csv', recursive = True)
-
-    # semester and year is in the filename, we'll just concatenate those together
-    matched_dfs = [MergePrePost(pre_f, post_files[i], 'P' + pre_f.split('-')[-3][-4:], pre_f.split('\\')[1][:2].upper(), pre_f.split('\\')[1][-4:]) for i, pre_f in enumerate(pre_files)]
+    pre_files = sorted(glob(os.path.join(dir, 'RAW', '**', '*PRE*csv'), recursive = True))
+    post_files = sorted(glob(os.path.join(dir, 'RAW', '**', '*POST*csv'), recursive = True))
+
+    # semester and year is in the filename (relative to dir), we'll just concatenate those together
+    term_args = []
+    for i, pre_f in enumerate(pre_files):
+        rel_f = os.path.relpath(pre_f, dir)
+        term_args.append((pre_f, post_files[i], 'P' + rel_f.split('-')[-3][-4:], rel_f.split(os.sep)[1][:2].upper(), rel_f.split(os.sep)[1][-4:]))
+    if incremental:
+        matched_dfs = Build_Terms(MergePrePost, term_args, os.path.join(dir, '.build_cache'), n_workers = n_workers, chunksize = chunksize,
+                                  fuzzy = fuzzy, all_columns = all_columns)
+    else:
+        matched_dfs = Map_Terms(MergePrePost, term_args, n_workers = n_workers, chunksize = chunksize, fuzzy = fuzzy, all_columns = all_columns)
     df = pd.concat(matched_dfs, axis = 0)
 
-    df.to_csv('E-CLASS_Master.csv', index = False)
+    outfile = os.path.join(dir, 'E-CLASS_Master.csv' if out_format == 'csv' else 'E-CLASS_Master')
+    Write_Master(df, outfile, out_format = out_format, partition_cols = ['Course', 'Year', 'Semester'], store = store, table = 'ECLASS_Master')
+    return df
@@ -0,0 +1,53 @@
+import os
+import hashlib
+
+def Hash_File(file, block_size = 1 << 20):
+    """Compute sha256 hash of a file's contents
+
+    Keyword arguments:
+    file -- file path to hash
+    block_size -- number of bytes to read at a time, so big registrar extracts don't need to be held in memory
+    """
+
+    sha = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def Hash_Files(files, *extra):
+    """Combine content hashes of several files (and any extra values, like a processing version) into one cache key
+
+    Keyword arguments:
+    files -- list of file paths that feed into a cached artifact
+    extra -- any other values that should invalidate the cache when they change
+    """
+
+    sha = hashlib.sha256()
+    for file in files:
+        sha.update(Hash_File(file).encode())
+    for value in extra:
+        sha.update(str(value).encode())
+    return sha.hexdigest()
+
+def Cached_Frame(cache_dir, prefix, key, build):
+    """Return a dataframe cached in a parquet file named by its key, building and writing it first if it isn't there yet
+
+    Keyword arguments:
+    cache_dir -- directory where cached parquet files are stored
+    prefix -- name used to identify the artifact in the cache directory
+    key -- cache key, usually from Hash_Files
+    build -- function with no arguments that builds the dataframe when there is no cached copy
+    """
+
+    import pandas as pd
+
+    cache_file = os.path.join(cache_dir, prefix + '_' + key[:16] + '.parquet')
+    if os.path.exists(cache_file):
+        return pd.read_parquet(cache_file)
+
+    df = build()
+    os.makedirs(cache_dir, exist_ok = True)
+    df.to_parquet(cache_file + '.tmp', index = False) # write to a temporary file first so an interrupted run doesn't leave a broken cache behind
+    os.replace(cache_file + '.tmp', cache_file)
+    return df
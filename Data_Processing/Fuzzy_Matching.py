@@ -0,0 +1,208 @@
+from itertools import product
+import numpy as np
+import pandas as pd
+from Matching_Engine import Key_Codes, Join_Codes
+
+# Fuzzy matching for students whose identifiers don't match exactly (typos like 'jonh' for 'john' or a mistyped digit in an ID). Only rows left
+# unmatched by the exact keys are compared, and only against rows in the same block: rows that share the first (or last) few characters of every
+# identifier column, plus any block columns like Course. Every block is compared in several passes, using the start of some columns and the end of
+# the others, so one typo can't keep a pair out of every block. Candidate pairs are scored by edit distance all at once with numpy, and matched one to
+# one, best score first. Nicknames (e.g., 'bob' for 'robert') are too far apart in edits to be caught here.
+
+FUZZY_THRESHOLD = 0.8 # smallest similarity (1 - edits / length) that counts as a match
+BLOCK_CHARS = 3 # number of characters at the start or end of each identifier used for blocking
+MAX_LENGTH = 32 # identifiers are cut to this many characters before scoring
+PAIR_CHUNK = 500000 # number of candidate pairs scored at a time, to bound memory
+
+def Encode_Strings(values, max_length = MAX_LENGTH):
+    """Fixed width array of character codes for a series of strings, and their lengths
+
+    Keyword arguments:
+    values -- series of strings; missing values are treated as empty strings
+    max_length -- strings are cut to this many characters
+    """
+
+    strings = pd.Series(values, dtype = object).fillna('').astype(str).str.slice(0, max_length)
+    lengths = strings.str.len().to_numpy(dtype = np.int64)
+    width = max(int(lengths.max()) if len(lengths) > 0 else 0, 1)
+    padded = ''.join(strings.str.ljust(width, '\0'))
+    return np.frombuffer(padded.encode('utf-32-le'), dtype = np.uint32).reshape(len(strings), width), lengths
+
+def Edit_Distance(a, a_len, b, b_len):
+    """Levenshtein distance between each row of a and the same row of b
+
+    Keyword arguments:
+    a -- 2D array of character codes, from Encode_Strings
+    a_len -- lengths of the strings in a
+    b -- 2D array of character codes, with as many rows as a
+    b_len -- lengths of the strings in b
+
+    The dynamic program goes one character of a at a time, for every pair at once. Within a row, the insertion step (each cell is at most one more
+    than the cell to its left) is a running minimum, so there's no loop over the characters of b.
+    """
+
+    n, width = b.shape
+    steps = np.arange(width + 1)
+    prev = np.broadcast_to(steps, (n, width + 1)).astype(np.int32)
+    dist = np.where(a_len == 0, b_len, 0).astype(np.int32)
+    for i in range(1, a.shape[1] + 1):
+        cur = np.empty_like(prev)
+        cur[:, 0] = i
+        cur[:, 1:] = np.minimum(prev[:, 1:] + 1, prev[:, :-1] + (a[:, i - 1:i] != b))
+        cur = np.minimum.accumulate(cur - steps, axis = 1) + steps
+        done = np.flatnonzero(a_len == i)
+        dist[done] = cur[done, b_len[done]]
+        prev = cur
+    return dist
+
+def Valid_Rows(df, cols):
+    """Positions of rows with every identifier column filled in"""
+
+    valid = np.ones(len(df), dtype = bool)
+    for col in cols:
+        values = df[col].astype(object)
+        valid &= values.notna().to_numpy() & ~values.isin(['', 'nan', 'none']).to_numpy()
+    return np.flatnonzero(valid)
+
+def Candidate_Pairs(df_pre, df_post, pre_cols, post_cols, block_cols = [], block_chars = BLOCK_CHARS):
+    """Pairs of pretest and posttest rows that share a block in at least one blocking pass
+
+    Keyword arguments:
+    df_pre -- dataframe of pretest responses
+    df_post -- dataframe of posttest responses
+    pre_cols -- list of identifier columns in df_pre
+    post_cols -- list of identifier columns in df_post, in the same order as pre_cols
+    block_cols -- columns in both dataframes that pairs must agree on exactly, e.g., Course
+    block_chars -- number of characters at the start or end of each identifier to block on
+
+    Returns positions of pretest rows and of their candidate posttest rows, without duplicates.
+    """
+
+    pairs = []
+    for ends in product(['start', 'end'], repeat = len(pre_cols)): # the start of some identifiers and the end of the others
+        keys = []
+        for df, cols in [(df_pre, pre_cols), (df_post, post_cols)]:
+            key = df[block_cols].reset_index(drop = True)
+            for k, (col, end) in enumerate(zip(cols, ends)):
+                values = df[col].astype(str).reset_index(drop = True)
+                key['_block' + str(k)] = values.str.slice(0, block_chars) if end == 'start' else values.str.slice(-block_chars)
+            keys.append(key)
+        key_cols = list(keys[0].columns)
+        pre_codes, post_codes = Key_Codes(keys[0], keys[1], key_cols, key_cols)
+        pre_idx, post_idx = Join_Codes(pre_codes, post_codes)
+        pairs.append(pre_idx * len(df_post) + post_idx)
+
+    pairs = np.unique(np.concatenate(pairs)) if pairs else np.array([], dtype = np.int64)
+    return pairs // max(len(df_post), 1), pairs % max(len(df_post), 1)
+
+def Score_Pairs(df_pre, df_post, pre_idx, post_idx, pre_cols, post_cols, max_length = MAX_LENGTH, pair_chunk = PAIR_CHUNK):
+    """Similarity of each candidate pair: 1 - (edits summed over identifier columns) / (length of the longer strings summed over columns)
+
+    Keyword arguments:
+    df_pre -- dataframe of pretest responses
+    df_post -- dataframe of posttest responses
+    pre_idx -- positions of pretest rows in the candidate pairs
+    post_idx -- positions of posttest rows in the candidate pairs
+    pre_cols -- list of identifier columns in df_pre
+    post_cols -- list of identifier columns in df_post, in the same order as pre_cols
+    max_length -- identifiers are cut to this many characters
+    pair_chunk -- number of pairs scored at a time
+    """
+
+    encoded = [(Encode_Strings(df_pre[pre_col], max_length), Encode_Strings(df_post[post_col], max_length))
+               for pre_col, post_col in zip(pre_cols, post_cols)]
+    score = np.empty(len(pre_idx))
+    for start in range(0, len(pre_idx), pair_chunk):
+        pre, post = pre_idx[start:start + pair_chunk], post_idx[start:start + pair_chunk]
+        edits = np.zeros(len(pre))
+        length = np.zeros(len(pre))
+        for (a, a_len), (b, b_len) in encoded:
+            edits += Edit_Distance(a[pre], a_len[pre], b[post], b_len[post])
+            length += np.maximum(a_len[pre], b_len[post])
+        score[start:start + pair_chunk] = 1 - edits / np.maximum(length, 1)
+    return score
+
+def Single_Best(idx, score):
+    """Whether each pair belongs to a row with only one best scoring candidate
+
+    Keyword arguments:
+    idx -- positions of the rows (on one side) in the candidate pairs
+    score -- similarity of each pair
+    """
+
+    if len(idx) == 0:
+        return np.ones(0, dtype = bool)
+    best = np.full(idx.max() + 1, -np.inf)
+    np.maximum.at(best, idx, score)
+    ties = np.bincount(idx[score == best[idx]], minlength = len(best))
+    return ties[idx] == 1
+
+def Assign_One_To_One(pre_idx, post_idx, score):
+    """Pick matches from scored candidate pairs so every row is in at most one match, taking the best scores first
+
+    Keyword arguments:
+    pre_idx -- positions of pretest rows in the candidate pairs
+    post_idx -- positions of posttest rows in the candidate pairs
+    score -- similarity of each pair
+
+    Ties go to the earlier pretest row and then the earlier posttest row. Rather than walk the pairs one at a time, each round accepts every pair that
+    is the best remaining pair for both of its rows, which picks the same matches.
+    """
+
+    order = np.lexsort((post_idx, pre_idx, -score))
+    pre_idx, post_idx, score = pre_idx[order], post_idx[order], score[order]
+    accepted = np.zeros(len(order), dtype = bool)
+    alive = np.ones(len(order), dtype = bool)
+    while alive.any():
+        idx = np.flatnonzero(alive)
+        _, first_pre = np.unique(pre_idx[idx], return_index = True)
+        _, first_post = np.unique(post_idx[idx], return_index = True)
+        best = np.intersect1d(idx[first_pre], idx[first_post])
+        accepted[best] = True
+        alive &= ~np.isin(pre_idx, pre_idx[best]) & ~np.isin(post_idx, post_idx[best])
+    keep = np.flatnonzero(accepted)
+    keep = keep[np.lexsort((post_idx[keep], pre_idx[keep]))] # back in pretest order
+    return pre_idx[keep], post_idx[keep], score[keep]
+
+def Fuzzy_Match(df_pre, df_post, keys, block_cols = [], threshold = FUZZY_THRESHOLD, block_chars = BLOCK_CHARS):
+    """Match pretest and posttest rows on identifiers that are close but not equal, trying keys in order of priority
+
+    Keyword arguments:
+    df_pre -- dataframe of pretest responses (usually the ones the exact keys left unmatched)
+    df_post -- dataframe of posttest responses
+    keys -- list of (name, pre_cols, post_cols) tuples in order of priority, like Match_Keys
+    block_cols -- columns in both dataframes that pairs must agree on exactly, e.g., Course
+    threshold -- smallest similarity that counts as a match
+    block_chars -- number of characters at the start or end of each identifier to block on
+
+    Returns positions of matched pretest rows, positions of their posttest rows, the index of the key each match was made on, and the similarity of
+    each match, for auditing. Each row is in at most one match, and rows whose best candidates are tied aren't matched. Keys should have enough in
+    them to tell students apart with a typo or two: a numeric student ID alone is a poor key, since student IDs are handed out in sequence and a
+    mistyped digit usually gives someone else's ID.
+    """
+
+    pre_left = np.arange(len(df_pre))
+    post_left = np.arange(len(df_post))
+    matches = []
+    for k, (name, pre_cols, post_cols) in enumerate(keys):
+        df_pre_k = df_pre.iloc[pre_left]
+        df_post_k = df_post.iloc[post_left]
+        pre_valid = Valid_Rows(df_pre_k, pre_cols)
+        post_valid = Valid_Rows(df_post_k, post_cols)
+        pre_idx, post_idx = Candidate_Pairs(df_pre_k.iloc[pre_valid], df_post_k.iloc[post_valid], pre_cols, post_cols, block_cols = block_cols,
+                                            block_chars = block_chars)
+        pre_idx, post_idx = pre_valid[pre_idx], post_valid[post_idx]
+        score = Score_Pairs(df_pre_k, df_post_k, pre_idx, post_idx, pre_cols, post_cols)
+        close = score >= threshold
+        pre_idx, post_idx, score = pre_idx[close], post_idx[close], score[close]
+        # a student who's equally close to two others could be either of them, so we leave them unmatched rather than guess
+        clear = Single_Best(pre_idx, score) & Single_Best(post_idx, score)
+        pre_idx, post_idx, score = Assign_One_To_One(pre_idx[clear], post_idx[clear], score[clear])
+
+        matches.append((pre_left[pre_idx], post_left[post_idx], np.full(len(pre_idx), k), score))
+        pre_left = np.setdiff1d(pre_left, pre_left[pre_idx])
+        post_left = np.setdiff1d(post_left, post_left[post_idx])
+
+    if len(matches) == 0:
+        return np.array([], dtype = np.int64), np.array([], dtype = np.int64), np.array([], dtype = np.int64), np.array([])
+    return tuple(np.concatenate(parts) for parts in zip(*matches))
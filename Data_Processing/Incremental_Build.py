@@ -0,0 +1,139 @@
+import os
+import json
+import glob
+import hashlib
+import inspect
+import pandas as pd
+import Consent_Registry
+from File_Cache import Hash_File
+from Parallel_Processing import Map_Terms
+
+# bump this whenever the cleaning or matching code changes, so partitions built by older code aren't reused. The source code of the processing scripts
+# is part of every term's key too, so edits there rebuild partitions even if this isn't bumped
+BUILD_CACHE_VERSION = 3
+
+def Load_Manifest(cache_dir):
+    """Load the build manifest (file fingerprints and the partition built for each term) from a cache directory
+
+    Keyword arguments:
+    cache_dir -- directory where the manifest and partitions are stored
+    """
+
+    manifest_file = os.path.join(cache_dir, 'manifest.json')
+    if not os.path.exists(manifest_file):
+        return {'version':BUILD_CACHE_VERSION, 'files':{}, 'partitions':{}}
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    # the version is part of every partition's key, so partitions from other versions are never reused; we keep track of them so Build_Terms can
+    # delete them once their terms are rebuilt
+    manifest['version'] = BUILD_CACHE_VERSION
+    manifest.setdefault('files', {})
+    manifest.setdefault('partitions', {})
+    return manifest
+
+def Save_Manifest(cache_dir, manifest):
+    """Write the build manifest to a cache directory
+
+    Keyword arguments:
+    cache_dir -- directory where the manifest and partitions are stored
+    manifest -- manifest dictionary, from Load_Manifest
+    """
+
+    manifest_file = os.path.join(cache_dir, 'manifest.json')
+    with open(manifest_file + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent = 1)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+def Fingerprint(file, manifest):
+    """Return the content hash of a file, only rehashing it if its size or modification time changed since it was last recorded in the manifest
+
+    Keyword arguments:
+    file -- file path to fingerprint
+    manifest -- manifest dictionary, from Load_Manifest; updated in place
+    """
+
+    file = os.path.abspath(file)
+    stat = os.stat(file)
+    entry = manifest['files'].get(file)
+    if (entry is None) or (entry['size'] != stat.st_size) or (entry['mtime'] != stat.st_mtime_ns):
+        entry = {'size':stat.st_size, 'mtime':stat.st_mtime_ns, 'sha256':Hash_File(file)}
+        manifest['files'][file] = entry
+    return entry['sha256']
+
+def Code_Fingerprint(func):
+    """Hash of the source code of every python script in the directory of a function's module, so partitions built by different code aren't reused
+
+    Keyword arguments:
+    func -- function applied to each term
+
+    The cleaning and matching functions call into several of the processing scripts (Scoring_Engine, Matching_Engine, Streaming_Reader...), so we hash
+    all of them rather than just the function itself.
+    """
+
+    sha = hashlib.sha256(inspect.getsource(func).encode())
+    for file in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(inspect.getsourcefile(func))), '*.py'))):
+        sha.update(os.path.basename(file).encode())
+        sha.update(Hash_File(file).encode())
+    return sha.hexdigest()
+
+def Term_Key(func, args, kwargs, manifest, code = None):
+    """Build the cache key for one term from the function, the cache version, the processing code, the contents of its input files, and its other
+    arguments
+
+    Keyword arguments:
+    func -- function applied to the term
+    args -- tuple of positional arguments for the term; arguments that are paths to existing files are fingerprinted
+    kwargs -- keyword arguments passed to func
+    manifest -- manifest dictionary, from Load_Manifest
+    code -- hash of the processing code, from Code_Fingerprint; if None, it's computed here
+    """
+
+    sha = hashlib.sha256()
+    sha.update((func.__module__ + '.' + func.__name__).encode())
+    sha.update(str(BUILD_CACHE_VERSION).encode())
+    sha.update((Code_Fingerprint(func) if code is None else code).encode())
+    for arg in args:
+        if isinstance(arg, str) and os.path.isfile(arg):
+            sha.update(Fingerprint(arg, manifest).encode())
+        else:
+            sha.update(repr(arg).encode())
+    sha.update(repr(sorted(kwargs.items())).encode())
+
+    # the consent list and answer key also change the processed output
+    for file in sorted(Consent_Registry.Get_Config().values()):
+        if os.path.isfile(file):
+            sha.update(Fingerprint(file, manifest).encode())
+    return sha.hexdigest()
+
+def Build_Terms(func, term_args, cache_dir, n_workers = 1, **kwargs):
+    """Apply a function to the files of each term like Map_Terms, but only recompute terms whose inputs changed and reuse cached partitions for the rest
+
+    Keyword arguments:
+    func -- module level function to apply (e.g., MergePrePost, Match_CSEM, or Match_MBT)
+    term_args -- list of tuples of positional arguments, one tuple per term
+    cache_dir -- directory where the manifest and the output for each term are stored
+    n_workers -- number of worker processes used for terms that need to be recomputed, passed to Map_Terms
+    kwargs -- keyword arguments passed to every call of func
+    """
+
+    os.makedirs(cache_dir, exist_ok = True)
+    manifest = Load_Manifest(cache_dir)
+
+    term_ids = [func.__name__ + ':' + repr(tuple(os.path.abspath(arg) if isinstance(arg, str) and os.path.isfile(arg) else arg for arg in args))
+                for args in term_args]
+    code = Code_Fingerprint(func)
+    partitions = [func.__name__ + '_' + Term_Key(func, args, kwargs, manifest, code = code)[:16] + '.pkl' for args in term_args]
+
+    # only terms without a partition built from their current inputs need to be recomputed
+    stale = [i for i, partition in enumerate(partitions) if not os.path.exists(os.path.join(cache_dir, partition))]
+    new_dfs = Map_Terms(func, [term_args[i] for i in stale], n_workers = n_workers, **kwargs)
+    for i, df in zip(stale, new_dfs):
+        df.to_pickle(os.path.join(cache_dir, partitions[i])) # pickle keeps the mixed survey columns exactly as they were
+        old_partition = manifest['partitions'].get(term_ids[i])
+        if (old_partition is not None) and (old_partition != partitions[i]) and os.path.exists(os.path.join(cache_dir, old_partition)):
+            os.remove(os.path.join(cache_dir, old_partition))
+        manifest['partitions'][term_ids[i]] = partitions[i]
+    Save_Manifest(cache_dir, manifest)
+
+    new_dfs = dict(zip(stale, new_dfs))
+    return [new_dfs[i] if i in new_dfs else pd.read_pickle(os.path.join(cache_dir, partition)) for i, partition in enumerate(partitions)]
@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import tracemalloc
+from functools import wraps
+
+# Optional profiling of pipeline stages. Each stage records wall time, CPU time, peak memory, and the number of rows going in and out, so we can see
+# which part of a run is slow and where students drop out (e.g., at the attention check or the opt-out list). It's off unless turned on with Enable
+# or the OVB_PROFILE environment variable; when it's off, Stage hands back one shared do-nothing object and Profiled calls straight through, so
+# leaving the hooks in the processing scripts costs next to nothing.
+CONFIG = {'enabled':os.environ.get('OVB_PROFILE', '') not in ['', '0'], 'trace_memory':False}
+
+RECORDS = []
+_STACK = []
+_ORIGIN = time.perf_counter()
+
+def Enable(trace_memory = False):
+    """Start recording stages
+
+    Keyword arguments:
+    trace_memory -- whether to measure memory with tracemalloc, which gives the peak memory allocated during each stage but slows everything down
+                    a few times over; otherwise memory is the growth in the process's peak resident set size, which is free but only shows stages
+                    that push memory use past its previous high, and isn't available on Windows (stages record None for memory there)
+    """
+
+    CONFIG['enabled'] = True
+    CONFIG['trace_memory'] = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def Disable():
+    """Stop recording stages; records so far are kept"""
+
+    CONFIG['enabled'] = False
+    if CONFIG['trace_memory'] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    CONFIG['trace_memory'] = False
+
+def Reset():
+    """Throw away records so far"""
+
+    RECORDS.clear()
+
+def Count_Rows(obj):
+    """Number of rows in a dataframe (or anything else with a length), or None"""
+
+    if obj is None:
+        return None
+    if isinstance(obj, int):
+        return obj
+    return len(obj) if hasattr(obj, '__len__') else None
+
+def Peak_RSS():
+    """Peak resident set size of this process in bytes, or None where the resource module doesn't exist (Windows)"""
+
+    try:
+        import resource # Unix only, so it's only imported when memory is measured
+    except ImportError:
+        return None
+    # ru_maxrss is in bytes on macOS and in kilobytes on linux and the other Unixes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+class _Null_Stage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def Rows_Out(self, obj):
+        pass
+
+_NULL_STAGE = _Null_Stage()
+
+class _Stage:
+    def __init__(self, name, rows_in):
+        self.name = name
+        self.rows_in = Count_Rows(rows_in)
+        self.rows_out = None
+
+    def __enter__(self):
+        if CONFIG['trace_memory']:
+            # the tracemalloc peak is global, so the running peak of the enclosing stage is saved before resetting it for this one
+            current, peak = tracemalloc.get_traced_memory()
+            if _STACK:
+                _STACK[-1].memory_peak = max(_STACK[-1].memory_peak, peak)
+            tracemalloc.reset_peak()
+            self.memory_start = self.memory_peak = current
+        else:
+            self.memory_start = Peak_RSS()
+        self.depth = len(_STACK)
+        _STACK.append(self)
+        self.cpu_start = time.process_time()
+        self.wall_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        _STACK.pop()
+        if CONFIG['trace_memory'] and tracemalloc.is_tracing():
+            self.memory_peak = max(self.memory_peak, tracemalloc.get_traced_memory()[1])
+            if _STACK:
+                _STACK[-1].memory_peak = max(_STACK[-1].memory_peak, self.memory_peak)
+            memory = self.memory_peak - self.memory_start
+        else:
+            peak = Peak_RSS()
+            memory = None if (peak is None) or (self.memory_start is None) else peak - self.memory_start
+
+        RECORDS.append({'stage':self.name, 'depth':self.depth, 'start_seconds':self.wall_start - _ORIGIN, 'wall_seconds':wall, 'cpu_seconds':cpu,
+                        'peak_memory_bytes':memory, 'rows_in':self.rows_in, 'rows_out':self.rows_out, 'pid':os.getpid(), 'error':exc_type is not None})
+        return False
+
+    def Rows_Out(self, obj):
+        """Record the number of rows coming out of the stage"""
+
+        self.rows_out = Count_Rows(obj)
+
+def Stage(name, rows_in = None):
+    """Context manager that records one named stage, e.g., `with Stage('opt outs', rows_in = df) as stage:` ... `stage.Rows_Out(df)`
+
+    Keyword arguments:
+    name -- name of the stage
+    rows_in -- dataframe going into the stage, or its number of rows
+    """
+
+    if not CONFIG['enabled']:
+        return _NULL_STAGE
+    return _Stage(name, rows_in)
+
+def Profiled(name = None):
+    """Decorator that records every call of a function as a stage, with the rows of the dataframe it returns (or the first item it returns) as the
+    rows out
+
+    Keyword arguments:
+    name -- name of the stage; if None, the function's name
+    """
+
+    def Decorator(function):
+        stage_name = function.__name__ if name is None else name
+
+        @wraps(function)
+        def Wrapper(*args, **kwargs):
+            if not CONFIG['enabled']:
+                return function(*args, **kwargs)
+            with _Stage(stage_name, None) as stage:
+                result = function(*args, **kwargs)
+                stage.Rows_Out(result[0] if isinstance(result, tuple) else result)
+            return result
+        return Wrapper
+    return Decorator
+
+def Records():
+    """Recorded stages as a dataframe, in the order they finished"""
+
+    import pandas as pd
+
+    return pd.DataFrame(RECORDS, columns = ['stage', 'depth', 'start_seconds', 'wall_seconds', 'cpu_seconds', 'peak_memory_bytes', 'rows_in',
+                                            'rows_out', 'pid', 'error'])
+
+def Summary():
+    """Recorded stages totalled by name (stages run on every chunk or file show up once), slowest first"""
+
+    df = Records()
+    df['rows_dropped'] = df['rows_in'] - df['rows_out']
+    Total = lambda x: x.sum(min_count = 1) # stages that don't count rows stay missing rather than adding up to 0
+    return df.groupby('stage').agg(calls = ('wall_seconds', 'size'), wall_seconds = ('wall_seconds', 'sum'), cpu_seconds = ('cpu_seconds', 'sum'),
+                                   peak_memory_bytes = ('peak_memory_bytes', 'max'), rows_in = ('rows_in', Total), rows_out = ('rows_out', Total),
+                                   rows_dropped = ('rows_dropped', Total)).sort_values('wall_seconds', ascending = False).reset_index()
+
+def Write_JSON(file):
+    """Write recorded stages to a JSON file
+
+    Keyword arguments:
+    file -- file path to write to
+    """
+
+    with open(file, 'w') as f:
+        json.dump({'records':RECORDS, 'trace_memory':CONFIG['trace_memory']}, f, indent = 2)
+
+def Write_Chrome_Trace(file):
+    """Write recorded stages in the Chrome trace event format, to open in chrome://tracing or ui.perfetto.dev
+
+    Keyword arguments:
+    file -- file path to write to
+    """
+
+    events = [{'name':record['stage'], 'ph':'X', 'ts':record['start_seconds'] * 1e6, 'dur':record['wall_seconds'] * 1e6, 'pid':record['pid'],
+               'tid':record['pid'], 'args':{key:record[key] for key in ['cpu_seconds', 'peak_memory_bytes', 'rows_in', 'rows_out', 'error']}}
+              for record in RECORDS]
+    with open(file, 'w') as f:
+        json.dump({'traceEvents':events, 'displayTimeUnit':'ms'}, f)
@@ -2,55 +2,78 @@ import os
 import pandas as pd
 from datetime import datetime
 from glob import glob
+from Consent_Registry import Get_Consent_Index
+from Matching_Engine import Merge_Pre_Post
+from Scoring_Engine import Response_Matrix, Score_Responses
+from Parallel_Processing import Map_Terms
+from Incremental_Build import Build_Terms
+from Columnar_Output import Write_Master
+from Streaming_Reader import Header_Rows, Stream_CSV, CHUNKSIZE
+from Instrumentation import Stage, Profiled
 
 Correct_Answers = {'Q1':2, 'Q2':4, 'Q3':5, 'Q4':3, 'Q5':1, 'Q6':3, 'Q7':3, 'Q8':4, 'Q9':1, 'Q10':5, 'Q11':5, 'Q12':3,
                    'Q13':2, 'Q14':2, 'Q15':5, 'Q16':1, 'Q17':4, 'Q18':2, 'Q19':3, 'Q20':3, 'Q21':1, 'Q22':2,
                    'Q23':4, 'Q24':1, 'Q25':1, 'Q26':5}
 
-# Natasha Holmes compiled an excel file of students that opted out of research...we need to remove those students from our dataset
-Consent_df = pd.read_excel('C:/Users/Cole/Documents/DATA/MasterList.xlsx')
-Consent_df['FullName'] = (Consent_df['First Name:'] + Consent_df['Last Name:']).str.lower().str.replace(' ', '')
-Consent_df['Course'] = Consent_df['Course'].str.split(' ').str.get(1).apply(lambda x: 'P' + x[:-1]) # some courses were logged as Phys xxxx, others just as xxxx
+# ID columns (under both sets of column names), and the smallest set of columns needed to filter, match, and score surveys in either layout
+ID_DTYPES = {'QA':'str', 'QB':'str', 'QC':'str', 'QD':'str', 'Q49':'str', 'Q51':'str', 'Q53':'str', 'Q61':'str'}
+MBT_COLUMNS = ['V1', 'V3', 'V4', 'ResponseId', 'Duration (in seconds)', 'Q47'] + list(ID_DTYPES) + list(Correct_Answers)
 
-
-def Clean_MBT(File, time_cutoff):
+@Profiled()
+def Clean_MBT(File, time_cutoff, chunksize = CHUNKSIZE, columns = None):
     """Filter and score CSEM file
 
     Keyword arguments:
     File -- file path for raw MBT csv file
     time_cutoff -- time to completion used to filter out responses in seconds
+    chunksize -- number of responses to read, filter, and score at a time, passed to Stream_CSV; if None, the whole file is read at once
+    columns -- columns to read, passed to Stream_CSV; if None, all columns are read. MBT_COLUMNS has everything needed to match and score surveys
     """
 
-    df = pd.read_csv(File, skiprows = [1])
-    if (df.dtypes['Q1'] != 'float64'):
-        df = pd.read_csv(File, skiprows = [1, 2]) # some files have two header rows and different column names
-        df = df.rename(columns = {'ResponseId':'V1', 'Duration (in seconds)':'Duration'})
-    else:
-        df[['V3', 'V4']] = df[['V3', 'V4']].apply(pd.to_datetime) # V3 and V4 are the start and end timetsamps, respectively
-        df['Duration'] = (df['V4'] - df['V3']).dt.seconds
-    if time_cutoff is not None:
-        df = df.loc[df['Duration'] >= time_cutoff, :] # filter out surveys that took less than a certain time
-
-    if('Q47' in df.columns): # some of the courses used different column names and had an extra column distinguishing between courses
-        df['Course'] = df['Q47'].map({2:'P1112', 3:'P1116'})
-        df = df.rename(columns = {'Q49':'QA', 'Q51':'QB', 'Q53':'QC', 'Q61':'QD'})
-    else:
-        df['Course'] = 'P1112'
-
-    df[['QA', 'QB', 'QC', 'QD']] = df[['QA', 'QB', 'QC', 'QD']].apply(lambda x: x.astype(str).str.lower()) # ID columns
-    df = df.drop_duplicates(subset = ['QA', 'QB']).drop_duplicates(subset = ['QC']).drop_duplicates(subset = ['QD'])
-
-    df['FullName'] = (df['QA'] + df['QB']).str.lower().str.replace(' ', '')
-    df = pd.merge(df, Consent_df[['Course', 'FullName']], on = ['Course', 'FullName'], how = 'left', indicator = 'OptOut?')
-    df = df.loc[df['OptOut?'] == 'left_only', :].drop(columns = ['OptOut?', 'FullName'])
-
-    for question, answer in Correct_Answers.items():
-        df[question + '_Score'] = 1 * (df[question] == answer)
-    df['Total_Score'] = df.loc[:, [col for col in df.columns if 'Score' in col]].sum(axis = 1)
+    two_headers = Header_Rows(File) == 2 # some files have two header rows and different column names; a peek at the first rows tells us which
+
+    def Process_Chunk(df):
+        if two_headers:
+            df = df.rename(columns = {'ResponseId':'V1', 'Duration (in seconds)':'Duration'})
+        else:
+            df[['V3', 'V4']] = df[['V3', 'V4']].apply(pd.to_datetime) # V3 and V4 are the start and end timetsamps, respectively
+            df['Duration'] = (df['V4'] - df['V3']).dt.seconds
+        if time_cutoff is not None:
+            with Stage('MBT time cutoff', rows_in = df) as stage:
+                df = df.loc[df['Duration'] >= time_cutoff, :].copy() # filter out surveys that took less than a certain time
+                stage.Rows_Out(df)
+
+        if('Q47' in df.columns): # some of the courses used different column names and had an extra column distinguishing between courses
+            df['Course'] = df['Q47'].map({2:'P1112', 3:'P1116'})
+            df = df.rename(columns = {'Q49':'QA', 'Q51':'QB', 'Q53':'QC', 'Q61':'QD'})
+        else:
+            df['Course'] = 'P1112'
+
+        df[['QA', 'QB', 'QC', 'QD']] = df[['QA', 'QB', 'QC', 'QD']].apply(lambda x: x.astype(str).str.lower()) # ID columns
+
+        item_scores, total_scores = Score_Responses(Response_Matrix(df, Correct_Answers.keys()), list(Correct_Answers.values()))
+        df = pd.concat([df, pd.DataFrame(item_scores, columns = [question + '_Score' for question in Correct_Answers], index = df.index)], axis = 1)
+        df['Total_Score'] = total_scores
+        return df
+
+    # IDs are read as text so they look the same in every chunk
+    df = Stream_CSV(File, Process_Chunk, skiprows = [1, 2] if two_headers else [1], columns = columns, dtype = ID_DTYPES, chunksize = chunksize)
+
+    # duplicates and opt outs can only be found once all chunks are in
+    with Stage('MBT duplicates', rows_in = df) as stage:
+        df = df.drop_duplicates(subset = ['QA', 'QB']).drop_duplicates(subset = ['QC']).drop_duplicates(subset = ['QD'])
+        stage.Rows_Out(df)
+
+    with Stage('MBT opt outs', rows_in = df) as stage:
+        df['FullName'] = (df['QA'] + df['QB']).str.lower().str.replace(' ', '')
+        df = df.loc[~Get_Consent_Index().Opted_Out_Name(df['Course'], df['FullName']), :].drop(columns = ['FullName']) # remove students who opted out of research
+        stage.Rows_Out(df)
 
     return df
 
-def Match_MBT(pre_file, post_file, Semester, Year, raw = True, time_cutoff = None):
+@Profiled()
+def Match_MBT(pre_file, post_file, Semester, Year, raw = True, time_cutoff = None, return_stats = False, chunksize = CHUNKSIZE, fuzzy = False,
+              all_columns = True):
     """Outer join pre and posttest MBT files together
 
     Keyword arguments:
@@ -60,30 +83,23 @@ def Match_MBT(pre_file, post_file, Semester, Year, raw = True, time_cutoff = Non
     Year -- year that the survey was administered
     raw -- binary, whether the input files are raw or have been previously scored
     time_cutoff -- time cutoff to use when filtering surveys, passed to Clean_CSEM
+    return_stats -- whether to also return a dictionary with the number of students matched on each key
+    chunksize -- number of responses to read at a time, passed to Clean_MBT
+    fuzzy -- whether to also match leftover students in the same course on names or NetIDs that are close but not equal, e.g., with a typo; the
+             similarity of each of these matches is kept in Fuzzy_Score
+    all_columns -- whether to read every column of the raw files; if False, only the columns needed to filter, match, and score surveys
+                   (MBT_COLUMNS) are read, which is faster and uses less memory, but leaves the other survey questions out of the output
     """
 
     if raw:
-        df_pre = Clean_MBT(pre_file, time_cutoff = time_cutoff)
-        df_post = Clean_MBT(post_file, time_cutoff = time_cutoff)
+        columns = None if all_columns else MBT_COLUMNS
+        df_pre = Clean_MBT(pre_file, time_cutoff = time_cutoff, chunksize = chunksize, columns = columns)
+        df_post = Clean_MBT(post_file, time_cutoff = time_cutoff, chunksize = chunksize, columns = columns)
 
-    # merge separately on full name, netID, and ID to capture as many students as possible that took both pre and posttests
-    df_name = pd.merge(df_pre, df_post, how = 'inner', on = ['QA', 'QB'])
-    df_netID = pd.merge(df_pre, df_post, how = 'inner', on = 'QC')
-    df_studentID = pd.merge(df_pre, df_post, how = 'inner', on = 'QD')
-
-    # we make sure students aren't double counted
-    df_in = pd.concat([df_name, df_netID, df_studentID], axis = 0, join = 'outer').reset_index(drop = True).drop_duplicates(subset = ['V1_x']).drop_duplicates(subset = ['V1_y'])
-
-    # and put back students who only took one of the pre or posttest in our dataset
-    Pre_Cols = [col if col in df_in.columns else col + '_x' for col in df_pre.columns]
-    Out_Pre = df_pre.loc[~df_pre['V1'].isin(df_in['V1_x'])]
-    Out_Pre.columns = Pre_Cols
-
-    Post_Cols = [col if col in df_in.columns else col + '_y' for col in df_post.columns]
-    Out_Post = df_post.loc[~df_post['V1'].isin(df_in['V1_y'])]
-    Out_Post.columns = Post_Cols
-
-    df = pd.concat([df_in, Out_Pre, Out_Post], axis = 0, join = 'outer').reset_index(drop = True)
+    # match on full name, netID, and ID (in that order) to capture as many students as possible that took both pre and posttests, making sure
+    # students aren't double counted, and put back students who only took one of the pre or posttest in our dataset
+    keys = [('name', ['QA', 'QB'], ['QA', 'QB']), ('netID', ['QC'], ['QC']), ('studentID', ['QD'], ['QD'])]
+    df, match_stats = Merge_Pre_Post(df_pre, df_post, keys, fuzzy_keys = keys[:2] if fuzzy else None, block_cols = ['Course'])
 
     df['QC'] = df['QC'].fillna(df['QC_y']).fillna(df['QC_x'])
     df['QD'] = df['QD'].fillna(df['QD_y']).fillna(df['QD_x'])
@@ -93,23 +109,43 @@ def Match_MBT(pre_file, post_file, Semester, Year, raw = True, time_cutoff = Non
     df['Semester'] = Semester
     df['Year'] = Year
 
+    if return_stats:
+        return df, match_stats
     return df
 
-def BuildMasterMBTDataset(dir, time_cutoff = None):
+@Profiled()
+def BuildMasterMBTDataset(dir, time_cutoff = None, n_workers = 1, incremental = False, out_format = 'csv', chunksize = CHUNKSIZE, store = None,
+                          fuzzy = False, all_columns = True):
     """Construct master MBT dataset of matched and unmatched surveys
 
     Keyword arguments:
     dir -- directory where MBT raw files are stored
     time_cutoff -- time cutoff to use when filtering surveys, passed to Clean_CSEM
+    n_workers -- number of processes to match terms in, passed to Map_Terms
+    incremental -- whether to only rematch terms whose raw files changed since the last build, reusing cached output for the rest
+    out_format -- one of csv, parquet, or feather; parquet and feather output is a directory partitioned by Course, Year, and Semester
+    chunksize -- number of responses to read at a time, passed to Clean_MBT
+    store -- file path to a SQLite store to also write the master dataset to, as table MBT_Master
+    fuzzy -- whether to also match students on identifiers that are close but not equal, passed to Match_MBT
+    all_columns -- whether to read every column of the raw files, passed to Match_MBT
     """
 
-    os.chdir(dir)
-    pre_files = glob('RAW/**/*Pre*csv', recursive = True)
-    post_files = glob('RAW/**/*Post*csv', recursive = True)
-
-    # semester and year is in the filename, we'll just concatenate those together
-    matched_dfs = [Match_MBT(pre_f, post_files[i], pre_f.split('_')[4][:2].upper(), pre_f.split('_')[-1].split('.')[0], time_cutoff = time_cutoff) for i, pre_f in enumerate(pre_files)]
+    pre_files = sorted(glob(os.path.join(dir, 'RAW', '**', '*Pre*csv'), recursive = True))
+    post_files = sorted(glob(os.path.join(dir, 'RAW', '**', '*Post*csv'), recursive = True))
+
+    # semester and year is in the filename (relative to dir), we'll just concatenate those together
+    term_args = []
+    for i, pre_f in enumerate(pre_files):
+        rel_f = os.path.relpath(pre_f, dir)
+        term_args.append((pre_f, post_files[i], rel_f.split('_')[4][:2].upper(), rel_f.split('_')[-1].split('.')[0]))
+    if incremental:
+        matched_dfs = Build_Terms(Match_MBT, term_args, os.path.join(dir, '.build_cache'), n_workers = n_workers, time_cutoff = time_cutoff,
+                                  chunksize = chunksize, fuzzy = fuzzy, all_columns = all_columns)
+    else:
+        matched_dfs = Map_Terms(Match_MBT, term_args, n_workers = n_workers, time_cutoff = time_cutoff, chunksize = chunksize, fuzzy = fuzzy,
+                                all_columns = all_columns)
     df = pd.concat(matched_dfs, axis = 0)
 
-    df.to_csv('MBT_Master.csv', index = False)
+    outfile = os.path.join(dir, 'MBT_Master.csv' if out_format == 'csv' else 'MBT_Master')
+    Write_Master(df, outfile, out_format = out_format, partition_cols = ['Course', 'Year', 'Semester'], store = store, table = 'MBT_Master')
     return df
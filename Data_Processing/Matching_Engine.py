@@ -0,0 +1,203 @@
+import numpy as np
+import pandas as pd
+
+def Key_Codes(df_pre, df_post, pre_cols, post_cols):
+    """Factorize pre and post identifier columns together into integer codes, so rows with equal keys get equal codes
+
+    Keyword arguments:
+    df_pre -- dataframe of pretest responses
+    df_post -- dataframe of posttest responses
+    pre_cols -- list of identifier columns in df_pre
+    post_cols -- list of identifier columns in df_post, in the same order as pre_cols
+
+    Missing values get a code of their own, so they match each other the same way they do in pd.merge.
+    """
+
+    codes = np.zeros(len(df_pre) + len(df_post), dtype = np.int64)
+    for pre_col, post_col in zip(pre_cols, post_cols):
+        col_codes, uniques = pd.factorize(pd.concat([df_pre[pre_col], df_post[post_col]], ignore_index = True), use_na_sentinel = False)
+        codes, _ = pd.factorize(codes * len(uniques) + col_codes) # refactorizing keeps codes below the number of rows, so they can't overflow
+    return codes[:len(df_pre)], codes[len(df_pre):]
+
+def Lookup_Codes(pre_codes, post_codes):
+    """Find the first posttest row with the same code as each pretest row, or -1 if there isn't one
+
+    Keyword arguments:
+    pre_codes -- integer key codes of pretest rows, from Key_Codes
+    post_codes -- integer key codes of posttest rows, from Key_Codes
+    """
+
+    uniques, first = np.unique(post_codes, return_index = True) # sorted codes act as the hash index on the posttest keys
+    if len(uniques) == 0:
+        return np.full(len(pre_codes), -1)
+    pos = np.searchsorted(uniques, pre_codes).clip(max = len(uniques) - 1)
+    return np.where(uniques[pos] == pre_codes, first[pos], -1)
+
+def Join_Codes(left_codes, right_codes):
+    """Find every pair of left and right rows with the same code, like an inner pd.merge
+
+    Keyword arguments:
+    left_codes -- integer key codes of left rows, from Key_Codes
+    right_codes -- integer key codes of right rows, from Key_Codes
+
+    Returns positions of left rows and of their matching right rows, ordered by left row and then by right row. pd.merge gives the same pairs, and
+    the same order when no two right rows share a code.
+    """
+
+    order = np.argsort(right_codes, kind = 'stable')
+    sorted_codes = right_codes[order]
+    start = np.searchsorted(sorted_codes, left_codes, side = 'left')
+    counts = np.searchsorted(sorted_codes, left_codes, side = 'right') - start
+
+    # each left row is repeated once per matching right row, and walks through its run of equal codes in the sorted right rows
+    left_idx = np.repeat(np.arange(len(left_codes)), counts)
+    offsets = np.arange(len(left_idx)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return left_idx, order[np.repeat(start, counts) + offsets]
+
+def Anti_Join(left_codes, right_codes):
+    """Mask of left rows whose code doesn't appear among the right rows
+
+    Keyword arguments:
+    left_codes -- integer key codes of left rows, from Key_Codes
+    right_codes -- integer key codes of right rows, from Key_Codes
+
+    Key_Codes keeps codes below the number of rows, so membership is looked up in a table indexed by code, in linear time.
+    """
+
+    return ~np.isin(left_codes, right_codes, kind = 'table')
+
+def Join_Keys(df_left, df_right, keys):
+    """Inner join two dataframes on several identifier keys, where a right row matched on more than one key (or to more than one left row) keeps
+    its last match
+
+    Keyword arguments:
+    df_left -- dataframe of left rows, e.g., an assessment master file
+    df_right -- dataframe of right rows, e.g., the processed registrar data
+    keys -- list of (left_cols, right_cols) tuples in increasing order of priority
+
+    Returns positions of matched left rows and of their right rows. This is the same as merging on each key separately, concatenating the merges in
+    order, and dropping duplicate right rows with keep = 'last', and rows come out in that order; where several left rows match a right row on the
+    same key, the last left row keeps it.
+    """
+
+    left_idx, right_idx = [], []
+    for left_cols, right_cols in keys:
+        left_codes, right_codes = Key_Codes(df_left, df_right, left_cols, right_cols)
+        key_left, key_right = Join_Codes(left_codes, right_codes)
+        left_idx.append(key_left)
+        right_idx.append(key_right)
+    left_idx, right_idx = np.concatenate(left_idx), np.concatenate(right_idx)
+
+    # the last match of each right row is the first one in the reversed pairs
+    _, last = np.unique(right_idx[::-1], return_index = True)
+    keep = np.sort(len(right_idx) - 1 - last)
+    return left_idx[keep], right_idx[keep]
+
+def Match_Keys(df_pre, df_post, keys, unique_post = True):
+    """Resolve each pretest response to at most one posttest response, trying identifier keys in order of priority
+
+    Keyword arguments:
+    df_pre -- dataframe of pretest responses
+    df_post -- dataframe of posttest responses
+    keys -- list of (name, pre_cols, post_cols) tuples in order of priority, e.g., full name, then NetID, then student ID
+    unique_post -- whether each posttest response can only be matched to one pretest response
+
+    Returns positions of matched pretest rows, positions of their posttest rows, the index of the key each match was made on, and a dictionary of
+    match statistics. Matches are ordered by key and then by pretest row, which is the order the old concatenated merges had.
+    """
+
+    best_post = np.full(len(df_pre), -1)
+    best_key = np.full(len(df_pre), -1)
+    stats = {'pre':len(df_pre), 'post':len(df_post)}
+    for k, (name, pre_cols, post_cols) in enumerate(keys):
+        pre_codes, post_codes = Key_Codes(df_pre, df_post, pre_cols, post_cols)
+        match = Lookup_Codes(pre_codes, post_codes)
+        stats['candidates_' + name] = int((match >= 0).sum()) # students that could be matched on this key
+        use = (best_post < 0) & (match >= 0) # only use this key for students that weren't already matched on a higher priority key
+        best_post[use] = match[use]
+        best_key[use] = k
+
+    pre_idx = np.flatnonzero(best_post >= 0)
+    pre_idx = pre_idx[np.argsort(best_key[pre_idx], kind = 'stable')]
+    post_idx = best_post[pre_idx]
+    key_idx = best_key[pre_idx]
+
+    if unique_post: # if two pretest responses landed on the same posttest response, the first one (by key priority) keeps it
+        _, first = np.unique(post_idx, return_index = True)
+        keep = np.sort(first)
+        pre_idx, post_idx, key_idx = pre_idx[keep], post_idx[keep], key_idx[keep]
+
+    for k, (name, _, _) in enumerate(keys):
+        stats['matched_' + name] = int((key_idx == k).sum())
+    stats['unmatched_pre'] = len(df_pre) - len(pre_idx)
+    stats['unmatched_post'] = len(df_post) - len(np.unique(post_idx))
+    return pre_idx, post_idx, key_idx, stats
+
+def Gather_Pairs(df_pre, df_post, pre_idx, post_idx, pre_cols, post_cols):
+    """Put matched pretest and posttest rows side by side with the same column layout as pd.merge
+
+    Keyword arguments:
+    df_pre -- dataframe of pretest responses
+    df_post -- dataframe of posttest responses
+    pre_idx -- positions of matched pretest rows
+    post_idx -- positions of the matching posttest rows
+    pre_cols -- identifier columns in df_pre the rows were matched on
+    post_cols -- identifier columns in df_post the rows were matched on
+    """
+
+    on = list(pre_cols) if list(pre_cols) == list(post_cols) else [] # keys with the same name on both sides are kept once, without a suffix
+    overlap = [col for col in df_pre.columns if (col in df_post.columns) and (col not in on)]
+    left = df_pre.take(pre_idx).reset_index(drop = True).rename(columns = {col:col + '_x' for col in overlap})
+    right = df_post.take(post_idx).reset_index(drop = True).drop(columns = on).rename(columns = {col:col + '_y' for col in overlap})
+    return pd.concat([left, right], axis = 1)
+
+def Merge_Pre_Post(df_pre, df_post, keys, unique_post = True, fuzzy_keys = None, block_cols = []):
+    """Outer join pretest and posttest responses, matching students on several identifier keys in order of priority
+
+    Keyword arguments:
+    df_pre -- dataframe of pretest responses
+    df_post -- dataframe of posttest responses
+    keys -- list of (name, pre_cols, post_cols) tuples in order of priority
+    unique_post -- whether each posttest response can only be matched to one pretest response
+    fuzzy_keys -- list of (name, pre_cols, post_cols) tuples to match students left over after the exact keys on identifiers that are close but not
+                  equal (see Fuzzy_Matching); if None, only exact matches are made
+    block_cols -- columns that fuzzy matches have to agree on exactly, e.g., Course
+
+    Only the matched rows are gathered, so this gives the same result as merging on each key separately, concatenating, and dropping duplicates,
+    without copying every column for every candidate match. Returns the merged dataframe and a dictionary of match statistics. With fuzzy_keys, the
+    merged dataframe has a Fuzzy_Score column with the similarity of each fuzzy match (missing for exact matches) so they can be checked by hand.
+    """
+
+    pre_idx, post_idx, key_idx, stats = Match_Keys(df_pre, df_post, keys, unique_post = unique_post)
+
+    # one block per key, even if it's empty, so the columns come out the same as they did with one merge per key
+    blocks = [Gather_Pairs(df_pre, df_post, pre_idx[key_idx == k], post_idx[key_idx == k], pre_cols, post_cols)
+              for k, (_, pre_cols, post_cols) in enumerate(keys)]
+
+    if fuzzy_keys is not None:
+        from Fuzzy_Matching import Fuzzy_Match
+
+        pre_left = np.setdiff1d(np.arange(len(df_pre)), pre_idx)
+        post_left = np.setdiff1d(np.arange(len(df_post)), post_idx)
+        fuzzy_pre, fuzzy_post, fuzzy_key, score = Fuzzy_Match(df_pre.iloc[pre_left], df_post.iloc[post_left], fuzzy_keys, block_cols = block_cols)
+        fuzzy_pre, fuzzy_post = pre_left[fuzzy_pre], post_left[fuzzy_post]
+        # fuzzy matches don't agree on their identifiers, so both sides keep theirs (with _x and _y suffixes)
+        for k, (name, _, _) in enumerate(fuzzy_keys):
+            blocks.append(Gather_Pairs(df_pre, df_post, fuzzy_pre[fuzzy_key == k], fuzzy_post[fuzzy_key == k], [], []).assign(Fuzzy_Score = score[fuzzy_key == k]))
+            stats['matched_fuzzy_' + name] = int((fuzzy_key == k).sum())
+        pre_idx = np.concatenate([pre_idx, fuzzy_pre])
+        post_idx = np.concatenate([post_idx, fuzzy_post])
+        stats['unmatched_pre'] = len(df_pre) - len(pre_idx)
+        stats['unmatched_post'] = len(df_post) - len(np.unique(post_idx))
+
+    df_in = pd.concat(blocks, axis = 0, join = 'outer')
+
+    # and put back students who only took one of the pre or posttest in our dataset
+    Out_Pre = df_pre.iloc[np.setdiff1d(np.arange(len(df_pre)), pre_idx)]
+    Out_Pre.columns = [col if col in df_in.columns else col + '_x' for col in df_pre.columns]
+
+    Out_Post = df_post.iloc[np.setdiff1d(np.arange(len(df_post)), post_idx)]
+    Out_Post.columns = [col if col in df_in.columns else col + '_y' for col in df_post.columns]
+
+    df = pd.concat([df_in, Out_Pre, Out_Post], axis = 0, join = 'outer').reset_index(drop = True)
+    return df, stats
@@ -0,0 +1,30 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import Consent_Registry
+
+def _Init_Worker(config):
+    Consent_Registry.Configure(**config) # worker processes may not inherit paths that were set with Configure
+
+def _Call(job):
+    func, args, kwargs = job
+    return func(*args, **kwargs)
+
+def Map_Terms(func, term_args, n_workers = 1, **kwargs):
+    """Apply a function to the files of each term, optionally in parallel, returning results in the same order as term_args
+
+    Keyword arguments:
+    func -- module level function to apply (e.g., MergePrePost, Match_CSEM, or Match_MBT)
+    term_args -- list of tuples of positional arguments, one tuple per term
+    n_workers -- number of worker processes; 1 runs everything in this process, None uses all cores
+    kwargs -- keyword arguments passed to every call of func
+    """
+
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    n_workers = min(n_workers, len(term_args))
+    if n_workers <= 1:
+        return [func(*args, **kwargs) for args in term_args]
+
+    # executor.map yields results in submission order, so the output doesn't depend on which worker finishes first
+    with ProcessPoolExecutor(max_workers = n_workers, initializer = _Init_Worker, initargs = (Consent_Registry.Get_Config(),)) as executor:
+        return list(executor.map(_Call, [(func, args, kwargs) for args in term_args]))
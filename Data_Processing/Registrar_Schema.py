@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+# columns with a known, fixed set of values. Storing them as categoricals keeps one small integer code per student instead of a python string, and
+# merges and isin checks on them compare codes
+CLASS_STANDING = pd.CategoricalDtype(['Fresh', 'Sophomore', 'Junior', 'Senior'])
+URM_STATUS = pd.CategoricalDtype(['Majority', 'URM'])
+FIRST_GEN_STATUS = pd.CategoricalDtype(['ContGen', 'FirstGen'])
+SEMESTER = pd.CategoricalDtype(['FA', 'SP', 'SU'])
+SEQUENCE = pd.CategoricalDtype(['Engineering', 'Honours'])
+COURSE_CONTENT = pd.CategoricalDtype(['EM', 'Mechanics'])
+INSTRUCTION = pd.CategoricalDtype(['New', 'Old'])
+AP_SCORE = pd.CategoricalDtype(['NotTaken', 'Poor', 'Well'])
+
+# columns whose values depend on the registrar extract (terms, courses, majors...) are categoricals with categories taken from the data
+DATA_CATEGORICAL_COLUMNS = ['Term', 'Course', 'Class_Standing', 'Major', 'Gender', 'URM_Status', 'First_Gen_Status']
+
+# percentiles fit in one byte; the nullable type keeps missing scores missing
+PERCENTILE = 'UInt8'
+
+def Apply_Ingest_Schema(df_registrar):
+    """Convert the low-cardinality columns of a freshly loaded (and renamed) registrar file to categoricals
+
+    Keyword arguments:
+    df_registrar -- registrar dataframe with columns renamed as in Registrar_Processing
+    """
+
+    df_registrar[DATA_CATEGORICAL_COLUMNS] = df_registrar[DATA_CATEGORICAL_COLUMNS].astype('category')
+    df_registrar['Course'] = df_registrar['Course'].cat.rename_categories(str) # catalog numbers are read as ints, but we use them as labels
+    return df_registrar
+
+def Map_Categories(series, mapper, dtype):
+    """Map the values of a categorical series (only its categories are mapped, not every row) and store the result as a categorical
+
+    Keyword arguments:
+    series -- categorical series to map
+    mapper -- dictionary or function applied to each category
+    dtype -- dtype of the result, e.g., one of the CategoricalDtypes above or 'category'
+    """
+
+    return series.map(mapper, na_action = 'ignore').astype(dtype)
+
+def Composite_Codes(df, cols):
+    """Integer code for each unique combination of values in several columns, to use instead of string concatenated keys
+
+    Keyword arguments:
+    df -- dataframe with key columns
+    cols -- list of key columns
+    """
+
+    codes = np.zeros(len(df), dtype = np.int64)
+    for col in cols:
+        col_codes, uniques = pd.factorize(df[col], use_na_sentinel = False)
+        codes, _ = pd.factorize(codes * len(uniques) + col_codes) # refactorizing keeps codes below the number of rows, so they can't overflow
+    return codes
+
+def Composite_Label(df, cols, sep = '-'):
+    """Categorical label (e.g., 2017FA-1112) for each unique combination of values in several columns, only building one string per combination
+
+    Keyword arguments:
+    df -- dataframe with key columns
+    cols -- list of key columns
+    sep -- separator between values in the label
+    """
+
+    codes = Composite_Codes(df, cols)
+    _, first = np.unique(codes, return_index = True)
+    labels = df[cols].iloc[first].astype(str).agg(sep.join, axis = 1).to_numpy()
+    return pd.Series(pd.Categorical.from_codes(codes, categories = labels), index = df.index)
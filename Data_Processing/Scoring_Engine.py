@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+
+# E-CLASS items are Likert and range from 1 to 5, correctness is only assessed on collapsed agree (4 or 5) or disagree (1 or 2)
+LIKERT_COLLAPSE = {1:-1, 2:-1, 3:0, 4:1, 5:1}
+
+def Collapse_Table(rule):
+    """Convert a collapse rule into a dense lookup array indexed by response, with NaN for responses the rule doesn't cover
+
+    Keyword arguments:
+    rule -- dictionary mapping integer responses to collapsed values, e.g., LIKERT_COLLAPSE
+    """
+
+    table = np.full(max(rule) + 1, np.nan)
+    table[list(rule.keys())] = list(rule.values())
+    return table
+
+def Response_Matrix(df, items):
+    """Pull item responses out of a dataframe as a 2D float array, with anything that isn't a number treated as missing
+
+    Keyword arguments:
+    df -- dataframe of survey responses
+    items -- list of item columns, in the same order as the answer key
+    """
+
+    return df[list(items)].apply(pd.to_numeric, errors = 'coerce').to_numpy(dtype = float)
+
+def Score_Responses(responses, key, collapse = None, weights = None):
+    """Score a matrix of responses against an answer key in one vectorized pass
+
+    Keyword arguments:
+    responses -- 2D array of responses, one row per student and one column per item
+    key -- 1D array with the answer for each item
+    collapse -- collapse rule (dictionary or array from Collapse_Table); if given, responses are collapsed and multiplied by the key (e.g., E-CLASS
+                agreement scoring), otherwise items are scored 1 if the response equals the key and 0 otherwise (e.g., CSEM and MBT)
+    weights -- 1D array of weights for each item; if None, every item counts once
+
+    Returns per-item scores (same shape as responses) and total scores for each student. Missing responses are NaN per item when a collapse rule is
+    used, and count as incorrect otherwise; either way they add nothing to the total.
+    """
+
+    responses = np.asarray(responses, dtype = float)
+    key = np.asarray(key, dtype = float)
+
+    if collapse is None:
+        item_scores = (responses == key).astype(int if weights is None else float)
+    else:
+        table = Collapse_Table(collapse) if isinstance(collapse, dict) else np.asarray(collapse, dtype = float)
+        # responses outside the table (or not whole numbers) get NaN, the same as a missing response
+        valid = np.isfinite(responses) & (responses >= 0) & (responses < len(table)) & (responses == np.floor(responses))
+        codes = np.where(valid, responses, 0).astype(np.intp)
+        item_scores = np.where(valid, table[codes], np.nan) * key
+
+    if weights is not None:
+        item_scores = item_scores * np.asarray(weights, dtype = float)
+
+    totals = item_scores.sum(axis = 1) if item_scores.dtype.kind == 'i' else np.nansum(item_scores, axis = 1)
+    return item_scores, totals
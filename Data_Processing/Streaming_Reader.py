@@ -0,0 +1,67 @@
+import csv
+import pandas as pd
+
+# default number of rows per chunk; a chunk of a raw export with a hundred or so columns takes tens of megabytes
+CHUNKSIZE = 50000
+
+def Sniff_Rows(file, n_rows = 3):
+    """Read the first few records of a csv file without loading the rest of it
+
+    Keyword arguments:
+    file -- file path to csv file
+    n_rows -- number of records to read, including the header
+    """
+
+    rows = []
+    with open(file, newline = '', encoding = 'utf-8-sig') as f:
+        for row in csv.reader(f): # csv.reader handles quoted line breaks in Qualtrics' descriptive header rows
+            rows.append(row)
+            if len(rows) == n_rows:
+                break
+    return rows
+
+def Header_Rows(file, item_col = 'Q1'):
+    """Number of header rows (1 or 2) before the responses in a Qualtrics export, not counting the column names
+
+    Keyword arguments:
+    file -- file path to raw Qualtrics csv file
+    item_col -- a column that only ever holds numeric responses
+
+    Older exports have one row of question text after the column names, newer exports have a second row of import IDs like {"ImportId":"QID1"}.
+    """
+
+    rows = Sniff_Rows(file, n_rows = 3)
+    if (len(rows) < 3) or (item_col not in rows[0]):
+        return 1
+    value = rows[2][rows[0].index(item_col)].strip()
+    try:
+        float(value if value != '' else 'nan')
+        return 1
+    except ValueError:
+        return 2
+
+def Stream_CSV(file, process_chunk, skiprows = None, columns = None, dtype = None, chunksize = None):
+    """Read a csv file in chunks, filtering and scoring each chunk before the next one is read, and concatenate the results
+
+    Keyword arguments:
+    file -- file path to csv file
+    process_chunk -- function applied to each chunk (a dataframe) that returns the processed chunk
+    skiprows -- rows to skip, passed to pd.read_csv
+    columns -- columns to read; if None, all columns are read. Columns that aren't in the file are ignored
+    dtype -- dictionary of column dtypes, passed to pd.read_csv. Giving dtypes for ID columns keeps them consistent between chunks
+    chunksize -- number of rows per chunk; if None, the file is read in one go
+
+    Only the raw rows of one chunk are in memory at a time; the processed chunks are kept until they're concatenated, so memory use grows with the
+    number of responses that make it through the filters, times the number of columns read. Passing columns keeps that second part small.
+    """
+
+    usecols = None if columns is None else (lambda col, columns = set(columns): col in columns)
+    if dtype is not None:
+        header = Sniff_Rows(file, n_rows = 1)[0]
+        dtype = {col:col_type for col, col_type in dtype.items() if (col in header) and ((columns is None) or (col in columns))}
+
+    if chunksize is None:
+        return process_chunk(pd.read_csv(file, skiprows = skiprows, usecols = usecols, dtype = dtype))
+
+    with pd.read_csv(file, skiprows = skiprows, usecols = usecols, dtype = dtype, chunksize = chunksize) as reader:
+        return pd.concat([process_chunk(chunk) for chunk in reader], axis = 0)
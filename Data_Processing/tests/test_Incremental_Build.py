@@ -0,0 +1,61 @@
+import os
+import sys
+import pandas as pd
+
+# the processing scripts live one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Incremental_Build
+from Incremental_Build import Build_Terms
+
+CALLS = []
+
+def Match_Term(file, Semester):
+    """Stand-in for Match_CSEM that records which terms it was called on"""
+
+    CALLS.append(file)
+    return pd.DataFrame({'File':[os.path.basename(file)], 'Semester':[Semester]})
+
+def Write_Terms(dir):
+    files = []
+    for term in ['FA', 'SP', 'SU']:
+        files.append(os.path.join(dir, term + '.csv'))
+        with open(files[-1], 'w') as f:
+            f.write('V1\n' + term + '\n')
+    return [(file, os.path.basename(file)[:2]) for file in files]
+
+def test_unchanged_terms_are_reused(tmp_path):
+    term_args = Write_Terms(str(tmp_path))
+    cache_dir = str(tmp_path / '.build_cache')
+    CALLS.clear()
+    first = Build_Terms(Match_Term, term_args, cache_dir)
+    assert len(CALLS) == 3
+
+    CALLS.clear()
+    second = Build_Terms(Match_Term, term_args, cache_dir)
+    assert CALLS == []
+    for df_first, df_second in zip(first, second):
+        pd.testing.assert_frame_equal(df_first, df_second)
+
+def test_version_bump_recomputes_every_term(tmp_path, monkeypatch):
+    term_args = Write_Terms(str(tmp_path))
+    cache_dir = str(tmp_path / '.build_cache')
+    Build_Terms(Match_Term, term_args, cache_dir)
+
+    monkeypatch.setattr(Incremental_Build, 'BUILD_CACHE_VERSION', Incremental_Build.BUILD_CACHE_VERSION + 1)
+    CALLS.clear()
+    Build_Terms(Match_Term, term_args, cache_dir)
+    assert sorted(CALLS) == sorted(file for file, _ in term_args)
+
+    # and the old partitions are cleaned up rather than left next to the new ones
+    assert len([file for file in os.listdir(cache_dir) if file.endswith('.pkl')]) == 3
+
+def test_code_change_recomputes_every_term(tmp_path, monkeypatch):
+    term_args = Write_Terms(str(tmp_path))
+    cache_dir = str(tmp_path / '.build_cache')
+    Build_Terms(Match_Term, term_args, cache_dir)
+
+    monkeypatch.setattr(Incremental_Build, 'Code_Fingerprint', lambda func: 'edited')
+    CALLS.clear()
+    Build_Terms(Match_Term, term_args, cache_dir)
+    assert len(CALLS) == 3
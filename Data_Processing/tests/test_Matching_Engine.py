@@ -0,0 +1,135 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# the processing scripts live one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Matching_Engine import Key_Codes, Anti_Join, Merge_Pre_Post
+from Consent_Registry import Consent_Index
+
+CSEM_KEYS = [('name', ['Name', 'Q38'], ['Name', 'Q38']), ('netID', ['NetID'], ['NetID']), ('studentID', ['Q39'], ['Q39'])]
+ECLASS_KEYS = [('name', ['Q3_1_TEXT', 'Q3_2_TEXT'], ['Q3_1_TEXT', 'Q3_2_TEXT']),
+               ('backwardsName', ['Q3_1_TEXT', 'Q3_2_TEXT'], ['Q3_2_TEXT', 'Q3_1_TEXT']), ('ID', ['Q3_3_TEXT'], ['Q3_3_TEXT'])]
+
+def Legacy_Match_CSEM(df_pre, df_post):
+    """The merges Match_CSEM made before Matching_Engine, as they were"""
+
+    # merge separately on full name, netID, and ID to capture as many students as possible that took both pre and posttests
+    df_name = pd.merge(df_pre, df_post, how = 'inner', on = ['Name', 'Q38'])
+    df_netID = pd.merge(df_pre, df_post, how = 'inner', on = 'NetID')
+    df_studentID = pd.merge(df_pre, df_post, how = 'inner', on = 'Q39')
+
+    # we make sure students aren't double counted
+    df_in = pd.concat([df_name, df_netID, df_studentID], axis = 0, join = 'outer').reset_index(drop = True).drop_duplicates(subset = ['V1_x']).drop_duplicates(subset = ['V1_y'])
+
+    # and put back students who only took one of the pre or posttest in our dataset
+    Pre_Cols = [col if col in df_in.columns else col + '_x' for col in df_pre.columns]
+    Out_Pre = df_pre.loc[~df_pre['V1'].isin(df_in['V1_x'])]
+    Out_Pre.columns = Pre_Cols
+
+    Post_Cols = [col if col in df_in.columns else col + '_y' for col in df_post.columns]
+    Out_Post = df_post.loc[~df_post['V1'].isin(df_in['V1_y'])]
+    Out_Post.columns = Post_Cols
+
+    return pd.concat([df_in, Out_Pre, Out_Post], axis = 0, join = 'outer').reset_index(drop = True)
+
+def Legacy_Merge_ECLASS(Predf, Postdf):
+    """The merges MergePrePost made before Matching_Engine, as they were"""
+
+    # merge separately on full name, backwards name, and ID to capture as many students as possible that took both pre and posttests
+    Full_df = pd.merge(left = Predf, right = Postdf, how = 'inner', on = ['Q3_1_TEXT', 'Q3_2_TEXT'])
+    Back_df = pd.merge(left = Predf, right = Postdf, how = 'inner', left_on = ['Q3_1_TEXT', 'Q3_2_TEXT'], right_on = ['Q3_2_TEXT', 'Q3_1_TEXT'])
+    ID_df = pd.merge(left = Predf, right = Postdf, how = 'inner', on = 'Q3_3_TEXT').rename(columns = {'Q3_3_TEXT':'Q3_3_TEXT_y'})
+
+    # we make sure students aren't double counted
+    Merged_df = pd.concat([Full_df, Back_df, ID_df], axis = 0, join = 'outer').drop_duplicates(subset = ['V1_x'])
+
+    # and put back students who only took one of the pre or posttest in our dataset
+    Pre_Cols = [col if col in Merged_df.columns else col + '_x' for col in Predf.columns]
+    Out_Pre = Predf.loc[~Predf['V1'].isin(Merged_df['V1_x'])]
+    Out_Pre.columns = Pre_Cols
+
+    Post_Cols = [col if col in Merged_df.columns else col + '_y' for col in Postdf.columns]
+    Out_Post = Postdf.loc[~Postdf['V1'].isin(Merged_df['V1_y'])]
+    Out_Post.columns = Post_Cols
+
+    Merged_df = pd.concat([Merged_df, Out_Pre, Out_Post]).reset_index(drop = True)
+    Merged_df['Q3_3_TEXT'] = Merged_df['Q3_3_TEXT_y'].fillna(Merged_df['Q3_3_TEXT_x'])
+    return Merged_df.drop(columns = ['Q3_1_TEXT_x', 'Q3_1_TEXT_y', 'Q3_2_TEXT_x', 'Q3_2_TEXT_y', 'Q3_3_TEXT_x', 'Q3_3_TEXT_y'])
+
+def Merge_ECLASS(Predf, Postdf):
+    """The merge MergePrePost makes now, with its clean-up of the ID columns"""
+
+    Merged_df, _ = Merge_Pre_Post(Predf, Postdf, ECLASS_KEYS, unique_post = False)
+    Merged_df['Q3_3_TEXT'] = Merged_df.pop('Q3_3_TEXT').fillna(Merged_df['Q3_3_TEXT_y']).fillna(Merged_df['Q3_3_TEXT_x'])
+    return Merged_df.drop(columns = ['Q3_1_TEXT_x', 'Q3_1_TEXT_y', 'Q3_2_TEXT_x', 'Q3_2_TEXT_y', 'Q3_3_TEXT_x', 'Q3_3_TEXT_y'])
+
+def CSEM_Responses():
+    df_pre = pd.DataFrame({'V1':['a1', 'a2', 'a3', 'a4', 'a5', 'a6', 'a7'],
+                           'Name':['smith', 'jones', 'lee', 'kim', 'park', 'wu', 'diaz'],
+                           'Q38':['alice', 'bob', 'carol', 'dan', 'erin', 'fay', 'gus'],
+                           'NetID':['as1', 'bj2', np.nan, 'dk4', 'ep5', 'fw6', 'gd7'],
+                           'Q39':['101', '102', '103', '104', '104', np.nan, '107'],
+                           'Total_Score':[10, 11, 12, 13, 14, 15, 16]})
+    df_post = pd.DataFrame({'V1':['b1', 'b2', 'b3', 'b4', 'b5', 'b6', 'b7', 'b8'],
+                            'Name':['smith', 'jonse', 'leigh', 'kym', 'smith', 'wo', 'ng', 'parker'],
+                            'Q38':['alice', 'bob', 'carol', 'dan', 'alice', 'fay', 'hal', 'erin'],
+                            'NetID':['as1', 'bj2', np.nan, 'dk9', 'as9', 'fw0', 'hn8', 'ep0'],
+                            'Q39':['101', '902', '903', '104', '905', np.nan, '108', '908'],
+                            'Total_Score':[20, 21, 22, 23, 24, 25, 26, 27]})
+    return df_pre, df_post
+
+def ECLASS_Responses():
+    df_pre = pd.DataFrame({'V1':['a1', 'a2', 'a3', 'a4', 'a5', 'a6'],
+                           'Q3_1_TEXT':['alice', 'bob', 'carol', 'dan', 'erin', np.nan],
+                           'Q3_2_TEXT':['smith', 'jones', 'lee', 'kim', 'park', np.nan],
+                           'Q3_3_TEXT':['as1', 'bj2', 'cl3', 'dk4', 'dk4', np.nan],
+                           'Student_Score':[1, 2, 3, 4, 5, 6]})
+    df_post = pd.DataFrame({'V1':['b1', 'b2', 'b3', 'b4', 'b5', 'b6'],
+                            'Q3_1_TEXT':['alice', 'jones', 'karol', 'dann', 'alice', np.nan],
+                            'Q3_2_TEXT':['smith', 'bob', 'lee', 'kim', 'smith', np.nan],
+                            'Q3_3_TEXT':['as1', 'bj0', 'cl9', 'dk4', 'as9', 'zz9'],
+                            'Student_Score':[7, 8, 9, 10, 11, 12]})
+    return df_pre, df_post
+
+def test_csem_matches_old_merges():
+    df_pre, df_post = CSEM_Responses()
+    df, stats = Merge_Pre_Post(df_pre, df_post, CSEM_KEYS)
+    pd.testing.assert_frame_equal(df, Legacy_Match_CSEM(df_pre, df_post))
+
+    # the duplicated name (b1, b5) goes to its first posttest, missing NetIDs (a3, b3) and student IDs (a6, b6) match each other like they do
+    # in pd.merge, and the pretest student ID shared by a4 and a5 only gets one posttest
+    matched = df.dropna(subset = ['V1_x', 'V1_y'])
+    assert sorted(zip(matched['V1_x'], matched['V1_y'])) == [('a1', 'b1'), ('a2', 'b2'), ('a3', 'b3'), ('a4', 'b4'), ('a6', 'b6')]
+    assert (stats['matched_name'], stats['matched_netID'], stats['matched_studentID']) == (1, 2, 2)
+
+def test_eclass_matches_old_merges():
+    df_pre, df_post = ECLASS_Responses()
+    df = Merge_ECLASS(df_pre, df_post)
+    pd.testing.assert_frame_equal(df, Legacy_Merge_ECLASS(df_pre, df_post))
+
+    # E-CLASS doesn't make posttest responses unique, so a4 and a5 both keep b4, and missing names match each other
+    matched = df.dropna(subset = ['V1_x', 'V1_y'])
+    assert sorted(zip(matched['V1_x'], matched['V1_y'])) == [('a1', 'b1'), ('a2', 'b2'), ('a4', 'b4'), ('a5', 'b4'), ('a6', 'b6')]
+
+def test_eclass_opt_outs_are_left_out_of_both_sides():
+    df_pre, df_post = ECLASS_Responses()
+    consent = Consent_Index(pd.DataFrame({'Course':['P1112'], 'FullName':['alicesmith'], 'Netid':['as1']}))
+    Keep = lambda df: df.loc[~consent.Opted_Out_Name('P1112', (df['Q3_1_TEXT'] + df['Q3_2_TEXT']).fillna(''))]
+    df_pre, df_post = Keep(df_pre), Keep(df_post)
+
+    df = Merge_ECLASS(df_pre, df_post)
+    pd.testing.assert_frame_equal(df, Legacy_Merge_ECLASS(df_pre, df_post))
+    assert not df['V1_x'].isin(['a1']).any()
+    assert not df['V1_y'].isin(['b1', 'b5']).any()
+
+def test_anti_join_matches_pandas():
+    df_left = pd.DataFrame({'Class':['c1', 'c1', 'c2', 'c2', 'c3', np.nan], 'Student':['s1', 's1', 's2', np.nan, 's3', 's4']})
+    df_right = pd.DataFrame({'Class':['c1', 'c2', 'c2', np.nan], 'Student':['s1', np.nan, np.nan, 's9']})
+    left_codes, right_codes = Key_Codes(df_left, df_right, ['Class', 'Student'], ['Class', 'Student'])
+
+    # duplicated keys on either side and missing values behave like an anti-join on the key tuples
+    expected = ~pd.MultiIndex.from_frame(df_left).isin(pd.MultiIndex.from_frame(df_right))
+    assert Anti_Join(left_codes, right_codes).tolist() == expected.tolist() == [False, False, True, False, True, True]
@@ -0,0 +1,47 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# the processing scripts live one directory up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Assessment_Registrar_Processing
+from Assessment_Registrar_Processing import Registrar_Merge, Get_OVB_Master
+
+def Registrar():
+    """Processed registrar data for one class of three students, with the columns Registrar_Merge keeps"""
+
+    df = pd.DataFrame({'Student_ID':['1001', '1002', '1003'], 'Netid':['ab1', 'cd2', 'ef3'], 'Course':'P1112', 'Year':'2017', 'Semester':'FA',
+                       'Class_ID':'2017FA-1112', 'Class_Standing':'Fresh', 'Major':'PHYS', 'Gender':'F', 'URM_Status':'Majority',
+                       'First_Gen_Status':'ContGen', 'GPA':[3.1, 3.2, 3.3], 'ACT_SAT_Math_Percentile':90, 'AP_Calculus_AB':'NotTaken',
+                       'AP_Calculus_BC':'NotTaken', 'AP_Physics_EM':'NotTaken', 'AP_Physics_Mech':'NotTaken', 'Sequence':'Engineering',
+                       'Course_Content':'Mechanics', 'Instruction':'Old'})
+    return df.astype({col:'category' for col in ['Course', 'Year', 'Semester', 'Class_ID']})
+
+def test_numeric_ids_match_and_keep_the_registrars_netid(tmp_path):
+    # every student ID in the file is numeric (and one is missing), so without reading IDs as text they'd come in as floats and never match
+    file = str(tmp_path / 'CSEM_Master.csv')
+    with open(file, 'w') as f:
+        f.write('NetID,Q39,Total_Score_x,Total_Score_y,Semester,Course,Year\nzz9,1001,10,20,FA,P1112,2017\ncd2,,11,21,FA,P1112,2017\n')
+    df = Registrar_Merge(file, 'CSEM', None, None, df_Registrar = Registrar()).sort_values('Student_ID').reset_index(drop = True)
+
+    assert df['Student_ID'].tolist() == ['1001', '1002', '1003']
+    assert df['PreScores'].tolist()[:2] == [10, 11] and np.isnan(df['PreScores'].iloc[2])
+    # the first student's NetID was mistyped, so they matched on student ID alone and get the registrar's NetID
+    assert df['Netid'].tolist() == ['ab1', 'cd2', 'ef3']
+
+def test_get_ovb_master_passes_lab_instruction_lists_on(monkeypatch):
+    calls = []
+    class Stop(Exception):
+        pass
+    def Get_Processed_Registrar(*args, **kwargs):
+        calls.append(kwargs)
+        raise Stop
+
+    monkeypatch.setattr(Assessment_Registrar_Processing, 'Get_Processed_Registrar', Get_Processed_Registrar)
+    with pytest.raises(Stop):
+        Get_OVB_Master('CSEM.csv', 'ECLASS.csv', 'MBT.csv', 'PLIC.csv', 'Registrar.xlsx', 'MasterList.xlsx', 'OVB.csv',
+                       FA2017_1116_file = 'FA2017_1116.csv', SP2018_2217_file = 'SP2018_2217.csv')
+    assert calls[0]['FA2017_1116_file'] == 'FA2017_1116.csv' and calls[0]['SP2018_2217_file'] == 'SP2018_2217.csv'